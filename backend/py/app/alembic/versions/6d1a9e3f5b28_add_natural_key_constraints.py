@@ -0,0 +1,110 @@
+"""add natural key constraints
+
+Revision ID: 6d1a9e3f5b28
+Revises: 2b9e4c7d0f13
+Create Date: 2026-10-18 13:42:18.550731
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "6d1a9e3f5b28"
+down_revision = "2b9e4c7d0f13"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Postgres treats NULLs as distinct in a unique constraint, so the columns of the natural
+    # key can't be NULL. An email without a date gets the time it was scanned.
+    op.execute("UPDATE scanned_emails SET subject = '' WHERE subject IS NULL")
+    op.execute(
+        "UPDATE scanned_emails SET inbox_date = COALESCE(insert_ts, now()) WHERE inbox_date IS NULL"
+    )
+    op.alter_column(
+        "scanned_emails", "subject", existing_type=sa.String(), nullable=False, server_default=""
+    )
+    op.alter_column(
+        "scanned_emails",
+        "inbox_date",
+        existing_type=sa.DateTime(timezone=True),
+        nullable=False,
+        server_default=sa.text("now()"),
+    )
+
+    # Remove duplicate scanned emails, keeping the oldest, and point their unsubscribe links
+    # at the one that's kept.
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE duplicate_scanned_emails ON COMMIT DROP AS
+        SELECT id, keep_id FROM (
+            SELECT
+                id,
+                MIN(id) OVER (
+                    PARTITION BY linked_email_address, email_from, subject, inbox_date
+                ) AS keep_id
+            FROM scanned_emails
+        ) AS scanned_email_ids
+        WHERE id <> keep_id
+        """
+    )
+    op.execute(
+        """
+        UPDATE unsubscribe_links
+        SET scanned_email_id = duplicate_scanned_emails.keep_id
+        FROM duplicate_scanned_emails
+        WHERE unsubscribe_links.scanned_email_id = duplicate_scanned_emails.id
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM scanned_emails
+        USING duplicate_scanned_emails
+        WHERE scanned_emails.id = duplicate_scanned_emails.id
+        """
+    )
+
+    # Remove duplicate unsubscribe links, keeping the oldest.
+    op.execute(
+        """
+        DELETE FROM unsubscribe_links
+        USING unsubscribe_links AS kept_links
+        WHERE unsubscribe_links.link = kept_links.link
+        AND unsubscribe_links.linked_email_address = kept_links.linked_email_address
+        AND unsubscribe_links.id > kept_links.id
+        """
+    )
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_unique_constraint(
+        "uq_scanned_emails_natural_key",
+        "scanned_emails",
+        ["linked_email_address", "email_from", "subject", "inbox_date"],
+    )
+    op.create_unique_constraint(
+        "uq_unsubscribe_links_natural_key",
+        "unsubscribe_links",
+        ["link", "linked_email_address"],
+    )
+    # ### end Alembic commands ###
+
+
+def downgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_constraint(
+        "uq_unsubscribe_links_natural_key", "unsubscribe_links", type_="unique"
+    )
+    op.drop_constraint("uq_scanned_emails_natural_key", "scanned_emails", type_="unique")
+    # ### end Alembic commands ###
+    op.alter_column(
+        "scanned_emails",
+        "inbox_date",
+        existing_type=sa.DateTime(timezone=True),
+        nullable=True,
+        server_default=None,
+    )
+    op.alter_column(
+        "scanned_emails", "subject", existing_type=sa.String(), nullable=True, server_default=None
+    )
@@ -0,0 +1,59 @@
+"""add listing and pending indexes
+
+Revision ID: c8e5f1a2b7d4
+Revises: a4c7e2b9d316
+Create Date: 2026-10-18 17:05:31.402517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c8e5f1a2b7d4"
+down_revision = "a4c7e2b9d316"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The tables can be big, build the indexes without locking out the scanner.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_scanned_emails_listing",
+            "scanned_emails",
+            ["linked_email_address", "email_from", "subject", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_scanned_emails_uid",
+            "scanned_emails",
+            ["linked_email_address", "uid"],
+            unique=False,
+            postgresql_where=sa.text("uid IS NOT NULL"),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_unsubscribe_links_scanned_email_id",
+            "unsubscribe_links",
+            ["scanned_email_id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_unsubscribe_links_pending",
+            "unsubscribe_links",
+            ["linked_email_address"],
+            unique=False,
+            postgresql_where=sa.text("unsubscribe_status = 'pending'"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_unsubscribe_links_pending", table_name="unsubscribe_links", postgresql_concurrently=True)
+        op.drop_index("ix_unsubscribe_links_scanned_email_id", table_name="unsubscribe_links", postgresql_concurrently=True)
+        op.drop_index("ix_scanned_emails_uid", table_name="scanned_emails", postgresql_concurrently=True)
+        op.drop_index("ix_scanned_emails_listing", table_name="scanned_emails", postgresql_concurrently=True)
@@ -3,29 +3,75 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from pydantic import ValidationError
 
-from sqlalchemy.orm import Session
-
-from app.database.database import get_db
+from app.database.database import SessionLocal, get_async_session_local, get_db
 from app.config.config import settings
 from app.config.security import ALGORITHM
 from app import crud, models, schemas
+from app.objects.user_cache import user_cache
 
 
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl="/login/access-token")
 
 
-def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(reusable_oauth2)
-) -> models.User:
+def get_token_data(token: str) -> schemas.TokenPayload:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
-        token_data = schemas.TokenPayload(**payload)
+        return schemas.TokenPayload(**payload)
     except (jwt.JWTError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = crud.user.get(db, id=token_data.sub)
-    if not user:
+
+
+def get_current_user(token: str = Depends(reusable_oauth2)) -> schemas.User:
+    """Get the session user from the access token. The user comes from the user cache
+    when it was seen recently, otherwise from the db.
+
+    Args:
+        token (str): The access token
+
+    Returns:
+        schemas.User: The session user
+    """
+    token_data = get_token_data(token)
+    user = user_cache.get(token_data.sub)
+    if user is not None:
+        return user
+
+    db = SessionLocal()
+    try:
+        db_user = crud.user.get(db, id=token_data.sub)
+    finally:
+        db.close()
+
+    return cache_user(db_user)
+
+
+async def get_current_user_async(token: str = Depends(reusable_oauth2)) -> schemas.User:
+    """The async version of get_current_user.
+
+    Args:
+        token (str): The access token
+
+    Returns:
+        schemas.User: The session user
+    """
+    token_data = get_token_data(token)
+    user = user_cache.get(token_data.sub)
+    if user is not None:
+        return user
+
+    async with get_async_session_local()() as db:
+        db_user = await crud.user.get_async(db, id=token_data.sub)
+
+    return cache_user(db_user)
+
+
+def cache_user(db_user: models.User) -> schemas.User:
+    if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
+
+    user = schemas.User.from_orm(db_user)
+    user_cache.set(user)
     return user
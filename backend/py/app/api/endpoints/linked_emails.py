@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
-from app.api.deps import get_current_user
-from app.database.database import get_db
+from app.api.deps import get_current_user, get_current_user_async
+from app.database.database import get_async_db, get_db
 
 router = APIRouter()
 
@@ -13,14 +14,14 @@ def link_email(
     *,
     email_info: schemas.LinkedEmailsCreate,
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    user: schemas.User = Depends(get_current_user),
 ) -> dict:
     """Link an email to an account.
 
     Args:
         email_info (schemas.LinkedEmailsCreate): The email info to link.
         db (Session): Db session.
-        user (models.LinkedEmails): The session user.
+        user (schemas.User): The session user.
 
     Returns:
         dict: The email obj
@@ -41,21 +42,21 @@ def link_email(
 
 
 @router.get("/")
-def get_linked_emails(
+async def get_linked_emails(
     *,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: schemas.User = Depends(get_current_user_async),
 ) -> dict:
     """Get a list of linked_emails owned by the session user.
 
     Args:
-        db (Session): The db session.
-        user (models.User): The session user.
+        db (AsyncSession): The async db session.
+        user (schemas.User): The session user.
 
     Returns:
         dict: the linked email info owned by the user
     """
-    return {"linked_emails": crud.linked_email.get_by_user_id(db=db, user_id=user.id)}
+    return {"linked_emails": await crud.linked_email.get_by_user_id(db=db, user_id=user.id)}
 
 
 @router.delete("/{id}")
@@ -63,14 +64,14 @@ def delete_linked_email(
     *,
     id: int = None,
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    user: schemas.User = Depends(get_current_user),
 ) -> dict:
     """Delete a linked email by id.
 
     Args:
         id (int): the id of the linked email to delete
         db (Session): The db session.
-        user (models.User): The session user.
+        user (schemas.User): The session user.
 
     Returns:
         dict: the linked email id that was deleted
@@ -83,7 +84,7 @@ def get_current_running_tasks(
     *,
     linked_email_address: str,
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    user: schemas.User = Depends(get_current_user),
 ) -> dict:
     """Get the current running task id for this linked email.
     This tells us whether a scan is still happening for a linked_email_address.
@@ -8,7 +8,6 @@ from app import crud, schemas
 from app.api import deps
 from app.config import security
 from app.config.config import settings
-from app.models.users import User
 
 router = APIRouter()
 
@@ -47,7 +46,7 @@ def login_access_token(
 
 
 @router.post("/test-token", response_model=schemas.User)
-def test_token(current_user: User = Depends(deps.get_current_user)) -> User:
+def test_token(current_user: schemas.User = Depends(deps.get_current_user)) -> schemas.User:
     """
     Test access token
     """
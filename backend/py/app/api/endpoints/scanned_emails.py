@@ -1,10 +1,12 @@
-from celery.result import AsyncResult
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app import crud, models, schemas
-from app.api.deps import get_current_user
-from app.database.database import get_db
+from app import celery_worker, crud, schemas
+from app.api.deps import get_current_user, get_current_user_async
+from app.database.database import get_async_db, get_db
 
 router = APIRouter()
 
@@ -14,14 +16,14 @@ def scan_emails(
     *,
     scan_email: schemas.ScanEmails,
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    user: schemas.User = Depends(get_current_user),
 ) -> dict:
     """Scan emails for a linked_email address. Scans the email's inbox for possible marketing/spam to unsubscribe from.
 
     Args:
         scan_email (schemas.ScanEmails): The scan email info.
         db (Session): The db session.
-        user (models.User): The user session.
+        user (schemas.User): The user session.
 
     Returns:
         dict: The task id of the celery job
@@ -32,53 +34,107 @@ def scan_emails(
         )
     }
 
-@router.get("/senders/{page}")
-def get_senders(
+@router.get("/senders")
+async def get_senders(
     *,
     linked_email: str,
-    page: int = 0,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    user: schemas.User = Depends(get_current_user_async),
 ) -> dict:
-    """Get a list of senders for this linked email.
+    """Get a page of the senders for this linked email.
 
     Args:
         linked_email (str): The linked email to filter by
-        page (int, optional): The page to fetch. Defaults to 0.
-        db (Session): The db session.
-        user (models.User): The session user.
+        cursor (str, optional): The next_cursor of the previous page. Defaults to None, the first page.
+        db (AsyncSession): The async db session.
+        user (schemas.User): The session user.
+
+    Returns:
+        dict: A list of email senders that were scanned and the cursor of the next page
+    """
+    senders, next_cursor = await crud.scanned_emails.get_senders_by_linked_email(
+        db, user_id=user.id, linked_email=linked_email, cursor=cursor
+    )
+    return {
+        "senders": senders,
+        "next_cursor": next_cursor,
+    }
+
+@router.get("/senders_count")
+async def get_senders_count(
+    *,
+    linked_email: str,
+    db: AsyncSession = Depends(get_async_db),
+    user: schemas.User = Depends(get_current_user_async),
+) -> dict:
+    """Get the number of senders for this linked email.
+
+    Args:
+        linked_email (str): The linked email to filter by
+        db (AsyncSession): The async db session.
+        user (schemas.User): The session user.
 
     Returns:
-        dict: A list of email senders that were scanned
+        dict: The number of email senders that were scanned
     """
     return {
-        "senders": crud.scanned_emails.get_senders_by_linked_email(db, user_id=user.id, linked_email=linked_email, page=page)
+        "total_count": await crud.scanned_emails.count_senders_by_linked_email(
+            db, user_id=user.id, linked_email=linked_email
+        )
     }
 
 @router.post("/get_scanned_emails")
-def get_scanned_emails(
+async def get_scanned_emails(
     *,
     get_scanned_email: schemas.GetScannedEmails,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: schemas.User = Depends(get_current_user_async),
 ) -> dict:
-    """Get a paginated list of scanned emails. Only includes a number count of links found for the email.
+    """Get a page of scanned emails. Only includes a number count of links found for the email.
 
     Args:
-        get_scanned_email (schemas.GetScannedEmails): request params including linked_email, email_from, and page
-        db (Session): The db session.
-        user (models.User): The session user.
+        get_scanned_email (schemas.GetScannedEmails): request params including linked_email, email_from, and cursor
+        db (AsyncSession): The async db session.
+        user (schemas.User): The session user.
+
+    Returns:
+        dict: The scanned emails owned by the user and the cursor of the next page.
+    """
+    scanned_emails, next_cursor = await crud.scanned_emails.get_scanned_emails(
+        db,
+        cursor=get_scanned_email.cursor,
+        user_id=user.id,
+        email_from=get_scanned_email.email_from,
+        linked_email=get_scanned_email.linked_email,
+    )
+    return {
+        "scanned_emails": scanned_emails,
+        "next_cursor": next_cursor,
+    }
+
+@router.get("/scanned_emails_count")
+async def get_scanned_emails_count(
+    *,
+    linked_email: str,
+    email_from: str,
+    db: AsyncSession = Depends(get_async_db),
+    user: schemas.User = Depends(get_current_user_async),
+) -> dict:
+    """Get the number of scanned emails from an email sender.
+
+    Args:
+        linked_email (str): The linked email to filter by
+        email_from (str): The email sender to filter by
+        db (AsyncSession): The async db session.
+        user (schemas.User): The session user.
 
     Returns:
-        dict: The scanned emails owned by the user.
+        dict: The number of scanned emails
     """
     return {
-        "scanned_emails": crud.scanned_emails.get_scanned_emails(
-            db,
-            page=get_scanned_email.page,
-            user_id=user.id,
-            email_from=get_scanned_email.email_from,
-            linked_email=get_scanned_email.linked_email,
+        "total_count": await crud.scanned_emails.count_scanned_emails(
+            db, user_id=user.id, linked_email=linked_email, email_from=email_from
         )
     }
 
@@ -86,19 +142,16 @@ def get_scanned_emails(
 def get_task_status(
     *,
     task_id: str,
-    user: models.User = Depends(get_current_user),
+    user: schemas.User = Depends(get_current_user),
 ) -> dict:
-    """Get the status of a task by task id
+    """Get the status of a task by task id. A sharded inbox scan is polled by its group id
+    and returns the combined progress of every shard.
 
     Args:
         task_id (str): The task id to check
-        user (models.User): The session user.
+        user (schemas.User): The session user.
 
     Returns:
         dict: The task info
     """
-    result = AsyncResult(task_id)
-    return {
-        "state": result.state,
-        "details": result.info,
-    }
+    return celery_worker.get_task_status(task_id)
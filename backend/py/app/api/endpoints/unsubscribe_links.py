@@ -1,35 +1,36 @@
 from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app import crud, models
-from app.api.deps import get_current_user
-from app.database.database import get_db
+from app import crud, schemas
+from app.api.deps import get_current_user, get_current_user_async
+from app.database.database import get_async_db, get_db
 from app.schemas.unsubscribe_links import UnsubscribeEmail, UnsubscribeFromAll, UnsubscribeFromSenders
 
 router = APIRouter()
 
 
 @router.get("/unsubscribe_links_by_email/{scanned_email_id}")
-def get_unsubscribe_links_by_email(
+async def get_unsubscribe_links_by_email(
     *,
     scanned_email_id: int = None,
     linked_email: str = None,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: schemas.User = Depends(get_current_user_async),
 ) -> dict:
     """Get a list of unsubscribe links by an scanned_email and linked_email address.
 
     Args:
         scanned_email_id (int): the scanned email to fetch
         linked_email (str): the linked email
-        db (Session): The db session.
-        user (models.User): The session user
+        db (AsyncSession): The async db session.
+        user (schemas.User): The session user
 
     Returns:
         dict: The unsubscribe links
     """
     return {
-        "links": crud.unsubscribe_links.get_unsubscribe_links_by_email(
+        "links": await crud.unsubscribe_links.get_unsubscribe_links_by_email(
             db,
             linked_email_address=linked_email,
             scanned_email_id=scanned_email_id,
@@ -43,25 +44,24 @@ def unsubscribe(
     *,
     unsub_info: UnsubscribeEmail,
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    user: schemas.User = Depends(get_current_user),
 ) -> dict:
     """Unsubscribe from an email sender.
 
     Args:
         unsub_info (UnsubscribeEmail): The sender to unsubscribe from and linked_email
         db (Session): The db session.
-        user (models.User): The session user
+        user (schemas.User): The session user
 
     Returns:
-        dict: The success state of the operation
+        dict: The task id handed off to celery
     """
     return {
-        "success": crud.unsubscribe_links.unsubscribe(
+        "unsubscribe_task_id": crud.unsubscribe_links.unsubscribe(
             db,
-            email_addresses=unsub_info.email_sender,
+            email_sender=unsub_info.email_sender,
             linked_email_address=unsub_info.linked_email_address,
             user_id=user.id,
-            page=unsub_info.page,
         )
     }
 
@@ -70,14 +70,14 @@ def unsubscribe_from_senders(
     *,
     unsub_info: UnsubscribeFromSenders,
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    user: schemas.User = Depends(get_current_user),
 ) -> dict:
     """Unsubscribe from selected senders associated with this linked email address.
 
     Args:
         unsub_info (UnsubscribeFromSenders): Request params, includes list of senders and linked email.
         db (Session): The db session.
-        user (models.User): The session user.
+        user (schemas.User): The session user.
 
     Returns:
         dict: The task id handed off to celery
@@ -96,14 +96,14 @@ def unsubscribe_from_all(
     *,
     unsub_info: UnsubscribeFromAll,
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    user: schemas.User = Depends(get_current_user),
 ) -> dict:
     """Unsubscribe from all emails associated with this linked email address.
 
     Args:
         unsub_info (UnsubscribeFromAll): Request params, includes just linked_email_address.
         db (Session): The db session. Defaults to Depends(get_db).
-        user (models.User): The session user. Defaults to Depends(get_current_user).
+        user (schemas.User): The session user. Defaults to Depends(get_current_user).
 
     Returns:
         dict: The task id
@@ -1,6 +1,4 @@
-import requests
-
-from typing import List
+from typing import List, Optional, Tuple
 
 from app.database.database import SessionLocal
 from app.config import security
@@ -9,8 +7,16 @@ from app.models.linked_emails import LinkedEmails
 from app.models.scanned_emails import ScannedEmails
 from app.models.unsubscribe_links import UnsubscribeLinks, UnsubscribeStatus
 from app.objects.email_unsubscriber import EmailUnsubscriber
-
-from celery import Celery
+from app.objects.host_limiter import HostLimiter
+from app.objects.http_client import get_http_client_stats
+from app.objects.link_unsubscriber import LinkUnsubscriber
+from app.objects.scan_pipeline import merge_stage_stats
+from app.objects.listing_count_cache import ListingCountCache
+from app.objects.sender_summary_writer import SenderSummaryWriter
+from app.objects.unsubscribe_result_cache import UnsubscribeResultCache
+
+from celery import Celery, Task
+from celery.result import AsyncResult, GroupResult
 from sqlalchemy.orm import Session
 
 from celery.utils.log import get_task_logger
@@ -23,19 +29,30 @@ celery.conf.result_backend = settings.CELERY_RESULT_BACKEND
 
 
 @celery.task(name="scan_emails", bind=True)
-def scan_emails(self, domain: str, linked_email_id: int, user_id: int, range_params: tuple) -> int:
-    """A task method for EmailUnsubscriber._do_scan_emails
+def scan_emails(
+    self,
+    domain: str,
+    linked_email_id: int,
+    user_id: int,
+    range_params: tuple = None,
+    uids: List[int] = None,
+) -> dict:
+    """A task method for EmailUnsubscriber._do_scan_emails. An inbox scan is split into
+    several of these tasks, each one scanning the part of the inbox in range_params or uids.
 
     Args:
         domain (str): The email domain
         linked_email_id (int): The linked email id to scan
-        range_params (tuple): The range params to fetch emails from the inbox
+        range_params (tuple, optional): The range params to fetch emails from the inbox
+        uids (List[int], optional): The UIDs of the emails to scan instead of range_params
         db (Session): The db session
 
     Returns:
-        int: The number of emails that found unsubscribe links
+        dict: The number of emails that found unsubscribe links, the number of emails scanned,
+            the bytes fetched and the throughput of each stage of the scan
     """
     db = SessionLocal()
+    email_unsubscriber = None
 
     try:
         # Get the linked_email from the db
@@ -51,9 +68,6 @@ def scan_emails(self, domain: str, linked_email_id: int, user_id: int, range_par
         if not linked_email:
             raise Exception(f"Could not find linked email {linked_email_id}")
 
-        linked_email.scan_task_id = self.request.id
-        db.commit()
-
         domain = EmailUnsubscriber.get_domain_from_email(
             email_address=linked_email.email
         )
@@ -73,14 +87,165 @@ def scan_emails(self, domain: str, linked_email_id: int, user_id: int, range_par
             task=self,
             range_params=range_params,
             db=db,
+            uids=uids,
         )
     
+        scan_stats = email_unsubscriber.scan_stats
+    
     finally:
-        remove_task_id_from_linked_email(db, linked_email_id, 'scan')
         del email_unsubscriber
         db.close()
 
-    return spam_emails_found
+    return {
+        'spam_emails_found': spam_emails_found,
+        'total': len(uids) if uids is not None else len(range(*range_params)),
+        **scan_stats,
+    }
+
+@celery.task(name="scan_emails_complete")
+def scan_emails_complete(
+    shard_results: List[dict],
+    linked_email_id: int,
+    checkpoint: Tuple[int, int, Optional[int]] = None,
+    vanished_uids: List[int] = None,
+) -> int:
+    """The chord callback run once every scan_emails task of an inbox scan has finished.
+    Saves the scan checkpoint so the next scan only has to scan new emails, removes
+    the scanned emails that were expunged from the inbox and drops the cached listing counts.
+
+    Args:
+        shard_results (List[dict]): The results of each scan_emails task
+        linked_email_id (int): The linked email id that was scanned
+        checkpoint (Tuple[int, int, Optional[int]], optional): The UIDVALIDITY of the inbox,
+            the highest UID scanned and the HIGHESTMODSEQ of the inbox if the server supports CONDSTORE
+        vanished_uids (List[int], optional): The UIDs of the emails expunged since the last scan
+
+    Returns:
+        int: The number of emails that found unsubscribe links
+    """
+    db = SessionLocal()
+
+    try:
+        linked_email = (
+            db.query(LinkedEmails)
+            .filter(LinkedEmails.id == linked_email_id)
+            .first()
+        )
+
+        if vanished_uids:
+            vanished_senders = [
+                email_from for email_from, in (
+                    db.query(ScannedEmails.email_from)
+                    .filter(
+                        ScannedEmails.linked_email_address == linked_email.email,
+                        ScannedEmails.uid.in_(vanished_uids),
+                    )
+                    .distinct()
+                )
+            ]
+            (
+                db.query(ScannedEmails)
+                .filter(
+                    ScannedEmails.linked_email_address == linked_email.email,
+                    ScannedEmails.uid.in_(vanished_uids),
+                )
+                .delete(synchronize_session=False)
+            )
+            SenderSummaryWriter(db, linked_email.email).refresh(vanished_senders)
+
+        if checkpoint:
+            (
+                linked_email.uid_validity,
+                linked_email.last_scanned_uid,
+                linked_email.highest_modseq,
+            ) = checkpoint
+
+        db.commit()
+        ListingCountCache().invalidate(linked_email.email)
+        remove_task_id_from_linked_email(db, linked_email_id, 'scan')
+    finally:
+        db.close()
+
+    return sum(result['spam_emails_found'] for result in shard_results)
+
+@celery.task(name="scan_emails_failed")
+def scan_emails_failed(linked_email_id: int) -> None:
+    """The chord error callback run when any scan_emails task of an inbox scan has failed.
+
+    Args:
+        linked_email_id (int): The linked email id that was scanned
+    """
+    db = SessionLocal()
+
+    try:
+        remove_task_id_from_linked_email(db, linked_email_id, 'scan')
+    finally:
+        db.close()
+
+def get_task_status(task_id: str) -> dict:
+    """Get the status of a task by task id. If the task id is the group id of a
+    sharded inbox scan the progress of every shard is combined into one current/total.
+    The scan only succeeds once its scan_emails_complete callback has saved the results.
+
+    Args:
+        task_id (str): The task id or group id to check
+
+    Returns:
+        dict: The task state and details
+    """
+    group_result = GroupResult.restore(task_id, app=celery)
+
+    if group_result is None:
+        result = AsyncResult(task_id, app=celery)
+        return {
+            "state": result.state,
+            "details": result.info,
+        }
+
+    states = [ result.state for result in group_result.results ]
+    current = 0
+    total = 0
+    spam_emails_found = 0
+    bytes_fetched = 0
+    stages = []
+
+    for result in group_result.results:
+        # Shards that haven't started yet don't know their total.
+        if not isinstance(result.info, dict):
+            continue
+
+        if result.state == 'SUCCESS':
+            current += result.info['total']
+            spam_emails_found += result.info['spam_emails_found']
+        else:
+            current += result.info.get('current', 0)
+
+        total += result.info.get('total', 0)
+        bytes_fetched += result.info.get('bytes_fetched', 0)
+        if 'stages' in result.info:
+            stages.append(result.info['stages'])
+
+    if 'FAILURE' in states:
+        state = 'FAILURE'
+    elif all(state == 'SUCCESS' for state in states):
+        # Every shard is done, wait for the callback to save the checkpoint and summaries.
+        callback_result = AsyncResult(EmailUnsubscriber.get_scan_complete_task_id(task_id), app=celery)
+        state = callback_result.state if callback_result.state in ('SUCCESS', 'FAILURE') else 'PROGRESS'
+    elif all(state == 'PENDING' for state in states):
+        state = 'PENDING'
+    else:
+        state = 'PROGRESS'
+
+    return {
+        "state": state,
+        "details": {
+            'current': current,
+            'total': total,
+            'spam_emails_found': spam_emails_found,
+            'bytes_fetched': bytes_fetched,
+            'stages': merge_stage_stats(stages),
+        },
+    }
 
 @celery.task(name="unsubscribe_from_all", bind=True)
 def unsubscribe_from_all(self, linked_email_id: int, user_id: int) -> int:
@@ -122,30 +287,9 @@ def unsubscribe_from_all(self, linked_email_id: int, user_id: int) -> int:
             .all()
         )
 
-        total_links = len(links)
-
-        for idx, link in enumerate(links):
-
-            try:
-                res = requests.get(link.link, timeout=5)
-                # TODO: Do something with the res.text. We could possibly parse it
-                # to see if there is another 'click' needed to unsubscribe.
-                if res.status_code == 200:
-                    link.unsubscribe_status = UnsubscribeStatus.success
-                else:
-                    link.unsubscribe_status = UnsubscribeStatus.failure
-            except:
-                link.unsubscribe_status = UnsubscribeStatus.failure
-
-            self.update_state(
-                state='PROGRESS',
-                meta={
-                    'current': idx,
-                    'total': total_links
-                }
-            )
+        deferred_links = unsubscribe_links(self, db, links, linked_email.email)
 
-        db.commit()
+        retry_deferred_links(linked_email_id, user_id, deferred_links)
     
     finally:
         remove_task_id_from_linked_email(db, linked_email_id, 'unsubscribe')
@@ -194,35 +338,179 @@ def unsubscribe_from_senders(self, linked_email_id: int, user_id: int, email_sen
             .all()
         )
 
-        total_links = len(links)
-
-        for idx, link in enumerate(links):
-
-            try:
-                res = requests.get(link.link, timeout=5)
-                # TODO: Do something with the res.text. We could possibly parse it
-                # to see if there is another 'click' needed to unsubscribe.
-                if res.status_code == 200:
-                    link.unsubscribe_status = UnsubscribeStatus.success
-                else:
-                    link.unsubscribe_status = UnsubscribeStatus.failure
-            except:
-                link.unsubscribe_status = UnsubscribeStatus.failure
-
-            self.update_state(
-                state='PROGRESS',
-                meta={
-                    'current': idx,
-                    'total': total_links
-                }
-            )
+        deferred_links = unsubscribe_links(self, db, links, linked_email.email)
 
-        db.commit()
+        retry_deferred_links(linked_email_id, user_id, deferred_links)
     
     finally:
         remove_task_id_from_linked_email(db, linked_email_id, 'unsubscribe')
         db.close()
 
+@celery.task(name="retry_unsubscribe_links", bind=True)
+def retry_unsubscribe_links(
+    self, linked_email_id: int, user_id: int, link_ids: List[int], retries: int = 1,
+) -> None:
+    """Retry the unsubscribe links that were deferred because their host's circuit was open.
+    Links that are deferred again are retried up to settings.UNSUBSCRIBE_MAX_RETRIES times,
+    after that they're left pending.
+
+    Args:
+        linked_email_id (int): The linked email address
+        user_id (int): the session user id
+        link_ids (List[int]): The ids of the deferred unsubscribe links
+        retries (int, optional): The number of this retry. Defaults to 1.
+    """
+    db = SessionLocal()
+
+    try:
+        # Get the linked_email from the db
+        linked_email = (
+            db.query(LinkedEmails)
+            .filter(
+                LinkedEmails.id == linked_email_id,
+                LinkedEmails.user_id == user_id,
+            )
+            .first()
+        )
+
+        if not linked_email:
+            raise Exception(f"Could not find linked email {linked_email_id}")
+
+        links = (
+            db.query(UnsubscribeLinks)
+            .filter(
+                UnsubscribeLinks.id.in_(link_ids),
+                UnsubscribeLinks.linked_email_address == linked_email.email,
+                UnsubscribeLinks.unsubscribe_status == UnsubscribeStatus.pending,
+            )
+            .all()
+        )
+
+        deferred_links = unsubscribe_links(self, db, links, linked_email.email)
+
+        retry_deferred_links(linked_email_id, user_id, deferred_links, retries)
+
+    finally:
+        db.close()
+
+def retry_deferred_links(
+    linked_email_id: int, user_id: int, deferred_links: List[UnsubscribeLinks], retries: int = 0,
+) -> None:
+    """Schedule a retry_unsubscribe_links task for the deferred links once their hosts'
+    circuits have closed again.
+
+    Args:
+        linked_email_id (int): The linked email address
+        user_id (int): the session user id
+        deferred_links (List[UnsubscribeLinks]): The deferred unsubscribe links
+        retries (int, optional): The number of retries done so far. Defaults to 0.
+    """
+    if not deferred_links:
+        return
+
+    if retries >= settings.UNSUBSCRIBE_MAX_RETRIES:
+        logger.warning(
+            f"Giving up on {len(deferred_links)} unsubscribe links after {retries} retries"
+        )
+        return
+
+    retry_unsubscribe_links.apply_async(
+        (linked_email_id, user_id, [ link.id for link in deferred_links ], retries + 1),
+        countdown=settings.UNSUBSCRIBE_CIRCUIT_COOLDOWN,
+    )
+
+def unsubscribe_links(
+    task: Task, db: Session, links: List[UnsubscribeLinks], recipient: str,
+) -> List[UnsubscribeLinks]:
+    """Request the unsubscribe links concurrently and record each link's unsubscribe
+    status as its request finishes. Links that unsubscribed the recipient recently, for any
+    user, are taken from the unsubscribe result cache instead of being requested again.
+    The requests are rate limited per host, and the links of hosts that keep failing are
+    deferred instead of requested. The statuses are committed, added to the sender summaries
+    and the result cache every settings.UNSUBSCRIBE_COMMIT_BATCH_SIZE links, so the links
+    requested before a worker stops aren't requested again.
+
+    Args:
+        task (Task): The celery task object
+        db (Session): The db session
+        links (List[UnsubscribeLinks]): The unsubscribe links to request
+        recipient (str): The linked email address that's unsubscribed
+
+    Returns:
+        List[UnsubscribeLinks]: The links deferred because their host's circuit was open
+    """
+    total_links = len(links)
+    result_cache = UnsubscribeResultCache()
+    sender_summary_writer = SenderSummaryWriter(db, recipient)
+
+    # The scanned_email_id, old status and new status of each link since the last commit.
+    status_changes = []
+    # The unsubscribe status of each requested link since the last commit.
+    results = {}
+
+    def commit_statuses() -> None:
+        nonlocal status_changes, results
+
+        sender_summary_writer.update_link_statuses(status_changes)
+        db.commit()
+        result_cache.set_many(results, recipient)
+
+        status_changes, results = [], {}
+
+    cached_statuses = result_cache.get_many([ link.link for link in links ], recipient)
+    for link in links:
+        if link.link in cached_statuses:
+            status_changes.append((link.scanned_email_id, link.unsubscribe_status, cached_statuses[link.link]))
+            link.unsubscribe_status = cached_statuses[link.link]
+
+    cache_hits = sum(1 for link in links if link.link in cached_statuses)
+    idx = cache_hits
+    link_unsubscriber = LinkUnsubscriber(host_limiter=HostLimiter())
+
+    def update_progress() -> None:
+        task.update_state(
+            state='PROGRESS',
+            meta={
+                'current': idx,
+                'total': total_links,
+                'cache_hits': cache_hits,
+                'cache_hit_rate': cache_hits / total_links if total_links else 0,
+                'deferred': len(link_unsubscriber.deferred_links),
+            }
+        )
+
+    # The links that are still being requested are read after each commit, keep them loaded.
+    expire_on_commit, db.expire_on_commit = db.expire_on_commit, False
+
+    try:
+        commit_statuses()
+        update_progress()
+
+        for link, unsubscribe_status in link_unsubscriber.unsubscribe(
+            [ link for link in links if link.link not in cached_statuses ]
+        ):
+            status_changes.append((link.scanned_email_id, link.unsubscribe_status, unsubscribe_status))
+            link.unsubscribe_status = unsubscribe_status
+            results[link.link] = unsubscribe_status
+
+            if len(status_changes) >= settings.UNSUBSCRIBE_COMMIT_BATCH_SIZE:
+                commit_statuses()
+
+            idx += 1
+            update_progress()
+
+        commit_statuses()
+    finally:
+        db.expire_on_commit = expire_on_commit
+
+    logger.info(f"Unsubscribe http client stats: {get_http_client_stats()}")
+
+    if link_unsubscriber.deferred_links:
+        update_progress()
+        logger.info(f"Deferred {len(link_unsubscriber.deferred_links)} unsubscribe links")
+
+    return link_unsubscriber.deferred_links
+
 def remove_task_id_from_linked_email(db: Session, linked_email_id: int, job_type: str):
     """Remove the task_id from a linked_email object.
     This is run when a task has ended or when the task has failed.
@@ -13,11 +13,24 @@ class Settings(BaseSettings):
 
     EMAIL_RESET_TOKEN_EXPIRE_HOURS: int = 48
 
+    # The page sizes of the senders and scanned emails listings.
+    SENDERS_PAGE_SIZE: int = 10
+    SCANNED_EMAILS_PAGE_SIZE: int = 10
+    # The total counts of the listings are cached in redis for this many seconds. 0 turns the cache off.
+    LISTING_COUNT_CACHE_TTL: int = 300
+
+    # Each api worker caches up to USER_CACHE_SIZE authenticated users for USER_CACHE_TTL seconds.
+    # 0 turns the cache off.
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL: float = 60
+
     POSTGRES_SERVER: str
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str
     SQLALCHEMY_DATABASE_URI: Optional[PostgresDsn] = None
+    # The asyncpg connection used by the async endpoints. Defaults to the same db as SQLALCHEMY_DATABASE_URI.
+    ASYNC_SQLALCHEMY_DATABASE_URI: Optional[PostgresDsn] = None
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
 
     @validator("SQLALCHEMY_DATABASE_URI", pre=True)
@@ -31,10 +44,92 @@ class Settings(BaseSettings):
             host=values.get("POSTGRES_SERVER"),
             path=f"/{values.get('POSTGRES_DB') or ''}",
         )
+
+    @validator("ASYNC_SQLALCHEMY_DATABASE_URI", pre=True)
+    def assemble_async_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
+        if isinstance(v, str):
+            return v
+        return PostgresDsn.build(
+            scheme="postgresql+asyncpg",
+            user=values.get("POSTGRES_USER"),
+            password=values.get("POSTGRES_PASSWORD"),
+            host=values.get("POSTGRES_SERVER"),
+            path=f"/{values.get('POSTGRES_DB') or ''}",
+        )
     
     CELERY_BROKER_URL: str
     CELERY_RESULT_BACKEND: str
 
+    # The redis holding the state shared between worker processes. Defaults to the celery broker.
+    REDIS_URL: Optional[str] = None
+    REDIS_SOCKET_TIMEOUT: float = 2
+
+    @validator("REDIS_URL", pre=True)
+    def assemble_redis_url(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
+        if isinstance(v, str):
+            return v
+        return values.get("CELERY_BROKER_URL")
+
+    # The number of emails to fetch from the imap server in a single FETCH command.
+    IMAP_FETCH_BATCH_SIZE: int = 500
+    # Only fetch the email headers the scanner reads instead of the whole header block.
+    IMAP_NARROW_HEADER_FETCH: bool = True
+    # An inbox scan is split into up to this many celery tasks, each scanning a separate
+    # part of the inbox on its own imap connection.
+    SCAN_SHARD_COUNT: int = 4
+    # Don't split off a scan task for fewer than this many emails.
+    SCAN_MIN_SHARD_SIZE: int = 1000
+    # Ask the imap server for the emails with a List-Unsubscribe header and only scan those.
+    IMAP_PREFILTER_LIST_UNSUBSCRIBE: bool = True
+    # Look for unsubscribe links in the text/plain and text/html parts of the emails without a
+    # List-Unsubscribe link. Only the first IMAP_BODY_SCAN_MAX_BYTES of each part are fetched.
+    # This scans every email of the inbox, IMAP_PREFILTER_LIST_UNSUBSCRIBE is ignored.
+    IMAP_BODY_SCAN_FALLBACK: bool = False
+    IMAP_BODY_SCAN_MAX_BYTES: int = 32768
+    # Unsubscribe links are usually in the footer, so the text parts are fetched from their end,
+    # IMAP_BODY_SCAN_TAIL_BYTES at first and twice as much each time no link is found. 0 fetches
+    # the start of the parts instead.
+    IMAP_BODY_SCAN_TAIL_BYTES: int = 4096
+    # The number of scanned emails written to the db in one transaction.
+    SCAN_WRITE_BATCH_SIZE: int = 500
+    # Scan tasks with at least this many emails, e.g. the first scan of a big inbox, stream
+    # the scanned emails into the db with COPY, SCAN_COPY_BATCH_SIZE emails at a time.
+    SCAN_COPY_MIN_EMAILS: int = 20000
+    SCAN_COPY_BATCH_SIZE: int = 10000
+    # A scan task parses the fetched emails in this many processes while it fetches the next
+    # batch, 0 parses them in a thread. Processes can't be started from daemonic processes such
+    # as celery's prefork pool workers, those parse in a thread too.
+    SCAN_PARSE_PROCESSES: int = 2
+    # The max number of fetched batches waiting to be parsed and written.
+    SCAN_PIPELINE_QUEUE_SIZE: int = 4
+
+    # The max number of unsubscribe links requested at once by an unsubscribe task, and
+    # the max number of those going to the same host.
+    UNSUBSCRIBE_CONCURRENCY: int = 32
+    UNSUBSCRIBE_CONCURRENCY_PER_HOST: int = 4
+    # The unsubscribe requests of a worker process share one http client. Idle connections
+    # are kept open for UNSUBSCRIBE_KEEPALIVE_EXPIRY seconds and the hosts' addresses are
+    # cached for UNSUBSCRIBE_DNS_CACHE_TTL seconds.
+    UNSUBSCRIBE_HTTP2: bool = False
+    UNSUBSCRIBE_KEEPALIVE_EXPIRY: float = 30
+    UNSUBSCRIBE_DNS_CACHE_TTL: float = 300
+    # A link that unsubscribed a recipient successfully isn't requested again for the same
+    # recipient for this many seconds, across all workers. 0 turns the cache off.
+    UNSUBSCRIBE_RESULT_CACHE_TTL: int = 60 * 60 * 24 * 7
+    # Each host gets UNSUBSCRIBE_HOST_RATE unsubscribe requests per second, with bursts of up
+    # to UNSUBSCRIBE_HOST_BURST requests, across all workers.
+    UNSUBSCRIBE_HOST_RATE: float = 5
+    UNSUBSCRIBE_HOST_BURST: int = 10
+    # A host that fails UNSUBSCRIBE_CIRCUIT_FAILURES requests within UNSUBSCRIBE_CIRCUIT_WINDOW
+    # seconds gets no requests for UNSUBSCRIBE_CIRCUIT_COOLDOWN seconds. Its remaining links are
+    # retried after the cooldown, up to UNSUBSCRIBE_MAX_RETRIES times.
+    UNSUBSCRIBE_CIRCUIT_FAILURES: int = 3
+    UNSUBSCRIBE_CIRCUIT_WINDOW: int = 60
+    UNSUBSCRIBE_CIRCUIT_COOLDOWN: int = 300
+    UNSUBSCRIBE_MAX_RETRIES: int = 3
+    # The unsubscribe statuses are committed every UNSUBSCRIBE_COMMIT_BATCH_SIZE links.
+    UNSUBSCRIBE_COMMIT_BATCH_SIZE: int = 50
+
     FIRST_SUPERUSER: EmailStr
     FIRST_SUPERUSER_PASSWORD: str
 
@@ -1,6 +1,8 @@
 from typing import List, Optional
 
 from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.crud.base import CRUDBase
@@ -23,26 +25,27 @@ class CRUDLinkedEmails(CRUDBase[LinkedEmails, LinkedEmailsCreate, LinkedEmailsUp
         """
         return db.query(LinkedEmails).filter(LinkedEmails.email == email).first()
 
-    def get_by_user_id(self, db: Session, *, user_id: int) -> List[dict]:
+    async def get_by_user_id(self, db: AsyncSession, *, user_id: int) -> List[dict]:
         """Get all linked_email entries by user_id
 
         Args:
-            db (Session): The db session
+            db (AsyncSession): The async db session
             user_id (int): the user_id
 
         Returns:
             List[dict]: A list of dictionary data about the linked emails
         """
         results = (
-            db.query(
-                LinkedEmails.email,
-                LinkedEmails.id,
-                LinkedEmails.is_active,
-                LinkedEmails.insert_ts,
+            await db.execute(
+                select(
+                    LinkedEmails.email,
+                    LinkedEmails.id,
+                    LinkedEmails.is_active,
+                    LinkedEmails.insert_ts,
+                )
+                .filter(LinkedEmails.user_id == user_id)
             )
-            .filter(LinkedEmails.user_id == user_id)
-            .all()
-        )
+        ).all()
 
         return [
             {
@@ -82,6 +85,35 @@ class CRUDLinkedEmails(CRUDBase[LinkedEmails, LinkedEmailsCreate, LinkedEmailsUp
 
         return linked_email
 
+    async def get_single_by_user_id_async(
+        self, db: AsyncSession, *, user_id: int, linked_email_address: str
+    ) -> LinkedEmails:
+        """The async version of get_single_by_user_id.
+
+        Args:
+            db (AsyncSession): The async db session
+            user_id (int): The session user_id
+            linked_email_address (str): The linked_email to check
+
+        Returns:
+            LinkedEmails: The possible linked email object
+        """
+        linked_email = (
+            await db.execute(
+                select(LinkedEmails)
+                .filter(
+                    LinkedEmails.email == linked_email_address,
+                    LinkedEmails.user_id == user_id,
+                )
+                .limit(1)
+            )
+        ).scalars().first()
+
+        if not linked_email:
+            raise HTTPException(status_code=400, detail=f"Could not find linked email")
+
+        return linked_email
+
     def create_with_user(
         self, db: Session, *, obj_in: LinkedEmailsCreate, user_id: int
     ) -> LinkedEmails:
@@ -1,25 +1,33 @@
-from typing import List
+from typing import List, Optional, Tuple
 
+from celery.utils import uuid
 from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.crud.base import CRUDBase
 from app import crud
 from app.models.scanned_emails import ScannedEmails
 from app.models.linked_emails import LinkedEmails
+from app.models.unsubscribe_links import UnsubscribeStatus
+from app.objects.cursor import decode_cursor, encode_cursor
 from app.objects.email_unsubscriber import EmailUnsubscriber
+from app.objects.listing_count_cache import ListingCountCache
+from app.objects.sender_summary_writer import SenderSummaryWriter
 from app.schemas.scanned_emails import (
     ScanEmails,
     ScannedEmailsCreate,
     ScannedEmailUpdate,
 )
 from app.config import security
+from app.config.config import settings
 
 
 class CRUDScannedEmails(
     CRUDBase[ScannedEmails, ScannedEmailsCreate, ScannedEmailUpdate]
 ):
-    def scan_emails(self, db: Session, *, obj_in: ScanEmails, user_id: int) -> int:
+    def scan_emails(self, db: Session, *, obj_in: ScanEmails, user_id: int) -> str:
         """Scan emails from a linked_email address.
 
         Args:
@@ -28,7 +36,7 @@ class CRUDScannedEmails(
             user_id (int): the session user's user_id.
 
         Returns:
-            int: The celery task id for scanning the emails
+            str: The celery group id for scanning the emails
         """
 
         # Get the linked_email from the db
@@ -61,134 +69,248 @@ class CRUDScannedEmails(
                 detail=f"Could not login for linked email '{linked_email.email}'",
             )
         
-        # TODO: Currently our logic is create 1 celeryworker to scan the entire inbox.
-        # This takes way too long when a user has thousands of emails. Instead, let's divide the work
-        # into multiple celery tasks per linked email. This should in theory speed up the time it takes
-        # to san an entire user's inbox.
-        # 1. Change the linked_email task_id column to an array of task ids.
-        # 2. When the front-end makes a request to scan emails allow the backend to check how many emails
-        #      a user has, then divide up the work into a number of taskworkers scanning seperate parts of
-        #      a user's inbox.
-        # 3. To get the scan progress change the backend to accept a list of task_ids instead of just one
-        #      and assemble the tasks states into one.
-        task_id = email_unsubscriber.get_unsubscribe_links_from_inbox(
-            linked_email_id=linked_email.id, user_id=user_id,
-        )
+        # The inbox scan is split into several celery tasks, the group id is used to
+        # poll the combined progress of the scan. Rescans pick up from the last scan checkpoint.
+        # The group id is saved before the scan starts, the scan clears it when it finishes.
+        scan_task_id = uuid()
+        linked_email.scan_task_id = scan_task_id
+        db.commit()
+
+        task_id = None
+        try:
+            task_id = email_unsubscriber.get_unsubscribe_links_from_inbox(
+                linked_email_id=linked_email.id,
+                user_id=user_id,
+                uid_validity=linked_email.uid_validity,
+                last_scanned_uid=linked_email.last_scanned_uid,
+                highest_modseq=linked_email.highest_modseq,
+                scan_task_id=scan_task_id,
+            )
+        finally:
+            # Nothing was started, there's nothing to clear the group id.
+            if not task_id:
+                linked_email.scan_task_id = None
+                db.commit()
+
         return task_id
     
-    def get_senders_by_linked_email(
+    async def get_senders_by_linked_email(
             self,
-            db: Session,
+            db: AsyncSession,
             *,
             user_id: int,
             linked_email: str,
-            page: int = 0,
-    ) -> List[dict]:
-        """Get a list of email senders that were scanned by linked_email.
+            cursor: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Get a page of the email senders that were scanned by linked_email, ordered by sender.
 
         Args:
-            db (Session): The db session
+            db (AsyncSession): The async db session
             user_id (int): The session user
             linked_email (str): The linked_email
-            page (int, optional): The page to fetch. Defaults to 0.
+            cursor (str, optional): The next_cursor of the previous page. Defaults to None, the first page.
 
         Returns:
-            List[dict]: The sender data
+            Tuple[List[dict], Optional[str]]: The sender data and the cursor of the next page,
+                None if this is the last page
         """
-        linked_email = crud.linked_email.get_single_by_user_id(
+        linked_email = await crud.linked_email.get_single_by_user_id_async(
             db, user_id=user_id, linked_email_address=linked_email
         )
 
-        # Fetch 10 at a time
-        offset = 0
+        page_size = settings.SENDERS_PAGE_SIZE
+        # Fetch one more sender than the page size to know if there's a next page.
+        bind = {"linked_email": linked_email.email, "limit": page_size + 1}
+        after_cursor = ""
 
-        if page:
-            offset = page * 10
+        if cursor:
+            (bind["after_email_from"],) = decode_cursor(cursor, str)
+            after_cursor = "AND email_from > :after_email_from"
 
-        bind = {"linked_email": linked_email.email, "offset": offset}
-
-        results = db.execute(
-            f"""SELECT DISTINCT
+        # The senders' counts are kept in the sender_summaries rollup.
+        results = await db.execute(
+            text(f"""SELECT
                     email_from,
-                    COUNT(DISTINCT se.id) AS scanned_email_count,
-                    COUNT(ul.id) AS unsubscribe_link_count,
-                    COUNT(*) OVER() as total_count,
-
-                    -- Get an array of unsubscribe statuses for this sender. Cast back to text array so sqlalchemy can return as a list in python
-                    ( array_agg( ul.unsubscribe_status ) FILTER ( WHERE ul.unsubscribe_status IS NOT NULL ) )::text[] AS unsubscribe_statuses
+                    scanned_email_count,
+                    unsubscribe_link_count,
+                    pending_count,
+                    success_count,
+                    failure_count,
+                    unsure_count
                 FROM
-                    scanned_emails se
-                LEFT OUTER JOIN
-                    unsubscribe_links AS ul
-                ON ul.scanned_email_id = se.id
+                    sender_summaries
                 WHERE
-                    se.linked_email_address = :linked_email
-                GROUP BY email_from
+                    linked_email_address = :linked_email
+                    {after_cursor}
                 ORDER BY email_from
-                LIMIT 10
-                OFFSET :offset
-            """,
+                LIMIT :limit
+            """),
             bind
-        ).all()
-        return [ dict(res) for res in results ]
+        )
+        senders = [
+            {
+                "email_from": res["email_from"],
+                "scanned_email_count": res["scanned_email_count"],
+                "unsubscribe_link_count": res["unsubscribe_link_count"],
+                "unsubscribe_status_counts": {
+                    status.value: res[f"{status.value}_count"]
+                    for status in UnsubscribeStatus
+                },
+                # The distinct unsubscribe statuses of the sender's links.
+                "unsubscribe_statuses": [
+                    status.value for status in UnsubscribeStatus
+                    if res[f"{status.value}_count"] > 0
+                ] or None,
+            }
+            for res in results.mappings()
+        ]
+
+        next_cursor = None
+        if len(senders) > page_size:
+            senders = senders[:page_size]
+            next_cursor = encode_cursor(senders[-1]["email_from"])
+
+        return senders, next_cursor
+
+    async def count_senders_by_linked_email(
+        self, db: AsyncSession, *, user_id: int, linked_email: str,
+    ) -> int:
+        """Count the email senders that were scanned by linked_email. The count is cached.
+
+        Args:
+            db (AsyncSession): The async db session
+            user_id (int): The session user
+            linked_email (str): The linked_email
+
+        Returns:
+            int: The number of senders
+        """
+        linked_email = await crud.linked_email.get_single_by_user_id_async(
+            db, user_id=user_id, linked_email_address=linked_email
+        )
 
-    def get_scanned_emails(
+        async def count() -> int:
+            return (
+                await db.execute(
+                    text("""SELECT COUNT(*)
+                        FROM sender_summaries
+                        WHERE linked_email_address = :linked_email
+                    """),
+                    {"linked_email": linked_email.email},
+                )
+            ).scalar()
+
+        return await ListingCountCache().get_count(linked_email.email, "senders", count)
+
+    async def get_scanned_emails(
         self,
-        db: Session,
+        db: AsyncSession,
         *,
         user_id: int,
         linked_email: str,
         email_from: str,
-        page: int = 0,
-    ) -> List[dict]:
-        """Get a paginated list of scanned emails. Filter by a specific email from address.
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Get a page of the scanned emails from a specific email from address, ordered by subject.
 
         Args:
-            db (Session): The db session
+            db (AsyncSession): The async db session
             user_id (int): The session user_id
             linked_email (str): Filter scanned_emails owned by a linked_email address.
             email_from (str): An email to filter by.
-            page (int, optional): The page to fetch. Defaults to 0.
+            cursor (str, optional): The next_cursor of the previous page. Defaults to None, the first page.
+
         Returns:
-            List[dict]: The scanned email data
+            Tuple[List[dict], Optional[str]]: The scanned email data and the cursor of the next page,
+                None if this is the last page
         """
-        linked_email = crud.linked_email.get_single_by_user_id(
+        linked_email = await crud.linked_email.get_single_by_user_id_async(
             db, user_id=user_id, linked_email_address=linked_email
         )
 
-        if page:
-            offset = page * 10
-        else:
-            offset = 0
-
+        page_size = settings.SCANNED_EMAILS_PAGE_SIZE
+        # Fetch one more email than the page size to know if there's a next page.
         bind = {
+            "linked_email": linked_email.email,
             "email_from": email_from,
-            "offset": offset
+            "limit": page_size + 1,
         }
+        after_cursor = ""
+
+        if cursor:
+            bind["after_subject"], bind["after_id"] = decode_cursor(cursor, str, int)
+            after_cursor = (
+                "AND (subject, id) > (CAST(:after_subject AS TEXT), CAST(:after_id AS INTEGER))"
+            )
 
-        results = db.execute(
-            f"""SELECT
+        # Pick the emails of the page before joining their links. Emails without a subject
+        # have an empty one and sort first.
+        results = await db.execute(
+            text(f"""SELECT
                     se.id,
                     se.subject,
                     COUNT(ul.id) AS unsubscribe_link_count,
-                    ( array_agg( ul.unsubscribe_status ) FILTER ( WHERE ul.unsubscribe_status IS NOT NULL ) )::text[] AS unsubscribe_statuses,
-                    COUNT(*) OVER() as total_count
-                FROM
-                    scanned_emails AS se
+                    ( array_agg( ul.unsubscribe_status ) FILTER ( WHERE ul.unsubscribe_status IS NOT NULL ) )::text[] AS unsubscribe_statuses
+                FROM (
+                    SELECT id, subject
+                    FROM scanned_emails
+                    WHERE
+                        linked_email_address = :linked_email
+                        AND email_from = :email_from
+                        {after_cursor}
+                    ORDER BY subject, id
+                    LIMIT :limit
+                ) AS se
                 LEFT OUTER JOIN
                     unsubscribe_links AS ul
                 ON
                     ul.scanned_email_id = se.id
-                WHERE
-                    se.email_from = :email_from
-                GROUP BY se.id, se.insert_ts
-                ORDER BY se.subject
-                LIMIT 10
-                OFFSET :offset
-            """,
+                GROUP BY se.id, se.subject
+                ORDER BY se.subject, se.id
+            """),
             bind,
-        ).all()
-        return [ dict(res) for res in results ]
+        )
+        scanned_emails = [ dict(res) for res in results.mappings() ]
+
+        next_cursor = None
+        if len(scanned_emails) > page_size:
+            scanned_emails = scanned_emails[:page_size]
+            next_cursor = encode_cursor(scanned_emails[-1]["subject"], scanned_emails[-1]["id"])
+
+        return scanned_emails, next_cursor
+
+    async def count_scanned_emails(
+        self, db: AsyncSession, *, user_id: int, linked_email: str, email_from: str,
+    ) -> int:
+        """Count the scanned emails from a specific email from address. The count is cached.
+
+        Args:
+            db (AsyncSession): The async db session
+            user_id (int): The session user_id
+            linked_email (str): The linked_email the scanned emails belong to
+            email_from (str): The email from address
+
+        Returns:
+            int: The number of scanned emails
+        """
+        linked_email = await crud.linked_email.get_single_by_user_id_async(
+            db, user_id=user_id, linked_email_address=linked_email
+        )
+
+        async def count() -> int:
+            return (
+                await db.execute(
+                    text("""SELECT COUNT(*)
+                        FROM scanned_emails
+                        WHERE linked_email_address = :linked_email AND email_from = :email_from
+                    """),
+                    {"linked_email": linked_email.email, "email_from": email_from},
+                )
+            ).scalar()
+
+        return await ListingCountCache().get_count(
+            linked_email.email, f"scanned_emails:{email_from}", count,
+        )
     
     def delete_scanned_emails(
             self,
@@ -213,12 +335,18 @@ class CRUDScannedEmails(
             db, user_id=user_id, linked_email_address=linked_email
         )
 
-        deleted_count = db.execute(
-            "DELETE FROM scanned_emails WHERE linked_email_id = :linked_email_id",
-            {"linked_email_id": link_email_obj.id},
-        ).count()
+        # The links are deleted with their scanned emails by the cascade.
+        deleted_senders = db.execute(
+            text(
+                "DELETE FROM scanned_emails WHERE linked_email_address = :linked_email_address "
+                "RETURNING email_from"
+            ),
+            {"linked_email_address": link_email_obj.email},
+        ).scalars().all()
+        SenderSummaryWriter(db, link_email_obj.email).refresh(set(deleted_senders))
         db.commit()
-        return deleted_count
+        ListingCountCache().invalidate(link_email_obj.email)
+        return len(deleted_senders)
 
 
 scanned_emails = CRUDScannedEmails(ScannedEmails)
@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 from app.config.security import get_password_hash, verify_password
 from app.crud.base import CRUDBase
 from app.models.users import User
+from app.objects.user_cache import user_cache
 from app.schemas.users import UserCreate, UserUpdate
 
 
@@ -35,7 +36,11 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         if update_data["password"]:
             hashed_password = get_password_hash(update_data["password"])
             update_data["password"] = hashed_password
-        return super().update(db, db_obj=db_obj, obj_in=update_data)
+        updated_user = super().update(db, db_obj=db_obj, obj_in=update_data)
+        # Drop the cached user once the update is committed, so it can't be cached again
+        # from the old row.
+        user_cache.invalidate(updated_user.id)
+        return updated_user
 
     def remove(self, db: Session, *, id: int, email: str) -> User:
         """Remove a user's account from the db.
@@ -52,6 +57,7 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         obj = db.query(self.model).get({"id": id, "email": email})
         db.delete(obj)
         db.commit()
+        user_cache.invalidate(id)
         return obj
 
     def authenticate(self, db: Session, *, email: str, password: str) -> Optional[User]:
@@ -6,3 +6,4 @@ from app.models.linked_emails import LinkedEmails
 from app.models.scanned_emails import ScannedEmails
 from app.models.unsubscribe_links import UnsubscribeLinks
 from app.models.invite_codes import InviteCodes
+from app.models.sender_summaries import SenderSummaries
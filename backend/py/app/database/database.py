@@ -1,6 +1,7 @@
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.config.config import settings
@@ -8,6 +9,13 @@ from app.config.config import settings
 engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The async engine is created on first use so the celery workers, which only use
+# the sync engine, don't need asyncpg. Its pooled connections belong to the event loop
+# they were opened on, so it must be created on the loop that serves the requests and
+# disposed when that loop shuts down, see dispose_async_engine.
+_async_engine: AsyncEngine = None
+_AsyncSessionLocal: sessionmaker = None
+
 
 def get_db() -> Generator:
     try:
@@ -15,3 +23,42 @@ def get_db() -> Generator:
         yield db
     finally:
         db.close()
+
+
+def get_async_session_local() -> sessionmaker:
+    """Get the async session factory, creating the async engine on first use.
+
+    Returns:
+        sessionmaker: The AsyncSession factory
+    """
+    global _async_engine, _AsyncSessionLocal
+
+    if _AsyncSessionLocal is None:
+        _async_engine = create_async_engine(settings.ASYNC_SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
+        # Objects stay readable after a commit, lazy loading them again would need an await.
+        _AsyncSessionLocal = sessionmaker(
+            autocommit=False,
+            autoflush=False,
+            expire_on_commit=False,
+            bind=_async_engine,
+            class_=AsyncSession,
+        )
+
+    return _AsyncSessionLocal
+
+
+async def get_async_db() -> AsyncGenerator:
+    async with get_async_session_local()() as db:
+        yield db
+
+
+async def dispose_async_engine() -> None:
+    """Close the pooled connections of the async engine. The next request creates a new
+    engine on its own event loop.
+    """
+    global _async_engine, _AsyncSessionLocal
+
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _AsyncSessionLocal = None
@@ -0,0 +1,46 @@
+from typing import Optional
+
+import redis
+import redis.asyncio
+
+from app.config.config import settings
+
+# The redis clients shared by this process, see get_redis and get_async_redis.
+_redis: Optional[redis.Redis] = None
+_async_redis: Optional[redis.asyncio.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """Get the redis client for the state shared between worker processes, e.g. the
+    unsubscribe result cache. The client is created on first use so forked celery
+    workers don't share connections.
+
+    Returns:
+        redis.Redis: The redis client
+    """
+    global _redis
+
+    if _redis is None:
+        _redis = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        )
+    return _redis
+
+
+def get_async_redis() -> redis.asyncio.Redis:
+    """Get the asyncio redis client used by the async endpoints.
+
+    Returns:
+        redis.asyncio.Redis: The asyncio redis client
+    """
+    global _async_redis
+
+    if _async_redis is None:
+        _async_redis = redis.asyncio.Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        )
+    return _async_redis
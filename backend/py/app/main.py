@@ -3,6 +3,7 @@ from starlette.middleware.cors import CORSMiddleware
 
 from app.api.api import api_router
 from app.config.config import settings
+from app.database.database import dispose_async_engine
 
 app = FastAPI(title="Email Tidy")
 
@@ -17,3 +18,9 @@ if settings.BACKEND_CORS_ORIGINS:
     )
 
 app.include_router(api_router)
+
+
+# The async engine's connections are bound to the serving event loop, close them with it.
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    await dispose_async_engine()
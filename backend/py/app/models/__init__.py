@@ -3,3 +3,4 @@ from .linked_emails import LinkedEmails
 from .scanned_emails import ScannedEmails
 from .unsubscribe_links import UnsubscribeLinks, UnsubscribeStatus
 from .invite_codes import InviteCodes
+from .sender_summaries import SenderSummaries
@@ -1,4 +1,5 @@
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
     Integer,
@@ -26,12 +27,20 @@ class LinkedEmails(Base):
     insert_ts = Column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
+    # The celery group id of the scan tasks for this linked email.
     scan_task_id = Column(
         String, nullable=True,
     )
     unsubscribe_task_id = Column(
         String, nullable=True,
     )
+    # The scan checkpoint. The UIDVALIDITY of the inbox and the highest UID covered by the
+    # last completed scan. A rescan only scans emails above last_scanned_uid unless the
+    # UIDVALIDITY of the inbox has changed. highest_modseq is only set when the imap
+    # server supports CONDSTORE.
+    uid_validity = Column(BigInteger, nullable=True)
+    last_scanned_uid = Column(BigInteger, nullable=True)
+    highest_modseq = Column(BigInteger, nullable=True)
     user_id = Column(
         Integer,
         ForeignKey("users.id", ondelete="CASCADE", onupdate="CASCADE"),
@@ -1,4 +1,14 @@
-from sqlalchemy import Column, DateTime, Integer, ForeignKey, String
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    ForeignKey,
+    String,
+    UniqueConstraint,
+    text,
+)
 from sqlalchemy.sql import func
 
 from app.database.base_class import Base
@@ -12,10 +22,39 @@ class ScannedEmails(Base):
     the email subject, and the date the email was added to the inbox.
     """
 
+    # An email is only added once per linked email, rescans skip it using this constraint.
+    # Its columns aren't nullable, Postgres would treat every NULL as a distinct value.
+    __table_args__ = (
+        UniqueConstraint(
+            "linked_email_address",
+            "email_from",
+            "subject",
+            "inbox_date",
+            name="uq_scanned_emails_natural_key",
+        ),
+        # The scanned emails listing of a sender pages on (subject, id).
+        Index(
+            "ix_scanned_emails_listing",
+            "linked_email_address",
+            "email_from",
+            "subject",
+            "id",
+        ),
+        # Expunged emails are looked up by UID.
+        Index(
+            "ix_scanned_emails_uid",
+            "linked_email_address",
+            "uid",
+            postgresql_where=text("uid IS NOT NULL"),
+        ),
+    )
+
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     email_from = Column(String, nullable=False)
-    subject = Column(String)
-    inbox_date = Column(DateTime(timezone=True))
+    subject = Column(String, nullable=False, server_default="")
+    inbox_date = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # The imap UID of the email, used to remove emails that were expunged from the inbox.
+    uid = Column(BigInteger, nullable=True)
     insert_ts = Column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy.sql import func
+
+from app.database.base_class import Base
+
+
+class SenderSummaries(Base):
+    """The sender_summaries table. A rollup of the scanned emails and unsubscribe links of
+    each email sender of a linked email, so the senders listing doesn't aggregate them on
+    every request. It's kept current by the scan writer and the unsubscribe tasks, see
+    SenderSummaryWriter.
+    """
+
+    linked_email_address = Column(
+        String,
+        ForeignKey("linked_emails.email", ondelete="CASCADE", onupdate="CASCADE"),
+        primary_key=True,
+    )
+    email_from = Column(String, primary_key=True)
+    scanned_email_count = Column(Integer, nullable=False, default=0, server_default="0")
+    unsubscribe_link_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # The number of the sender's unsubscribe links with each unsubscribe status.
+    pending_count = Column(Integer, nullable=False, default=0, server_default="0")
+    success_count = Column(Integer, nullable=False, default=0, server_default="0")
+    failure_count = Column(Integer, nullable=False, default=0, server_default="0")
+    unsure_count = Column(Integer, nullable=False, default=0, server_default="0")
+    update_ts = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
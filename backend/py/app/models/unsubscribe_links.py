@@ -1,7 +1,18 @@
 import enum
 
-from sqlalchemy import Column, DateTime, Enum, Integer, ForeignKey, String
-from sqlalchemy.sql import func
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Enum,
+    Index,
+    Integer,
+    ForeignKey,
+    String,
+    UniqueConstraint,
+    text,
+)
+from sqlalchemy.sql import expression, func
 
 from app.database.base_class import Base
 
@@ -21,9 +32,27 @@ class UnsubscribeLinks(Base):
     we add an entry to this table. It references an email sender and a linked_email.
     """
 
+    # A link is only added once per linked email, it's the same link for every email from a sender.
+    __table_args__ = (
+        UniqueConstraint(
+            "link", "linked_email_address", name="uq_unsubscribe_links_natural_key",
+        ),
+        # The links of the scanned emails are joined into the listings.
+        Index("ix_unsubscribe_links_scanned_email_id", "scanned_email_id"),
+        # Only the pending links of a linked email are unsubscribed from.
+        Index(
+            "ix_unsubscribe_links_pending",
+            "linked_email_address",
+            postgresql_where=text("unsubscribe_status = 'pending'"),
+        ),
+    )
+
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     link = Column(String, nullable=False)
     unsubscribe_status = Column(Enum(UnsubscribeStatus), nullable=False)
+    # The email supports RFC 8058 one-click unsubscribe for this link, we unsubscribe
+    # with a single POST instead of a GET.
+    one_click = Column(Boolean, nullable=False, default=False, server_default=expression.false())
     insert_ts = Column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
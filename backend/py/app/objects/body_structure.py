@@ -0,0 +1,152 @@
+import binascii
+import quopri
+import re
+
+from itertools import takewhile
+from typing import Any, Iterator, List, Optional, Tuple
+
+# Used to split an imap response line into parens, quoted strings, literal markers and atoms.
+# Atoms keep their [section] together, e.g. BODY[1.2]<0>
+TOKEN_RE = re.compile(rb'[()]|"(?:[^"\\]|\\.)*"|\{\d+\}$|(?:[^\s()"\[]|\[[^\]]*\])+')
+
+# The start and end of a parenthesized list while parsing.
+_OPEN = object()
+_CLOSE = object()
+
+
+def _tokenize(data: list) -> Iterator[Any]:
+    """Split the data returned by imaplib into tokens. imaplib returns every literal as a
+    tuple of (b'<the line up to the literal> {<size>}', <literal>), the literal takes the
+    place of its {<size>} marker.
+    """
+    for item in data:
+        line, literal = item if isinstance(item, tuple) else (item, None)
+        if not isinstance(line, bytes):
+            continue
+
+        for match in TOKEN_RE.finditer(line):
+            token = match.group()
+            if token == b"(":
+                yield _OPEN
+            elif token == b")":
+                yield _CLOSE
+            elif token.startswith(b'"'):
+                yield re.sub(rb'\\(.)', rb"\1", token[1:-1]).decode(errors="replace")
+            elif token.startswith(b"{"):
+                yield literal if literal is not None else b""
+            elif token.upper() == b"NIL":
+                yield None
+            else:
+                yield token.decode(errors="replace")
+
+
+def _parse_list(tokens: Iterator[Any]) -> list:
+    """Parse tokens into a list up to the closing paren, nesting inner lists."""
+    values = []
+    for token in tokens:
+        if token is _CLOSE:
+            break
+        values.append(_parse_list(tokens) if token is _OPEN else token)
+    return values
+
+
+def parse_fetch_response(data: list) -> List[Tuple[int, dict]]:
+    """Parse the untagged responses of a FETCH command into the fetched items of each message.
+
+    Args:
+        data (list): The data returned by imaplib's fetch
+
+    Returns:
+        List[Tuple[int, dict]]: The message sequence number and the items of each message,
+            e.g. (4, {"UID": "17", "BODYSTRUCTURE": [...], "BODY[1]<0>": b"..."})
+    """
+    messages = []
+    tokens = _tokenize(data)
+
+    for token in tokens:
+        # Each response is '<seq> (<name> <value> ...)', skip anything else such as the
+        # closing paren of a response we've read already.
+        if not isinstance(token, str) or not token.isdigit():
+            continue
+
+        if next(tokens, None) is not _OPEN:
+            continue
+
+        values = _parse_list(tokens)
+        messages.append((int(token), {
+            str(name).upper(): value for name, value in zip(values[::2], values[1::2])
+        }))
+
+    return messages
+
+
+def get_text_parts(body_structure: list, section: str = "") -> List[Tuple[str, str, Optional[str], str, int]]:
+    """Get the text/plain and text/html parts of an email from its BODYSTRUCTURE. Parts sent
+    as attachments and the parts of attached emails are left out.
+
+    Args:
+        body_structure (list): The parsed BODYSTRUCTURE of the email
+        section (str, optional): The section number of body_structure within the email.
+            Defaults to "", the whole email.
+
+    Returns:
+        List[Tuple[str, str, Optional[str], str, int]]: The section number, subtype, charset,
+            content transfer encoding and encoded size of each text part,
+            e.g. ("1.2", "html", "utf-8", "base64", 20480)
+    """
+    # A multipart body starts with its parts, followed by the multipart subtype.
+    if body_structure and isinstance(body_structure[0], list):
+        text_parts = []
+        for i, part in enumerate(takewhile(lambda p: isinstance(p, list), body_structure)):
+            part_section = f"{section}.{i + 1}" if section else str(i + 1)
+            text_parts.extend(get_text_parts(part, part_section))
+        return text_parts
+
+    # A single part body is (type subtype params id description encoding size lines md5 disposition ...)
+    if len(body_structure) < 7:
+        return []
+
+    media_type, subtype, params, _, _, encoding, size = body_structure[:7]
+    if str(media_type).lower() != "text" or str(subtype).lower() not in ("plain", "html"):
+        return []
+
+    disposition = body_structure[9] if len(body_structure) > 9 else None
+    if isinstance(disposition, list) and disposition and str(disposition[0]).lower() == "attachment":
+        return []
+
+    charset = None
+    if isinstance(params, list):
+        for name, value in zip(params[::2], params[1::2]):
+            if str(name).lower() == "charset":
+                charset = value
+
+    size = int(size) if str(size).isdigit() else 0
+
+    return [(section or "1", str(subtype).lower(), charset, str(encoding or "7bit").lower(), size)]
+
+
+def decode_text_part(data: bytes, charset: Optional[str], encoding: str) -> str:
+    """Decode a text part fetched from the imap server. The part may be cut off when only
+    its first bytes were fetched, a partial base64 group at the end is dropped.
+
+    Args:
+        data (bytes): The content of the part, still content transfer encoded
+        charset (Optional[str]): The charset of the part. Defaults to utf-8 when None.
+        encoding (str): The content transfer encoding of the part
+
+    Returns:
+        str: The decoded text
+    """
+    if encoding == "base64":
+        data = b"".join(data.split())
+        try:
+            data = binascii.a2b_base64(data[:len(data) - len(data) % 4])
+        except binascii.Error:
+            data = b""
+    elif encoding == "quoted-printable":
+        data = quopri.decodestring(data)
+
+    try:
+        return data.decode(charset or "utf-8", errors="replace")
+    except LookupError:
+        return data.decode("utf-8", errors="replace")
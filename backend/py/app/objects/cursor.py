@@ -0,0 +1,51 @@
+import base64
+import binascii
+import json
+
+from typing import Any, Tuple
+
+from fastapi import HTTPException
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encode the sort key of the last row of a page into an opaque cursor token.
+    The next page starts after this row.
+
+    Args:
+        values (Any): The json serializable sort key values
+
+    Returns:
+        str: The cursor token
+    """
+    return base64.urlsafe_b64encode(
+        json.dumps(values, separators=(",", ":")).encode()
+    ).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: type) -> Tuple[Any, ...]:
+    """Decode a cursor token from encode_cursor.
+
+    Args:
+        cursor (str): The cursor token
+        types (type): The type of each sort key value the cursor should hold, e.g. str, int
+
+    Raises:
+        HTTPException: If the cursor isn't valid
+
+    Returns:
+        Tuple[Any, ...]: The sort key values
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # A well formed cursor can still hold the wrong values, don't pass those to the query.
+    if (
+        not isinstance(values, list)
+        or len(values) != len(types)
+        or any(type(value) is not value_type for value, value_type in zip(values, types))
+    ):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return tuple(values)
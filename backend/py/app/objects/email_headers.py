@@ -0,0 +1,89 @@
+import re
+
+from email.header import Header
+from email.policy import compat32
+from typing import Dict, List, Optional, Union
+
+# The blank line that ends the header block.
+HEADER_BLOCK_END_RE = re.compile(rb"\r?\n\r?\n")
+
+
+class EmailHeaders:
+    """The header fields pulled out of a raw header block by EmailHeaderParser. Reading a
+    field works like reading it from a Message, it returns the first occurrence of the field
+    or None. The raw value is only decoded when the field is read.
+    """
+
+    __slots__ = ("_values",)
+
+    def __init__(self, values: Dict[str, bytes]) -> None:
+        """Create the header fields.
+
+        Args:
+            values (Dict[str, bytes]): The lower cased name and raw value of each field
+        """
+        self._values = values
+
+    def __getitem__(self, name: str) -> Optional[Union[str, Header]]:
+        value = self._values.get(name.lower())
+        if value is None:
+            return None
+
+        # Same as the compat32 policy of Message, the value keeps its folding and any 8 bit
+        # bytes become a Header with the unknown-8bit charset.
+        if value.isascii():
+            return value.decode("ascii").lstrip(" \t").rstrip("\r\n")
+
+        value = value.decode("ascii", "surrogateescape").lstrip(" \t").rstrip("\r\n")
+        return compat32.header_fetch_parse(name, value)
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self._values
+
+    def get(self, name: str, failobj: Optional[str] = None) -> Optional[Union[str, Header]]:
+        value = self[name]
+        return failobj if value is None else value
+
+
+class EmailHeaderParser:
+    """Pulls a fixed set of fields out of raw email header blocks, without building the
+    Message object model of the whole block.
+
+    The fields are compiled into one regex when the parser is created. A field starts at
+    the beginning of a line with its name and a colon, folded fields continue on the lines
+    that start with whitespace.
+    """
+
+    def __init__(self, fields: List[str]) -> None:
+        """Create a header parser.
+
+        Args:
+            fields (List[str]): The names of the header fields to parse
+        """
+        self.fields = list(fields)
+
+        names = b"|".join(re.escape(field.encode()) for field in self.fields)
+        self.pattern = re.compile(
+            rb"^(" + names + rb"):(.*(?:\r?\n[ \t].*)*)",
+            re.IGNORECASE | re.MULTILINE,
+        )
+
+    def parse(self, raw_headers: bytes) -> EmailHeaders:
+        """Parse the fields out of a raw header block. Anything after the blank line that
+        ends the header block is ignored.
+
+        Args:
+            raw_headers (bytes): The raw header block of an email
+
+        Returns:
+            EmailHeaders: The fields found in the header block
+        """
+        end = HEADER_BLOCK_END_RE.search(raw_headers)
+        if end is not None:
+            raw_headers = raw_headers[:end.start()]
+
+        values = {}
+        for match in self.pattern.finditer(raw_headers):
+            values.setdefault(match.group(1).lower().decode(), match.group(2))
+
+        return EmailHeaders(values)
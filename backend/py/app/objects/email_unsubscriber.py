@@ -1,11 +1,15 @@
-import email
-import quopri
+import math
 import re
 import os
+import time
+import lxml.etree
 import lxml.html
 
 from celery import Celery
 from celery import Task
+from celery import chord
+from celery.utils import uuid
+from collections import defaultdict
 from charset_normalizer import from_bytes
 from datetime import datetime
 from sqlalchemy.orm import Session
@@ -13,17 +17,25 @@ from email.header import decode_header
 from email.message import Message
 from email.header import Header
 from email.utils import parsedate_to_datetime
+from string import ascii_lowercase, ascii_uppercase
 from fastapi import HTTPException
 from imaplib import IMAP4_SSL
-from typing import List, Tuple
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
 
-from app.models import ScannedEmails, UnsubscribeLinks, UnsubscribeStatus
+from app.objects.body_structure import decode_text_part, get_text_parts, parse_fetch_response
+from app.objects.email_headers import EmailHeaderParser, EmailHeaders
+from app.objects.keyword_matcher import KeywordMatcher
+from app.objects.scan_pipeline import ScanPipeline
+from app.objects.scanned_email_writer import ScannedEmailWriter
 from app.config.config import settings
 
 celery = Celery(__name__)
 
 # Used to match an https link for unsubscribing.
-UNSUB_LINK_RE = r"(?:(?:https?):\/\/)[\w/\-?=%~.]+\.[\w/\-&?=%~]+"
+UNSUB_LINK_RE = re.compile(r"(?:(?:https?):\/\/)[\w/\-?=%~.]+\.[\w/\-&?=%~]+")
+
+# Used to get the UID out of a FETCH response.
+UID_RE = re.compile(rb"UID (\d+)")
 
 class EmailUnsubscriber:
     """Email Unsubscriber Class"""
@@ -37,10 +49,36 @@ class EmailUnsubscriber:
         "if you no longer wish to receive this email",
         "subscription",
     ]
+    # Finds the first position of every unsubscribe keyword in a text/plain body in one pass.
+    UNSUBSCRIBE_KEYWORD_MATCHER = KeywordMatcher(UNSUBSCRIBE_KEYWORDS)
+    # Gets the href of every html <a> element whose text contains an unsubscribe keyword, in any case,
+    # in one walk of the html tree. For example <a href="https://example_link.com/unsub_from_me">Unsubscribe</a>
+    UNSUBSCRIBE_LINKS_XPATH = lxml.etree.XPath(
+        ".//a[{}]/@href".format(
+            " or ".join(
+                f"contains(translate(normalize-space(text()), '{ascii_uppercase}', '{ascii_lowercase}'), '{keyword.lower()}')"
+                for keyword in UNSUBSCRIBE_KEYWORDS
+            )
+        ),
+        smart_strings=False,
+    )
+    # The email headers the scanner reads. Marketing emails often carry several KB of
+    # DKIM/ARC/Received headers that we don't need to download.
+    SCANNED_HEADER_FIELDS = [
+        "FROM",
+        "SUBJECT",
+        "DATE",
+        "LIST-UNSUBSCRIBE",
+        "LIST-UNSUBSCRIBE-POST",
+    ]
+    # Pulls the scanned fields out of the fetched headers without a full Message object.
+    SCANNED_HEADER_PARSER = EmailHeaderParser(SCANNED_HEADER_FIELDS)
     SUPPORTED_IMAP_SERVERS = {
         "yahoo": "imap.mail.yahoo.com",
         "gmail": "imap.gmail.com",
     }
+    # The SUPPORTED_IMAP_SERVERS that support gmail's X-GM-RAW search.
+    GMAIL_SEARCH_SERVERS = ["gmail"]
 
     def __init__(self, email_type: str, imap_server: str = None) -> None:
         """Connect to the email's imap server by email_type.
@@ -59,6 +97,9 @@ class EmailUnsubscriber:
 
         self.email_type = email_type
         self.email = None
+        self.capabilities = None
+        # The bytes fetched and the stage stats of the last _do_scan_emails.
+        self.scan_stats = None
 
         # Now login to the imap server
         imap_server = imap_server or self.SUPPORTED_IMAP_SERVERS[email_type]
@@ -123,29 +164,42 @@ class EmailUnsubscriber:
         return domain
 
     def get_unsubscribe_links_from_inbox(
-        self, linked_email_id: int, user_id: int
-    ) -> List[dict]:
+        self,
+        linked_email_id: int,
+        user_id: int,
+        uid_validity: int = None,
+        last_scanned_uid: int = None,
+        highest_modseq: int = None,
+        scan_task_id: str = None,
+    ) -> Optional[str]:
         """Iterate through the Inbox looking through the email body for
         words in `self.UNSUBSCRIBE_KEYWORDS`.
         If one of the keywords is found in the email body we look for a
         possible link that is following the position of said found keyword.
 
+        When the linked email has a scan checkpoint from the same UIDVALIDITY only
+        the emails that arrived after the checkpoint are scanned. If the server supports
+        CONDSTORE the changes since the checkpoint's HIGHESTMODSEQ are asked for instead,
+        and with QRESYNC the emails expunged since then are removed from scanned_emails.
+
+        With IMAP_PREFILTER_LIST_UNSUBSCRIBE the server is searched for the emails that
+        have a List-Unsubscribe header and only those are fetched and scanned, unless
+        IMAP_BODY_SCAN_FALLBACK also scans the bodies of the emails without one.
+
         Args:
             linked_email_id (int): The id of the linked email
             user_id (int): The user id of the actor
+            uid_validity (int, optional): The UIDVALIDITY of the last scan checkpoint
+            last_scanned_uid (int, optional): The highest UID scanned by the last scan
+            highest_modseq (int, optional): The HIGHESTMODSEQ of the last scan checkpoint
+            scan_task_id (str, optional): The celery group id to give the scan, so it can be saved
+                before the scan is started. Defaults to None, a new id.
 
         Returns:
-            List[dict]: A list of data describing the emails scanned in this format.
-                [
-                    {
-                        "id": 52,
-                        "from": "sender@spam.mail.com",
-                        "subject": "subject of email",
-                        "link_count": 3
-                    },
-                    ...
-                ]
+            Optional[str]: The celery group id of the scan, None if there's nothing to scan
         """
+        # Enable CONDSTORE/QRESYNC before selecting so the server reports HIGHESTMODSEQ.
+        mod_sequence_extension = self._enable_mod_sequences()
 
         # Readonly does not mark emails as SEEN
         status, messages = self.imap.select("INBOX", readonly=True)
@@ -160,24 +214,325 @@ class EmailUnsubscriber:
         if not messages or not messages[0] or not int(messages[0]):
             return
         
-        from app.celery_worker import scan_emails
+        from app.celery_worker import scan_emails, scan_emails_complete, scan_emails_failed
 
         number_of_emails = int(messages[0])
+        mailbox_uid_validity = self._get_response_code_value("UIDVALIDITY")
+        uid_next = self._get_response_code_value("UIDNEXT")
+        mailbox_highest_modseq = None
+        if mod_sequence_extension:
+            mailbox_highest_modseq = self._get_response_code_value("HIGHESTMODSEQ")
+
+        vanished_uids = []
+        prefilter_criteria = None
+        # The body scan fallback needs the emails without a List-Unsubscribe header too.
+        if settings.IMAP_PREFILTER_LIST_UNSUBSCRIBE and not settings.IMAP_BODY_SCAN_FALLBACK:
+            prefilter_criteria = self._get_list_unsubscribe_search_criteria()
+
+        if (
+            uid_validity is not None
+            and uid_validity == mailbox_uid_validity
+            and last_scanned_uid is not None
+        ):
+            if highest_modseq is not None and mailbox_highest_modseq is not None:
+                # Ask the server for what changed since the last scan, including expunged
+                # emails when QRESYNC is enabled.
+                changed_uids, vanished_uids = self._fetch_changed_since(
+                    highest_modseq, vanished=mod_sequence_extension == "QRESYNC",
+                )
+                uids = [ uid for uid in changed_uids if uid > last_scanned_uid ]
+
+                if uids and prefilter_criteria:
+                    uids = self._search_uids(f"UID {self._to_sequence_set(uids)} {prefilter_criteria}")
+            else:
+                # Only scan the emails that arrived since the last scan. Searching 'n:*' always
+                # matches the last email in the inbox, so filter out UIDs we've already scanned.
+                criteria = f"UID {last_scanned_uid + 1}:*"
+                if prefilter_criteria:
+                    criteria = f"{criteria} {prefilter_criteria}"
+
+                uids = [ uid for uid in self._search_uids(criteria) if uid > last_scanned_uid ]
+
+            if not uids and not vanished_uids:
+                return
+
+            shards = [
+                {"uids": shard}
+                for shard in self._split_shards(
+                    uids,
+                    shard_count=settings.SCAN_SHARD_COUNT,
+                    min_shard_size=settings.SCAN_MIN_SHARD_SIZE,
+                )
+            ]
+        elif prefilter_criteria:
+            # Let the server find the emails with a List-Unsubscribe header so we only
+            # download those. Scan them newest first, like the full scan.
+            uids = self._search_uids(prefilter_criteria)[::-1]
+
+            shards = [
+                {"uids": shard}
+                for shard in self._split_shards(
+                    uids,
+                    shard_count=settings.SCAN_SHARD_COUNT,
+                    min_shard_size=settings.SCAN_MIN_SHARD_SIZE,
+                )
+            ]
+        else:
+            # Fetch and scan emails by descending, that is the top of the inbox to the end.
+            range_params = (number_of_emails, 0, -1)
+
+            shards = [
+                {"range_params": shard}
+                for shard in self._split_range_params(
+                    range_params,
+                    shard_count=settings.SCAN_SHARD_COUNT,
+                    min_shard_size=settings.SCAN_MIN_SHARD_SIZE,
+                )
+            ]
+
+        # Every email below UIDNEXT is covered by this scan, so the next scan can start there.
+        checkpoint = None
+        if mailbox_uid_validity is not None and uid_next is not None:
+            checkpoint = (mailbox_uid_validity, uid_next - 1, mailbox_highest_modseq)
+
+        scan_task_id = scan_task_id or uuid()
+        callback = scan_emails_complete.s(linked_email_id, checkpoint, vanished_uids)
+
+        # Hand off the work to celery. Each shard is scanned by its own task and
+        # scan_emails_complete adds up the results once every shard is done. When only emails
+        # were expunged there are no shards and celery runs scan_emails_complete right away.
+        result = chord(
+            [ scan_emails.s(self.email_type, linked_email_id, user_id, **shard) for shard in shards ],
+            task_id=scan_task_id,
+        )(
+            callback.on_error(scan_emails_failed.si(linked_email_id)),
+            task_id=self.get_scan_complete_task_id(scan_task_id),
+        )
+
+        # Save the group so the combined progress of the shards can be looked up by the group id.
+        group_result = result.parent
+        group_result.save()
+        return group_result.id
+
+    @staticmethod
+    def get_scan_complete_task_id(scan_task_id: str) -> str:
+        """Get the task id of the scan_emails_complete callback of an inbox scan.
+
+        Args:
+            scan_task_id (str): The celery group id of the scan
+
+        Returns:
+            str: The task id of the scan's scan_emails_complete task
+        """
+        return f"{scan_task_id}-complete"
+
+    def _get_capabilities(self) -> Set[str]:
+        """Get the capabilities of the imap server. Servers often advertise more
+        capabilities once logged in, so these are asked for again after login.
+
+        Returns:
+            Set[str]: The capabilities, e.g. {"IMAP4REV1", "CONDSTORE"}
+        """
+        if self.email is None:
+            return set(self.imap.capabilities)
+
+        if self.capabilities is None:
+            response, data = self.imap.capability()
+            if response != "OK" or not data:
+                self.capabilities = set(self.imap.capabilities)
+            else:
+                self.capabilities = set(data[-1].decode().upper().split())
+
+            # Let imaplib know about the capabilities too, it checks them for ENABLE.
+            self.imap.capabilities = tuple(self.capabilities)
 
-        # Fetch and scan emails by descending, that is the top of the inbox to the end.
-        range_params = (number_of_emails, 0, -1)
+        return self.capabilities
 
-        # Hand off the work to celery and return the job_id
-        task = scan_emails.delay(self.email_type, linked_email_id, user_id, range_params)
-        return task.task_id
+    def _enable_mod_sequences(self) -> Optional[str]:
+        """Enable QRESYNC, or CONDSTORE, if the imap server supports it. This must
+        happen before the mailbox is selected.
 
-    def _do_scan_emails(self, task: Task, range_params: tuple, db: Session ) -> int:
-        """Scan the emails in the inbox.
+        Returns:
+            Optional[str]: The enabled extension, None if the server supports neither
+        """
+        capabilities = self._get_capabilities()
+
+        for extension in ("QRESYNC", "CONDSTORE"):
+            if extension not in capabilities:
+                continue
+
+            if "ENABLE" in capabilities:
+                response, _ = self.imap.enable(extension)
+                if response != "OK":
+                    continue
+            elif extension == "QRESYNC":
+                # QRESYNC can only be used after an ENABLE.
+                continue
+
+            return extension
+
+        return None
+
+    def _fetch_changed_since(
+        self, modseq: int, vanished: bool = False,
+    ) -> Tuple[List[int], List[int]]:
+        """Get the UIDs of the emails changed or added since `modseq` with CONDSTORE
+        and, with QRESYNC, the UIDs of the emails expunged since then.
+
+        Args:
+            modseq (int): The HIGHESTMODSEQ of the last scan
+            vanished (bool, optional): Also ask for expunged emails. Requires QRESYNC.
+
+        Raises:
+            Exception: If we can't fetch the changes
+
+        Returns:
+            Tuple[List[int], List[int]]: The changed UIDs and the expunged UIDs
+        """
+        modifiers = f"(CHANGEDSINCE {modseq} VANISHED)" if vanished else f"(CHANGEDSINCE {modseq})"
+        response, data = self.imap.uid("FETCH", "1:*", "(UID)", modifiers)
+
+        if response != "OK":
+            raise Exception(f"Unable to fetch changes since: {modseq}\tResponse: {response}")
+
+        changed_uids = sorted({
+            int(uid)
+            for item in data if isinstance(item, bytes)
+            for uid in UID_RE.findall(item)
+        })
+
+        vanished_uids = []
+        _, vanished_data = self.imap.response("VANISHED")
+        for item in vanished_data or []:
+            if item:
+                vanished_uids.extend(self._from_sequence_set(item.decode().split()[-1]))
+
+        return changed_uids, sorted(vanished_uids)
+
+    def _get_list_unsubscribe_search_criteria(self) -> str:
+        """Get the search criteria matching the emails that have a List-Unsubscribe header.
+        Gmail's X-GM-RAW search is used when the server supports it since gmail doesn't
+        index arbitrary headers for SEARCH HEADER.
+
+        Returns:
+            str: The search criteria
+        """
+        if (
+            self.email_type in self.GMAIL_SEARCH_SERVERS
+            or "X-GM-EXT-1" in self._get_capabilities()
+        ):
+            return 'X-GM-RAW "has:list-unsubscribe"'
+
+        # An empty string matches every email that has the header.
+        return 'HEADER List-Unsubscribe ""'
+
+    def _get_response_code_value(self, code: str) -> Optional[int]:
+        """Get the value of a response code sent by the imap server when selecting
+        a mailbox, e.g. UIDVALIDITY or UIDNEXT.
+
+        Args:
+            code (str): The response code
+
+        Returns:
+            Optional[int]: The value, None if the server didn't send it
+        """
+        _, data = self.imap.response(code)
+        if not data or data[-1] is None:
+            return None
+        return int(data[-1])
+
+    def _search_uids(self, criteria: str) -> List[int]:
+        """Search the selected mailbox and return the matching UIDs.
+
+        Args:
+            criteria (str): The search criteria, e.g. 'UID 100:*'
+
+        Raises:
+            Exception: If the search fails
+
+        Returns:
+            List[int]: The matching UIDs in ascending order
+        """
+        response, data = self.imap.uid("SEARCH", criteria)
+        if response != "OK":
+            raise Exception(f"Unable to search emails: {criteria}\tResponse: {response}")
+
+        return sorted(int(uid) for uid in b" ".join(data).split())
+
+    @classmethod
+    def _split_range_params(
+        cls, range_params: tuple, shard_count: int, min_shard_size: int = 1,
+    ) -> List[tuple]:
+        """Split range params into disjoint contiguous range params.
+
+        Args:
+            range_params (tuple): The range params to split, e.g. (100, 0, -1)
+            shard_count (int): The max number of range params to split into
+            min_shard_size (int, optional): The min number of emails in a shard. Defaults to 1.
+
+        Returns:
+            List[tuple]: The range params of each shard, e.g. [(100, 50, -1), (50, 0, -1)]
+        """
+        return [
+            (shard.start, shard.stop, shard.step)
+            for shard in cls._split_shards(range(*range_params), shard_count, min_shard_size)
+        ]
+
+    @staticmethod
+    def _split_shards(
+        message_ids: Sequence[int], shard_count: int, min_shard_size: int = 1,
+    ) -> List[Sequence[int]]:
+        """Split message ids into disjoint contiguous shards of about the same size.
+
+        Args:
+            message_ids (Sequence[int]): The message sequence numbers or UIDs to split
+            shard_count (int): The max number of shards to split into
+            min_shard_size (int, optional): The min number of emails in a shard. Defaults to 1.
+
+        Returns:
+            List[Sequence[int]]: The shards
+        """
+        if not message_ids:
+            return []
+
+        shard_count = max(1, min(shard_count, len(message_ids) // max(min_shard_size, 1)))
+        shard_size = math.ceil(len(message_ids) / shard_count)
+
+        return [
+            message_ids[i:i + shard_size] for i in range(0, len(message_ids), shard_size)
+        ]
+
+    def _do_scan_emails(
+        self,
+        task: Task,
+        range_params: tuple,
+        db: Session,
+        batch_size: int = None,
+        narrow_fetch: bool = None,
+        uids: List[int] = None,
+        body_scan: bool = None,
+    ) -> int:
+        """Scan the emails in the inbox. Emails are fetched from the imap server
+        in batches of `batch_size` emails per FETCH command to save on round trips,
+        and each batch is written to the db in a single transaction. Scans of at least
+        SCAN_COPY_MIN_EMAILS emails are written with COPY in bigger batches.
+
+        Fetching, parsing and writing run as the stages of a ScanPipeline, so the next batch
+        is fetched while the last ones are parsed in the SCAN_PARSE_PROCESSES processes and
+        written. The throughput of each stage is reported in the task progress and kept in
+        `scan_stats` with the bytes fetched once the scan is done.
 
         Args:
             task (Task): The celery task object
             range_params (tuple): The range params used to fetch emails from the inbox
             db (Session): The db session
+            batch_size (int, optional): The number of emails to fetch per FETCH command.
+                Defaults to settings.IMAP_FETCH_BATCH_SIZE
+            narrow_fetch (bool, optional): Only fetch the headers in SCANNED_HEADER_FIELDS.
+                Defaults to settings.IMAP_NARROW_HEADER_FETCH
+            uids (List[int], optional): Scan the emails with these UIDs instead of range_params
+            body_scan (bool, optional): Look for unsubscribe links in the text parts of the emails
+                without a List-Unsubscribe link. Defaults to settings.IMAP_BODY_SCAN_FALLBACK
 
         Raises:
             Exception: If we can't fetch the email
@@ -192,51 +547,383 @@ class EmailUnsubscriber:
             raise Exception(
                 f"Could not select Inbox...\tGot status: {status}",
             )
-        
-        # TODO Turn these into logs
-        # print("Fetching emails...")
-        current_iteration = 0
-        scanned_emails = 0
-        total_emails = range_params[0]
-
-        for i in range(*range_params):
 
-            # Fetch the email headers first to look for unsubscribe link headers
-            response, headers = self.imap.fetch(str(i), '(BODY.PEEK[HEADER])')
+        batch_size = batch_size or settings.IMAP_FETCH_BATCH_SIZE
+        if narrow_fetch is None:
+            narrow_fetch = settings.IMAP_NARROW_HEADER_FETCH
+        if body_scan is None:
+            body_scan = settings.IMAP_BODY_SCAN_FALLBACK
+        message_ids = uids if uids is not None else list(range(*range_params))
 
-            if response != "OK":
-                raise Exception(f"Unable to fetch email: {i}\Response: {response}")
+        scanned_emails = 0
+        bytes_fetched = 0
+        total_emails = len(message_ids)
+
+        # COPY is faster for big scans but only pays off with big batches, so those are
+        # written once the writer's batch is full instead of after every fetch.
+        use_copy = total_emails >= settings.SCAN_COPY_MIN_EMAILS
+        writer = ScannedEmailWriter(db, self.email, use_copy=use_copy)
+
+        def write_emails(parsed_emails: List[tuple]) -> None:
+            """Write a batch of parsed emails, the write stage of the scan pipeline."""
+            nonlocal scanned_emails
+
+            for uid, datetime_obj, email_from, email_subject, unsubscribe_links, one_click_links in parsed_emails:
+                scanned_emails += len(
+                    writer.add(
+                        email_from,
+                        email_subject,
+                        datetime_obj,
+                        unsubscribe_links,
+                        uid=uid,
+                        one_click_links=one_click_links,
+                    )
+                )
 
-            # Get the email headers as a message object
-            email_msg = email.message_from_bytes(headers[0][1])
+            if not use_copy:
+                scanned_emails += len(writer.flush())
+
+        # Report the total up front so the progress of all the scan shards can be combined.
+        task.update_state(
+            state='PROGRESS',
+            meta={
+                'current': 0,
+                'total': total_emails,
+                'bytes_fetched': bytes_fetched,
+            }
+        )
 
-            # Get the time the email was added to the inbox.
-            datetime_obj = parsedate_to_datetime(email_msg["Date"])
+        with ScanPipeline(
+            self._parse_email_headers,
+            write_emails,
+            processes=settings.SCAN_PARSE_PROCESSES,
+            queue_size=settings.SCAN_PIPELINE_QUEUE_SIZE,
+        ) as pipeline:
+            for batch_start in range(0, total_emails, batch_size):
+                batch = message_ids[batch_start:batch_start + batch_size]
+
+                # Fetch the email headers first to look for unsubscribe link headers, they're
+                # parsed while the next batch is fetched.
+                fetch_start = time.perf_counter()
+                headers = self._fetch_email_headers(
+                    batch, narrow_fetch=narrow_fetch, uid=uids is not None,
+                )
+                batch_bytes = sum(len(email_headers) for _, email_headers in headers)
+                pipeline.fetched(len(headers), time.perf_counter() - fetch_start, batch_bytes)
+                bytes_fetched += batch_bytes
+
+                parsed_emails = pipeline.parse(headers)
+
+                # Then look for unsubscribe links in the bodies of the emails without any in their
+                # headers. This needs the imap connection, so the batch is parsed first.
+                if body_scan:
+                    parsed_emails = pipeline.get_records(parsed_emails)
+
+                    fetch_start = time.perf_counter()
+                    body_links, body_bytes = self._fetch_body_unsubscribe_links(
+                        [ parsed[0] for parsed in parsed_emails if parsed[0] is not None and not parsed[4] ]
+                    )
+                    pipeline.fetched(0, time.perf_counter() - fetch_start, body_bytes)
+                    bytes_fetched += body_bytes
+
+                    parsed_emails = [
+                        (*parsed[:4], parsed[4] or body_links.get(parsed[0], []), parsed[5])
+                        for parsed in parsed_emails
+                    ]
+
+                pipeline.write(parsed_emails)
+
+                # Update the celery task state to log our progress
+                task.update_state(
+                    state='PROGRESS',
+                    meta={
+                        'current': pipeline.stats["write"].items,
+                        'total': total_emails,
+                        'bytes_fetched': bytes_fetched,
+                        'stages': pipeline.get_stats(),
+                    }
+                )
 
-            # Scan the email Message object
-            scanned_email = self._scan_email_message_obj(db, email_msg, self.email, datetime_obj)
+            stages = pipeline.join()
 
-            if scanned_email:
-                scanned_emails += 1
+        scanned_emails += len(writer.flush())
 
-            # Update the celery task state to log our progress
-            task.update_state(
-                state='PROGRESS',
-                meta={
-                    'current': current_iteration,
-                    'total': total_emails,
-                }
-            )
-            current_iteration += 1
+        self.scan_stats = {
+            'bytes_fetched': bytes_fetched,
+            'stages': stages,
+        }
+        task.update_state(
+            state='PROGRESS',
+            meta={
+                'current': stages["write"]["emails"],
+                'total': total_emails,
+                **self.scan_stats,
+            }
+        )
 
         # Close the INBOX
         self.imap.close()
 
         return scanned_emails
 
+    def _fetch_email_headers(
+        self, message_ids: List[int], narrow_fetch: bool = False, uid: bool = False,
+    ) -> List[Tuple[int, bytes]]:
+        """Fetch the headers of multiple emails with a single FETCH command.
+
+        Args:
+            message_ids (List[int]): The message sequence numbers or UIDs to fetch
+            narrow_fetch (bool, optional): Only fetch the headers in SCANNED_HEADER_FIELDS.
+            uid (bool, optional): message_ids are UIDs, use UID FETCH.
+
+        Raises:
+            Exception: If we can't fetch the emails
+
+        Returns:
+            List[Tuple[int, bytes]]: The UID and raw headers of each email, in the same order
+                as `message_ids`. Emails missing from the response are skipped.
+        """
+        sequence_set = self._to_sequence_set(message_ids)
+
+        if narrow_fetch:
+            query = f"(UID BODY.PEEK[HEADER.FIELDS ({' '.join(self.SCANNED_HEADER_FIELDS)})])"
+        else:
+            query = "(UID BODY.PEEK[HEADER])"
+
+        if uid:
+            response, data = self.imap.uid("FETCH", sequence_set, query)
+        else:
+            response, data = self.imap.fetch(sequence_set, query)
+
+        if response != "OK":
+            raise Exception(f"Unable to fetch emails: {sequence_set}\tResponse: {response}")
+
+        fetched = {
+            message_uid if uid else seq: (message_uid, literal)
+            for seq, message_uid, literal in self._split_fetch_response(data)
+        }
+        return [ fetched[i] for i in message_ids if i in fetched ]
+
+    def _fetch_body_unsubscribe_links(
+        self, uids: List[int], max_bytes: int = None, tail_bytes: int = None,
+    ) -> Tuple[Dict[int, List[str]], int]:
+        """Look for unsubscribe links in the bodies of multiple emails. The BODYSTRUCTURE of the
+        emails is fetched first so only their text/plain and text/html parts are downloaded,
+        without images and attachments, and at most `max_bytes` of each part.
+
+        Unsubscribe links are almost always in the footer of an email, so with `tail_bytes` the
+        end of each part is fetched first. Each window is aligned to a multiple of its size so
+        emails of similar sizes are fetched together, which fetches up to twice the window. When
+        no link is found the window is doubled and the part of it we don't have yet is fetched.
+        Emails and parts missing from a response, e.g. the email was expunged in between, aren't
+        fetched again.
+
+        Args:
+            uids (List[int]): The UIDs of the emails
+            max_bytes (int, optional): The max bytes to fetch of each text part.
+                Defaults to settings.IMAP_BODY_SCAN_MAX_BYTES
+            tail_bytes (int, optional): The size of the first window fetched from the end of each
+                text part, 0 fetches the start of the parts. Defaults to settings.IMAP_BODY_SCAN_TAIL_BYTES
+
+        Raises:
+            Exception: If we can't fetch the emails
+
+        Returns:
+            Tuple[Dict[int, List[str]], int]: The unsubscribe links found in the body of each
+                email by UID, and the number of body bytes fetched
+        """
+        max_bytes = max_bytes or settings.IMAP_BODY_SCAN_MAX_BYTES
+        if tail_bytes is None:
+            tail_bytes = settings.IMAP_BODY_SCAN_TAIL_BYTES
+        unsubscribe_links = {}
+        bytes_fetched = 0
+        if not uids:
+            return unsubscribe_links, bytes_fetched
+
+        sequence_set = self._to_sequence_set(uids)
+        response, data = self.imap.uid("FETCH", sequence_set, "(UID BODYSTRUCTURE)")
+        if response != "OK":
+            raise Exception(f"Unable to fetch email structures: {sequence_set}\tResponse: {response}")
+
+        text_parts = {}
+        for _, items in parse_fetch_response(data):
+            if "UID" in items and isinstance(items.get("BODYSTRUCTURE"), list):
+                text_parts[int(items["UID"])] = get_text_parts(items["BODYSTRUCTURE"])
+
+        # The offset and content fetched so far of each text part. From the tail the content
+        # grows towards the start of the part, nothing is fetched yet when the offset is the size.
+        fetched = {
+            uid: { section: (size, b"") for section, _, _, _, size in parts }
+            for uid, parts in text_parts.items()
+        }
+        # The (uid, section) of the parts the server didn't return.
+        missing = set()
+        window = min(tail_bytes, max_bytes) if tail_bytes else max_bytes
+        pending = [ uid for uid, parts in text_parts.items() if parts ]
+
+        while pending:
+            # The emails fetching the same ranges of the same sections are fetched together.
+            # Most emails are a single text/html part or a multipart/alternative of text/plain
+            # and text/html.
+            emails_by_ranges = defaultdict(list)
+            for uid in pending:
+                ranges = []
+                for section, _, _, _, size in text_parts[uid]:
+                    if (uid, section) in missing:
+                        continue
+
+                    end = fetched[uid][section][0]
+                    if not tail_bytes:
+                        ranges.append((section, 0, max_bytes))
+                        continue
+
+                    start = max(0, (size - window) // window * window, size - max_bytes)
+                    if start < end:
+                        # The first window is fetched to the end of the part whatever its size,
+                        # never more than the max_bytes we haven't fetched yet.
+                        count = end - start if end < size else 2 * window
+                        ranges.append((section, start, min(count, max_bytes - (size - end))))
+
+                if ranges:
+                    emails_by_ranges[tuple(ranges)].append(uid)
+
+            for ranges, range_uids in emails_by_ranges.items():
+                sequence_set = self._to_sequence_set(range_uids)
+                query = f"(UID {' '.join(f'BODY.PEEK[{section}]<{start}.{count}>' for section, start, count in ranges)})"
+
+                response, data = self.imap.uid("FETCH", sequence_set, query)
+                if response != "OK":
+                    raise Exception(f"Unable to fetch email bodies: {sequence_set}\tResponse: {response}")
+
+                answered_uids = set()
+                for _, items in parse_fetch_response(data):
+                    uid = int(items.get("UID", 0))
+                    if uid not in fetched:
+                        continue
+                    answered_uids.add(uid)
+
+                    for section, start, _ in ranges:
+                        # Partial fetches are answered with the origin octet, e.g. BODY[1]<0>
+                        content = items.get(f"BODY[{section}]<{start}>", items.get(f"BODY[{section}]"))
+                        if content is None:
+                            missing.add((uid, section))
+                            continue
+                        if isinstance(content, str):
+                            content = content.encode()
+
+                        bytes_fetched += len(content)
+                        fetched[uid][section] = (start, content + fetched[uid][section][1])
+
+                    body_parts = []
+                    for section, subtype, charset, encoding, _ in text_parts[uid]:
+                        start, content = fetched[uid][section]
+                        if start > 0:
+                            # Drop the cut off first line, e.g. a partial base64 group or html tag.
+                            content = content.partition(b"\n")[2]
+                        if content:
+                            body_parts.append((subtype, decode_text_part(content, charset, encoding)))
+
+                    unsubscribe_links[uid] = self._get_unsubscribe_links_from_body_parts(body_parts)
+
+                missing.update(
+                    (uid, section)
+                    for uid in range_uids if uid not in answered_uids
+                    for section, _, _ in ranges
+                )
+
+            # Widen the window of the emails without links until their parts are fetched up
+            # to max_bytes.
+            pending = [
+                uid for uid in pending
+                if tail_bytes
+                and not unsubscribe_links.get(uid)
+                and any(
+                    (uid, section) not in missing
+                    and fetched[uid][section][0] > max(0, size - max_bytes)
+                    for section, _, _, _, size in text_parts[uid]
+                )
+            ]
+            window *= 2
+
+        return unsubscribe_links, bytes_fetched
+
+    @staticmethod
+    def _split_fetch_response(data: list) -> List[Tuple[int, Optional[int], bytes]]:
+        """Split the response of a multi-message FETCH command into the data of each message.
+        imaplib returns each message literal as a tuple of (b'<seq> (<items> {<size>}', <literal>)
+        followed by the closing b')'.
+
+        Args:
+            data (list): The data returned by imaplib's fetch
+
+        Returns:
+            List[Tuple[int, Optional[int], bytes]]: The message sequence number, UID (if it was
+                fetched) and literal of each message
+        """
+        messages = []
+        for i, item in enumerate(data):
+            # Skip closing parens and unsolicited responses such as FLAGS updates.
+            if not isinstance(item, tuple):
+                continue
+
+            seq = int(item[0].split(b" ", 1)[0])
+
+            # The UID item can come before or after the literal.
+            match = UID_RE.search(item[0])
+            if match is None and i + 1 < len(data) and isinstance(data[i + 1], bytes):
+                match = UID_RE.search(data[i + 1])
+
+            messages.append((seq, int(match.group(1)) if match else None, item[1]))
+
+        return messages
+
+    @staticmethod
+    def _from_sequence_set(sequence_set: str) -> List[int]:
+        """Expand an IMAP sequence set into message numbers. e.g. '1,3:5' -> [1, 3, 4, 5]
+
+        Args:
+            sequence_set (str): The sequence set
+
+        Returns:
+            List[int]: The message numbers
+        """
+        message_ids = []
+        for part in sequence_set.split(","):
+            start, _, end = part.partition(":")
+            start, end = int(start), int(end or start)
+            message_ids.extend(range(min(start, end), max(start, end) + 1))
+
+        return message_ids
+
+    @staticmethod
+    def _to_sequence_set(message_ids: List[int]) -> str:
+        """Compress message numbers into an IMAP sequence set. e.g. [5, 4, 3, 1] -> '1,3:5'
+
+        Args:
+            message_ids (List[int]): The message numbers
+
+        Returns:
+            str: The sequence set
+        """
+        ranges = []
+        for message_id in sorted(set(message_ids)):
+            if ranges and ranges[-1][1] == message_id - 1:
+                ranges[-1][1] = message_id
+            else:
+                ranges.append([message_id, message_id])
+
+        return ",".join(
+            str(start) if start == end else f"{start}:{end}" for start, end in ranges
+        )
+
     @classmethod
     def _scan_email_message_obj(
-        cls, db: Session, email_msg: Message, linked_email_address: str, inbox_date: datetime,
+        cls,
+        db: Session,
+        email_msg: Message,
+        linked_email_address: str,
+        inbox_date: datetime,
+        uid: int = None,
     ) -> dict:
         """Scan an email message object. Here we get the message sender info such as
         the email subject and who it's being sent from. Then scan the actual email content
@@ -248,6 +935,7 @@ class EmailUnsubscriber:
             email_message (Message): The email message object.
             linked_email_address (Str): The email address of the recipient
             inbox_date (datetime): The time the email was added to the inbox
+            uid (int, optional): The imap UID of the email
 
         Returns:
             dict: The id, email_from, subject and unsubscribe link count
@@ -259,68 +947,73 @@ class EmailUnsubscriber:
                     "unsubscribe_status": "pending",
                 },
         """
-        # Get the email sender and subject and decode if necessary
-        email_from = cls.decode_email_header(email_msg["From"])
-        email_subject = cls.decode_email_header(email_msg["Subject"])
+        email_from, email_subject, unsubscribe_links, one_click_links = (
+            cls._parse_email_message_obj(email_msg)
+        )
 
-        # Don't add scanned emails that already exist
-        existing_email = (
-            db.query(ScannedEmails)
-            .filter(
-                ScannedEmails.email_from == email_from,
-                ScannedEmails.subject == email_subject,
-                ScannedEmails.inbox_date == inbox_date,
-            )
-            .first()
+        writer = ScannedEmailWriter(db, linked_email_address)
+        writer.add(
+            email_from,
+            email_subject,
+            inbox_date,
+            unsubscribe_links,
+            uid=uid,
+            one_click_links=one_click_links,
         )
+        scanned_emails = writer.flush()
 
-        if existing_email:
-            return {}
+        # Empty if the email was scanned already
+        return scanned_emails[0] if scanned_emails else {}
 
-        # Insert the scanned_email info into the db.
-        scanned_email = ScannedEmails(
-            email_from=email_from,
-            subject=email_subject,
-            linked_email_address=linked_email_address,
-            inbox_date=inbox_date,
-        )
-        db.add(scanned_email)
-        db.flush()
+    @classmethod
+    def _parse_email_headers(
+        cls, headers: List[Tuple[int, bytes]],
+    ) -> List[Tuple[int, datetime, str, str, List[str], List[str]]]:
+        """Parse a batch of fetched email headers, the parse stage of the scan pipeline.
+        This runs in the scan parse processes, so it only takes and returns plain data.
 
-        # Get unsubscribe links
-        unsubscribe_links = cls._get_unsubscribe_links_from_email(email_msg)
+        Args:
+            headers (List[Tuple[int, bytes]]): The UID and raw headers of each email
 
-        # Add all unsubscribe links to the unsubscribe_links table
-        unsubscribe_link_objs = []
+        Returns:
+            List[Tuple[int, datetime, str, str, List[str], List[str]]]: The UID, inbox date,
+                sender, subject, unsubscribe links and one-click unsubscribe links of each email
+        """
+        parsed_emails = []
 
-        for link in unsubscribe_links:
+        for uid, email_headers in headers:
+            # Only pull out the header fields we read
+            email_msg = cls.SCANNED_HEADER_PARSER.parse(email_headers)
 
-            # Don't add an unsubscribe link that exists in the database already
-            link_exists = db.execute(
-                "SELECT EXISTS(SELECT 1 FROM unsubscribe_links WHERE link = :link AND linked_email_address = :linked_email_address)",
-                {"link": link, "linked_email_address": linked_email_address}
-            ).scalar()
-            if link_exists:
-                continue
+            # Get the time the email was added to the inbox.
+            datetime_obj = parsedate_to_datetime(email_msg["Date"])
 
-            unsubscribe_link_objs.append(
-                UnsubscribeLinks(
-                    link=link,
-                    unsubscribe_status=UnsubscribeStatus.pending,
-                    linked_email_address=linked_email_address,
-                    scanned_email_id=scanned_email.id,
-                )
-            )
-        db.add_all(unsubscribe_link_objs)
-        db.flush()
-        db.commit()
-        return {
-            "id": scanned_email.id,
-            "from": email_from,
-            "subject": email_subject,
-            "link_count": len(unsubscribe_link_objs),
-            "unsubscribe_status": "pending",
-        }
+            parsed_emails.append((uid, datetime_obj, *cls._parse_email_message_obj(email_msg)))
+
+        return parsed_emails
+
+    @classmethod
+    def _parse_email_message_obj(
+        cls, email_msg: Union[Message, EmailHeaders],
+    ) -> Tuple[str, str, List[str], List[str]]:
+        """Get the sender, subject and unsubscribe links of an email message object.
+
+        Args:
+            email_msg (Union[Message, EmailHeaders]): The email message object or its parsed headers
+
+        Returns:
+            Tuple[str, str, List[str], List[str]]: The decoded sender and subject, the unsubscribe
+                links and the unsubscribe links that support one-click unsubscribe
+        """
+        # Get the email sender and subject and decode if necessary
+        email_from = cls.decode_email_header(email_msg["From"])
+        email_subject = cls.decode_email_header(email_msg["Subject"])
+
+        # Get unsubscribe links
+        unsubscribe_links = cls._get_unsubscribe_links_from_email(email_msg)
+        one_click_links = cls._get_one_click_unsubscribe_links(email_msg)
+
+        return email_from, email_subject, unsubscribe_links, one_click_links
 
     @staticmethod
     def decode_email_header(
@@ -337,6 +1030,14 @@ class EmailUnsubscriber:
         Returns:
             str: The decoded email header as a string
         """
+        # The email doesn't have the header, e.g. an email without a subject.
+        if email_header is None:
+            return ""
+
+        # Most headers are plain text, decode_header would return them as they are.
+        if isinstance(email_header, str) and "=?" not in email_header:
+            return email_header
+
         decoded_header = decode_header(email_header)
 
         header = ""
@@ -357,13 +1058,13 @@ class EmailUnsubscriber:
 
     @classmethod
     def _get_unsubscribe_links_from_email(
-        cls, email_msg: Message
+        cls, email_msg: Union[Message, EmailHeaders]
     ) -> List[str]:
         """Takes an email message object and parses the body to find links
         that will (hopefully) unsubscribe us from the email.
 
         Args:
-            email_msg (Message): The email Message object.
+            email_msg (Union[Message, EmailHeaders]): The email Message object or its parsed headers.
 
         Returns:
             List[str]: A list of possible unsubscribe links from the email Message.
@@ -377,73 +1078,74 @@ class EmailUnsubscriber:
         # mailto links.
         if list_unsubscribe:
             for link in list_unsubscribe.split(','):
-                match_url = re.search(UNSUB_LINK_RE, link)
+                match_url = UNSUB_LINK_RE.search(link)
                 if match_url is not None and match_url.group() not in unsubscribe_links:
                     unsubscribe_links.append(match_url.group())
 
-        # Later on we can support a full scan of the entire email as a fallback and look for the unsubscribe
-        # links in the body of the email. But for speed, for now we just check the headers.
+        # The headers are all we fetch for speed. With IMAP_BODY_SCAN_FALLBACK the text parts of
+        # the emails without List-Unsubscribe links are scanned by _fetch_body_unsubscribe_links.
         return unsubscribe_links
 
-        # A multipart email message may contain both a text/plain AND text/html email.
-        if email_msg.is_multipart():
-            for part in email_msg.walk():
-                # Get the Content-Type
-                content_type = part.get_content_type()
-                body = part.get_payload()
-
-                # Parse a text/plain email
-                if content_type == "text/plain":
-                    try:
-                        body = quopri.decodestring(body).decode(
-                            "utf-8", errors="ignore"
-                        )
-                    except Exception as e:
-                        # TODO: Log here
-                        # print_warning(
-                        #     f"Was unable to decode body for email: {email_subject}\nError: {e}"
-                        # )
-                        continue
-                    found_links = cls._get_unsubscribe_links_from_text_plain(body=body)
-
-                    # Don't add duplicate links
-                    for link in found_links:
-                        if link not in unsubscribe_links:
-                            unsubscribe_links.append(link)
-
-                # Parse a text/html email
-                elif content_type == "text/html":
-                    try:
-                        body = quopri.decodestring(body).decode(
-                            "utf-8", errors="ignore"
-                        )
-                    except Exception as e:
-                        # TODO: Log here
-                        # print_warning(
-                        #     f"Was unable to decode body for email: {email_subject}\nError: {e}"
-                        # )
-                        continue
-                    found_links = cls._get_unsubscribe_links_from_html(body=body)
+    @classmethod
+    def _get_unsubscribe_links_from_body_parts(
+        cls, body_parts: List[Tuple[str, str]]
+    ) -> List[str]:
+        """Look for unsubscribe links in the text parts of an email's body. An email may contain
+        both a text/plain AND text/html part.
 
-                    # Don't add duplicate links
-                    for link in found_links:
-                        if link not in unsubscribe_links:
-                            unsubscribe_links.append(link)
+        Args:
+            body_parts (List[Tuple[str, str]]): The subtype, plain or html, and decoded
+                content of each text part
 
-        # When the email is not multipart we can pass decode=True to get_payload() to decode the email for us.
-        else:
-            content_type = email_msg.get_content_type()
-            body = email_msg.get_payload(decode=True).decode("utf-8", "replace")
+        Returns:
+            List[str]: The unsubscribe links found.
+        """
+        unsubscribe_links = []
 
-            if content_type == "text/plain":
-                unsubscribe_links = cls._get_unsubscribe_links_from_text_plain(
-                    body=body
-                )
-            elif content_type == "text/html":
-                unsubscribe_links = cls._get_unsubscribe_links_from_html(body=body)
+        for subtype, body in body_parts:
+            if subtype == "html":
+                try:
+                    found_links = cls._get_unsubscribe_links_from_html(body=body)
+                except (lxml.etree.ParserError, ValueError):
+                    # Empty or unparsable html
+                    continue
+            else:
+                found_links = cls._get_unsubscribe_links_from_text_plain(body=body)
+
+            # Don't add duplicate links
+            for link in found_links:
+                if link not in unsubscribe_links:
+                    unsubscribe_links.append(link)
 
         return unsubscribe_links
 
+    @staticmethod
+    def _get_one_click_unsubscribe_links(email_msg: Union[Message, EmailHeaders]) -> List[str]:
+        """Get the List-Unsubscribe links that support RFC 8058 one-click unsubscribe.
+        That's every https link in List-Unsubscribe when the email has the
+        'List-Unsubscribe-Post: List-Unsubscribe=One-Click' header.
+
+        Args:
+            email_msg (Union[Message, EmailHeaders]): The email Message object or its parsed headers.
+
+        Returns:
+            List[str]: The one-click unsubscribe links
+        """
+        list_unsubscribe_post = email_msg["List-Unsubscribe-Post"]
+        list_unsubscribe = email_msg["List-Unsubscribe"]
+        if not list_unsubscribe_post or not list_unsubscribe:
+            return []
+
+        if "".join(str(list_unsubscribe_post).split()).lower() != "list-unsubscribe=one-click":
+            return []
+
+        one_click_links = []
+        for link in str(list_unsubscribe).split(','):
+            match_url = UNSUB_LINK_RE.search(link)
+            if match_url is not None and match_url.group().lower().startswith("https://"):
+                one_click_links.append(match_url.group())
+        return one_click_links
+
     @classmethod
     def _get_unsubscribe_links_from_html(cls, body: str) -> list:
         """Look for unsubscribe links in the body of the email
@@ -457,29 +1159,16 @@ class EmailUnsubscriber:
         """
         unsubscribe_links = []
 
-        # Scrub the html by removing \n and \r characters
-        html = body.replace("\n", "").replace("\r", "")
-
-        # Parse the html using lxml
-        element_tree = lxml.html.fromstring(html)
+        # Parse the html as a document so a fragment, like the end of an email, still has
+        # its <a> elements below the root.
+        element_tree = lxml.html.document_fromstring(body)
 
-        # Get html <a> elements that only contain unsubscribe keywords
-        # For example <a href="https://example_link.com/unsub_from_me">unsubscribe</a>
-        for unsub_keyword in cls.UNSUBSCRIBE_KEYWORDS:
-            # Semi HACK way of checking for upper case characters, use .title()
-            link_elements = element_tree.xpath(
-                f'.//a[contains(text(), "{unsub_keyword}")]'
-            ) or element_tree.xpath(
-                f'.//a[contains(text(), "{unsub_keyword.title()}")]'
-            )
+        for found_link in cls.UNSUBSCRIBE_LINKS_XPATH(element_tree):
+            # Remove \n and \r characters out of the link to sanitize it.
+            found_link = found_link.replace("\n", "").replace("\r", "")
 
-            # If any links are found get them by accessing the 'href' attribute
-            if link_elements is not None and isinstance(link_elements, list):
-                for element in link_elements:
-                    found_link = element.attrib.get("href")
-
-                    if found_link and found_link not in unsubscribe_links:
-                        unsubscribe_links.append(found_link)
+            if found_link and found_link not in unsubscribe_links:
+                unsubscribe_links.append(found_link)
 
         return unsubscribe_links
 
@@ -497,21 +1186,33 @@ class EmailUnsubscriber:
         unsubscribe_links = []
 
         # Look for unsubscribe keywords, some emails have totally different keywords used for their unsubscribe hyperlinks.
-        for unsub_keyword in cls.UNSUBSCRIBE_KEYWORDS:
-            unsub_idx = body.lower().find(unsub_keyword)
+        keyword_positions = cls.UNSUBSCRIBE_KEYWORD_MATCHER.find_first(body)
+        if not keyword_positions:
+            return unsubscribe_links
+
+        # Remove \n and \r characters out of the body to sanitize the links.
+        trimmed_body = body.replace("\n", "").replace("\r", "")
+
+        # Shift the keyword positions by the \n and \r characters removed before them,
+        # counting only the characters between one keyword and the next.
+        trimmed_positions = {}
+        removed = 0
+        last_idx = 0
+        for unsub_idx in sorted(set(keyword_positions.values())):
+            removed += body.count("\n", last_idx, unsub_idx) + body.count("\r", last_idx, unsub_idx)
+            trimmed_positions[unsub_idx] = unsub_idx - removed
+            last_idx = unsub_idx
 
-            if unsub_idx != -1:
-                # Remove \n and \r characters out of the body to sanitize the link.
-                trimmed_body = body[unsub_idx:].replace("\n", "").replace("\r", "")
+        for unsub_keyword in cls.UNSUBSCRIBE_KEYWORDS:
+            unsub_idx = keyword_positions.get(unsub_keyword)
+            if unsub_idx is None:
+                continue
 
-                # Get the link following the unsubscribe keyword
-                match = re.search(
-                    UNSUB_LINK_RE,
-                    trimmed_body,
-                )
+            # Get the link following the unsubscribe keyword
+            match = UNSUB_LINK_RE.search(trimmed_body, trimmed_positions[unsub_idx])
 
-                # If we've found the link check first to make sure we haven't found this link already.
-                if match and match.group() not in unsubscribe_links:
-                    unsubscribe_links.append(match.group())
+            # If we've found the link check first to make sure we haven't found this link already.
+            if match and match.group() not in unsubscribe_links:
+                unsubscribe_links.append(match.group())
 
         return unsubscribe_links
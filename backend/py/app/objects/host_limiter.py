@@ -0,0 +1,165 @@
+import logging
+
+from typing import Optional
+
+import redis
+
+from app.config.config import settings
+from app.database.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Takes a token from the host's token bucket unless the host's circuit is open.
+# Returns -1 if the circuit is open, otherwise the seconds to wait for a token, 0 if one was taken.
+# Redis' clock is used so every worker process sees the same buckets.
+ACQUIRE_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return '-1'
+end
+
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+# Counts a failed request to the host and opens its circuit once there are enough
+# failures within the window. Returns 1 if the circuit was opened.
+RECORD_FAILURE_SCRIPT = """
+local failures = redis.call('INCR', KEYS[1])
+if failures == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+
+if failures >= tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[2], '1', 'EX', ARGV[3])
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+return 0
+"""
+
+
+class HostLimiter:
+    """A per host token bucket rate limiter and circuit breaker for unsubscribe requests,
+    shared by all worker processes through redis.
+
+    Each host gets `rate` requests per second with bursts of up to `burst` requests.
+    Once a host fails `failures` requests within `window` seconds its circuit opens
+    and no requests are sent to it for `cooldown` seconds.
+
+    The limiter fails open, when redis is unavailable every request is let through.
+    """
+
+    KEY_PREFIX = "unsubscribe_host"
+
+    def __init__(
+        self,
+        rate: float = None,
+        burst: int = None,
+        failures: int = None,
+        window: int = None,
+        cooldown: int = None,
+    ) -> None:
+        """Create a host limiter.
+
+        Args:
+            rate (float, optional): The requests per second per host.
+                Defaults to settings.UNSUBSCRIBE_HOST_RATE
+            burst (int, optional): The max burst of requests per host.
+                Defaults to settings.UNSUBSCRIBE_HOST_BURST
+            failures (int, optional): The failures that open a host's circuit.
+                Defaults to settings.UNSUBSCRIBE_CIRCUIT_FAILURES
+            window (int, optional): The seconds the failures are counted over.
+                Defaults to settings.UNSUBSCRIBE_CIRCUIT_WINDOW
+            cooldown (int, optional): The seconds a host's circuit stays open.
+                Defaults to settings.UNSUBSCRIBE_CIRCUIT_COOLDOWN
+        """
+        self.rate = rate or settings.UNSUBSCRIBE_HOST_RATE
+        self.burst = burst or settings.UNSUBSCRIBE_HOST_BURST
+        self.failures = failures or settings.UNSUBSCRIBE_CIRCUIT_FAILURES
+        self.window = window or settings.UNSUBSCRIBE_CIRCUIT_WINDOW
+        self.cooldown = cooldown or settings.UNSUBSCRIBE_CIRCUIT_COOLDOWN
+
+    def acquire(self, host: str) -> Optional[float]:
+        """Try to take a request token for a host.
+
+        Args:
+            host (str): The host
+
+        Returns:
+            Optional[float]: None if the host's circuit is open, otherwise the seconds to wait
+                before trying again, 0 if the request can be sent now
+        """
+        try:
+            wait = float(
+                get_redis().eval(
+                    ACQUIRE_SCRIPT,
+                    2,
+                    self._get_key("bucket", host),
+                    self._get_key("circuit", host),
+                    self.rate,
+                    self.burst,
+                )
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Could not rate limit unsubscribe requests to {host}: {e}")
+            return 0
+
+        return None if wait < 0 else wait
+
+    def record_success(self, host: str) -> None:
+        """Reset the failures of a host after a successful request.
+
+        Args:
+            host (str): The host
+        """
+        try:
+            get_redis().delete(self._get_key("failures", host))
+        except redis.RedisError as e:
+            logger.warning(f"Could not record a successful unsubscribe request to {host}: {e}")
+
+    def record_failure(self, host: str) -> bool:
+        """Count a failed request to a host, opening its circuit after too many failures.
+
+        Args:
+            host (str): The host
+
+        Returns:
+            bool: True if the host's circuit was opened
+        """
+        try:
+            return bool(
+                get_redis().eval(
+                    RECORD_FAILURE_SCRIPT,
+                    2,
+                    self._get_key("failures", host),
+                    self._get_key("circuit", host),
+                    self.failures,
+                    self.window,
+                    self.cooldown,
+                )
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Could not record a failed unsubscribe request to {host}: {e}")
+            return False
+
+    @classmethod
+    def _get_key(cls, name: str, host: str) -> str:
+        return f"{cls.KEY_PREFIX}:{name}:{host}"
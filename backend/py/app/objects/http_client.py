@@ -0,0 +1,171 @@
+import os
+import socket
+import threading
+import time
+
+import httpcore
+import httpx
+
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from httpcore.backends.base import NetworkStream
+from httpcore.backends.sync import SyncBackend
+
+from app.config.config import settings
+
+# The process wide http client, see get_http_client.
+_http_client: Optional[httpx.Client] = None
+_http_client_pid: Optional[int] = None
+_http_client_lock = threading.Lock()
+
+# Counts the requests sent, the connections opened and the dns cache hits and misses.
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(stat: str) -> None:
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+class CachingDNSBackend(SyncBackend):
+    """An httpcore network backend that caches the addresses a host resolves to for
+    `ttl` seconds, so opening connections to the same few hosts doesn't resolve them
+    every time. TLS still uses the host name for SNI and certificate checks.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self._lock = threading.Lock()
+
+    def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+    ) -> NetworkStream:
+        addresses = self._resolve(host, port)
+        _count("connections")
+
+        for address in addresses[:-1]:
+            try:
+                return super().connect_tcp(address, port, timeout, local_address)
+            except httpcore.ConnectError:
+                continue
+
+        try:
+            return super().connect_tcp(addresses[-1], port, timeout, local_address)
+        except httpcore.ConnectError:
+            # The host may have moved, resolve it again next time.
+            with self._lock:
+                self._cache.pop((host, port), None)
+            raise
+
+    def _resolve(self, host: str, port: int) -> List[str]:
+        """Resolve a host to its addresses, using the cache while it's fresh.
+
+        Args:
+            host (str): The host name
+            port (int): The port
+
+        Raises:
+            httpcore.ConnectError: If the host can't be resolved
+
+        Returns:
+            List[str]: The addresses of the host
+        """
+        with self._lock:
+            cached = self._cache.get((host, port))
+        if cached and cached[0] > time.monotonic():
+            _count("dns_hits")
+            return cached[1]
+
+        _count("dns_misses")
+        try:
+            addresses = list(
+                dict.fromkeys(
+                    info[4][0]
+                    for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+                )
+            )
+        except OSError as exc:
+            raise httpcore.ConnectError(exc) from exc
+
+        with self._lock:
+            self._cache[(host, port)] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+
+def _create_http_client() -> httpx.Client:
+    """Create the http client used for unsubscribe requests.
+
+    Returns:
+        httpx.Client: The http client
+    """
+    limits = httpx.Limits(
+        max_connections=settings.UNSUBSCRIBE_CONCURRENCY,
+        max_keepalive_connections=settings.UNSUBSCRIBE_CONCURRENCY,
+        keepalive_expiry=settings.UNSUBSCRIBE_KEEPALIVE_EXPIRY,
+    )
+    transport = httpx.HTTPTransport(http2=settings.UNSUBSCRIBE_HTTP2, limits=limits)
+
+    # httpx doesn't let us pass a network backend, so give its connection pool our own.
+    # This relies on httpcore internals, requirements.txt pins httpcore for it.
+    transport._pool._network_backend = CachingDNSBackend(ttl=settings.UNSUBSCRIBE_DNS_CACHE_TTL)
+
+    return httpx.Client(
+        transport=transport,
+        follow_redirects=True,
+        event_hooks={"request": [lambda request: _count("requests")]},
+    )
+
+
+def get_http_client() -> httpx.Client:
+    """Get the http client shared by all unsubscribe requests of this process. Reusing it
+    keeps the connections to the hosts open between requests. Celery forks its worker
+    processes, so each process creates its own client.
+
+    Returns:
+        httpx.Client: The http client
+    """
+    global _http_client, _http_client_pid
+
+    pid = os.getpid()
+    if _http_client is None or _http_client_pid != pid:
+        with _http_client_lock:
+            if _http_client is None or _http_client_pid != pid:
+                _http_client = _create_http_client()
+                _http_client_pid = pid
+
+    return _http_client
+
+
+def get_http_client_stats() -> dict:
+    """Get the connection pool stats of the http client. A request that opened a new
+    connection is a pool miss, any other request reused a pooled connection.
+
+    Returns:
+        dict: The stats
+            {
+                "requests": 100,
+                "pool_hits": 96,
+                "pool_misses": 4,
+                "dns_hits": 2,
+                "dns_misses": 2,
+            }
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+
+    requests = stats.get("requests", 0)
+    connections = stats.get("connections", 0)
+    return {
+        "requests": requests,
+        "pool_hits": max(requests - connections, 0),
+        "pool_misses": connections,
+        "dns_hits": stats.get("dns_hits", 0),
+        "dns_misses": stats.get("dns_misses", 0),
+    }
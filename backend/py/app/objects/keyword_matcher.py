@@ -0,0 +1,58 @@
+import re
+
+from typing import Dict, List
+
+
+class KeywordMatcher:
+    """Finds where a set of keywords first appears in a text, case insensitively, in a single
+    pass over the text.
+
+    The keywords are compiled into one regex alternation when the matcher is created and the
+    text is lower cased once per search. Keywords may overlap, the search restarts one
+    character after every match so a keyword inside or overlapping another one is still found.
+    """
+
+    def __init__(self, keywords: List[str]) -> None:
+        """Create a keyword matcher.
+
+        Args:
+            keywords (List[str]): The keywords to look for
+        """
+        self.keywords = list(keywords)
+
+        # Longest keywords first so the alternation matches a keyword rather than a keyword it
+        # starts with. The pattern has no groups, those would stop the regex engine from
+        # skipping ahead to the characters the keywords start with.
+        lowered = sorted({keyword.lower() for keyword in self.keywords}, key=len, reverse=True)
+        self.pattern = re.compile("|".join(re.escape(keyword) for keyword in lowered))
+
+        # The keywords each match starts with, including the matched keyword.
+        self.prefixes = {
+            match: [keyword for keyword in self.keywords if match.startswith(keyword.lower())]
+            for match in lowered
+        }
+
+    def find_first(self, text: str) -> Dict[str, int]:
+        """Find the first position of each keyword in the text.
+
+        Args:
+            text (str): The text to search
+
+        Returns:
+            Dict[str, int]: The index each keyword found first starts at in the lower cased text
+        """
+        lowered_text = text.lower()
+        positions = {}
+        pos = 0
+
+        while len(positions) < len(self.keywords):
+            match = self.pattern.search(lowered_text, pos)
+            if match is None:
+                break
+
+            for keyword in self.prefixes[match.group()]:
+                positions.setdefault(keyword, match.start())
+
+            pos = match.start() + 1
+
+        return positions
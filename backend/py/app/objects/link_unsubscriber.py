@@ -0,0 +1,202 @@
+import time
+
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Tuple
+from urllib.parse import urlsplit
+
+from app.config.config import settings
+from app.models import UnsubscribeLinks, UnsubscribeStatus
+from app.objects.host_limiter import HostLimiter
+from app.objects.http_client import get_http_client
+
+
+class LinkUnsubscriber:
+    """Requests unsubscribe links concurrently on a thread pool.
+
+    At most `max_workers` links are requested at once and at most `max_per_host` of
+    those go to the same host, so a slow host doesn't hold up the links of other hosts
+    and we don't flood a single sender with requests. The requests share the process wide
+    http client so connections to the same host are reused.
+
+    With a host_limiter the requests to each host are also rate limited, and the links of
+    a host whose circuit is open aren't requested but collected in `deferred_links` so they
+    can be retried later.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = None,
+        max_per_host: int = None,
+        timeout: float = 5,
+        host_limiter: HostLimiter = None,
+    ) -> None:
+        """Create a link unsubscriber.
+
+        Args:
+            max_workers (int, optional): The max number of links requested at once.
+                Defaults to settings.UNSUBSCRIBE_CONCURRENCY
+            max_per_host (int, optional): The max number of links requested at once per host.
+                Defaults to settings.UNSUBSCRIBE_CONCURRENCY_PER_HOST
+            timeout (float, optional): The timeout of each request in seconds. Defaults to 5.
+            host_limiter (HostLimiter, optional): Rate limits the hosts and trips their circuits.
+                Defaults to None, no limits.
+        """
+        self.max_workers = max_workers or settings.UNSUBSCRIBE_CONCURRENCY
+        self.max_per_host = max_per_host or settings.UNSUBSCRIBE_CONCURRENCY_PER_HOST
+        self.timeout = timeout
+        self.host_limiter = host_limiter
+        self.deferred_links: List[UnsubscribeLinks] = []
+
+    def unsubscribe(
+        self, links: List[UnsubscribeLinks],
+    ) -> Iterator[Tuple[UnsubscribeLinks, UnsubscribeStatus]]:
+        """Request the unsubscribe links, yielding each link with its unsubscribe status
+        as soon as its request is done. The statuses are recorded by the caller, so the
+        link objects are only used on the calling thread. Links of hosts with an open
+        circuit aren't yielded but added to `deferred_links`.
+
+        Args:
+            links (List[UnsubscribeLinks]): The unsubscribe links to request
+
+        Yields:
+            Iterator[Tuple[UnsubscribeLinks, UnsubscribeStatus]]: The link and its unsubscribe status
+        """
+        # Queue the links by host so we can start the links of the hosts that have room.
+        queued: Dict[str, deque] = {}
+        for link in links:
+            queued.setdefault(self._get_host(link.link), deque()).append(link)
+
+        active_per_host = Counter()
+        # The time each rate limited host can be tried again.
+        throttled_until: Dict[str, float] = {}
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while queued or running:
+                for host in list(queued):
+                    while (
+                        queued[host]
+                        and len(running) < self.max_workers
+                        and active_per_host[host] < self.max_per_host
+                        and throttled_until.get(host, 0) <= time.monotonic()
+                    ):
+                        wait_time = self.host_limiter.acquire(host) if self.host_limiter else 0
+
+                        # The host's circuit is open, retry its links later.
+                        if wait_time is None:
+                            self.deferred_links.extend(queued[host])
+                            queued[host].clear()
+                            break
+
+                        if wait_time > 0:
+                            throttled_until[host] = time.monotonic() + wait_time
+                            break
+
+                        link = queued[host].popleft()
+                        future = executor.submit(self._request, link.link, bool(link.one_click))
+                        running[future] = (host, link)
+                        active_per_host[host] += 1
+
+                    if not queued[host]:
+                        del queued[host]
+
+                # Forget the hosts whose wait is over, a host that still can't start waits for
+                # one of its running links instead of waking us up over and over.
+                now = time.monotonic()
+                expired = [ host for host, until in throttled_until.items() if until <= now ]
+                for host in expired:
+                    del throttled_until[host]
+
+                # Wake up when the next rate limited host can be tried again, or right away
+                # for a host whose wait ended since we tried to start its links.
+                timeout = None
+                throttled = [ throttled_until[host] for host in queued if host in throttled_until ]
+                if any(host in queued for host in expired):
+                    timeout = 0
+                elif throttled:
+                    timeout = min(throttled) - now
+
+                if not running:
+                    if timeout:
+                        time.sleep(timeout)
+                    continue
+
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    host, link = running.pop(future)
+                    active_per_host[host] -= 1
+                    unsubscribe_status, host_ok = future.result()
+
+                    if self.host_limiter:
+                        if host_ok:
+                            self.host_limiter.record_success(host)
+                        else:
+                            self.host_limiter.record_failure(host)
+
+                    yield link, unsubscribe_status
+
+    def _request(self, link: str, one_click: bool = False) -> Tuple[UnsubscribeStatus, bool]:
+        """Request an unsubscribe link. One-click links get the single RFC 8058 POST, without
+        following redirects or downloading the response body.
+
+        Args:
+            link (str): The unsubscribe link
+            one_click (bool, optional): The link supports one-click unsubscribe. Defaults to False.
+
+        Returns:
+            Tuple[UnsubscribeStatus, bool]: success if the link responded with 200, or any 2xx for
+                a one-click POST, otherwise failure. And False if the host timed out, couldn't be
+                reached or had a server error.
+        """
+        if one_click:
+            return self._request_one_click(link)
+
+        try:
+            res = get_http_client().get(link, timeout=self.timeout)
+            # TODO: Do something with the res.text. We could possibly parse it
+            # to see if there is another 'click' needed to unsubscribe.
+            if res.status_code == 200:
+                return UnsubscribeStatus.success, True
+            return UnsubscribeStatus.failure, res.status_code < 500
+        except Exception:
+            return UnsubscribeStatus.failure, False
+
+    def _request_one_click(self, link: str) -> Tuple[UnsubscribeStatus, bool]:
+        """Unsubscribe with an RFC 8058 one-click POST.
+
+        Args:
+            link (str): The one-click unsubscribe link
+
+        Returns:
+            Tuple[UnsubscribeStatus, bool]: success if the link responded with 2xx, otherwise
+                failure. And False if the host timed out, couldn't be reached or had a server error.
+        """
+        try:
+            with get_http_client().stream(
+                "POST",
+                link,
+                data={"List-Unsubscribe": "One-Click"},
+                follow_redirects=False,
+                timeout=self.timeout,
+            ) as res:
+                if res.is_success:
+                    return UnsubscribeStatus.success, True
+                return UnsubscribeStatus.failure, res.status_code < 500
+        except Exception:
+            return UnsubscribeStatus.failure, False
+
+    @staticmethod
+    def _get_host(link: str) -> str:
+        """Get the host of a link, e.g. 'list-manage.com' for 'https://list-manage.com/unsubscribe'.
+
+        Args:
+            link (str): The link
+
+        Returns:
+            str: The lowercased host, empty if the link has none
+        """
+        try:
+            return (urlsplit(link).hostname or "").lower()
+        except ValueError:
+            return ""
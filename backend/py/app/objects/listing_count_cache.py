@@ -0,0 +1,86 @@
+import hashlib
+import logging
+
+from typing import Awaitable, Callable
+
+import redis
+
+from app.config.config import settings
+from app.database.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class ListingCountCache:
+    """Caches the total counts of the senders and scanned emails listings in redis, so paging
+    through a listing doesn't count every row of it again.
+
+    The counts of a linked email are kept in one redis hash so they can all be invalidated
+    at once when the linked email is scanned again. The cache is best effort, when redis is
+    unavailable the counts are computed every time.
+    """
+
+    KEY_PREFIX = "listing_count"
+
+    def __init__(self, ttl: int = None) -> None:
+        """Create a listing count cache.
+
+        Args:
+            ttl (int, optional): The seconds a count is cached for.
+                Defaults to settings.LISTING_COUNT_CACHE_TTL
+        """
+        self.ttl = settings.LISTING_COUNT_CACHE_TTL if ttl is None else ttl
+
+    async def get_count(
+        self, linked_email: str, listing: str, count: Callable[[], Awaitable[int]],
+    ) -> int:
+        """Get the cached count of a listing, counting it and caching the count on a miss.
+
+        Args:
+            linked_email (str): The linked email the listing belongs to
+            listing (str): The name of the listing, including its filters
+            count (Callable[[], Awaitable[int]]): Counts the listing
+
+        Returns:
+            int: The count
+        """
+        if not self.ttl:
+            return await count()
+
+        key = self._get_key(linked_email)
+
+        try:
+            cached = await get_async_redis().hget(key, listing)
+            if cached is not None:
+                return int(cached)
+        except redis.RedisError as e:
+            logger.warning(f"Could not read the listing count cache: {e}")
+            return await count()
+
+        total_count = await count()
+
+        try:
+            pipeline = get_async_redis().pipeline(transaction=False)
+            pipeline.hset(key, listing, total_count)
+            pipeline.expire(key, self.ttl)
+            await pipeline.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not write the listing count cache: {e}")
+
+        return total_count
+
+    def invalidate(self, linked_email: str) -> None:
+        """Drop the cached counts of a linked email once its scanned emails have changed.
+
+        Args:
+            linked_email (str): The linked email
+        """
+        try:
+            get_redis().delete(self._get_key(linked_email))
+        except redis.RedisError as e:
+            logger.warning(f"Could not invalidate the listing count cache: {e}")
+
+    @classmethod
+    def _get_key(cls, linked_email: str) -> str:
+        digest = hashlib.sha256(linked_email.strip().lower().encode()).hexdigest()
+        return f"{cls.KEY_PREFIX}:{digest}"
@@ -0,0 +1,265 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Put on the write queue once the last batch has been put.
+_DONE = object()
+
+
+def _timed(function: Callable[[Any], List[Any]], batch: Any) -> Tuple[List[Any], float]:
+    """Run a parse function on a batch and time it, in the parse process."""
+    start = time.perf_counter()
+    records = function(batch)
+    return records, time.perf_counter() - start
+
+
+class StageStats:
+    """The work done by a stage of the scan pipeline and the time it was busy doing it."""
+
+    def __init__(self) -> None:
+        self.items = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def add(self, items: int, seconds: float, byte_count: int = 0) -> None:
+        """Add the work of one batch.
+
+        Args:
+            items (int): The number of emails in the batch
+            seconds (float): The time the stage spent on the batch
+            byte_count (int, optional): The bytes in the batch. Defaults to 0.
+        """
+        self.items += items
+        self.bytes += byte_count
+        self.seconds += seconds
+
+    def to_dict(self) -> dict:
+        """Get the stats with the stage throughput, the emails per second it was busy.
+
+        Returns:
+            dict: The emails, bytes, busy seconds and emails per second of the stage
+        """
+        return {
+            "emails": self.items,
+            "bytes": self.bytes,
+            "seconds": round(self.seconds, 3),
+            "emails_per_second": round(self.items / self.seconds, 1) if self.seconds else None,
+        }
+
+
+def merge_stage_stats(stats: List[Dict[str, dict]]) -> Dict[str, dict]:
+    """Combine the stage stats of the pipelines of several scan shards. The shards run at the
+    same time, so their throughputs add up.
+
+    Args:
+        stats (List[Dict[str, dict]]): The stats of each pipeline, from `get_stats`
+
+    Returns:
+        Dict[str, dict]: The combined emails, bytes, busy seconds and emails per second of each stage
+    """
+    merged = {}
+    for pipeline_stats in stats:
+        for name, stage in pipeline_stats.items():
+            merged_stage = merged.setdefault(
+                name, {"emails": 0, "bytes": 0, "seconds": 0.0, "emails_per_second": None},
+            )
+            merged_stage["emails"] += stage["emails"]
+            merged_stage["bytes"] += stage["bytes"]
+            merged_stage["seconds"] = round(merged_stage["seconds"] + stage["seconds"], 3)
+            if stage["emails_per_second"] is not None:
+                merged_stage["emails_per_second"] = round(
+                    (merged_stage["emails_per_second"] or 0) + stage["emails_per_second"], 1
+                )
+
+    return merged
+
+
+class ScanPipeline:
+    """Decouples the stages of an inbox scan so the imap connection isn't idle while the
+    emails are parsed and written to the db.
+
+    The caller is the fetch stage, it streams batches of raw emails into the pipeline with
+    `parse` and `write`. The parse stage turns each batch into compact records in a pool of
+    `processes` processes, or a thread when processes can't be started, e.g. from a daemonic
+    celery worker process. The write stage is a thread that writes the records of each batch,
+    in order. The write queue is bounded so fetching blocks when the later stages fall behind.
+
+    Use it as a context manager, `join` waits for the written batches.
+    """
+
+    def __init__(
+        self,
+        parse_batch: Callable[[Any], List[Any]],
+        write_batch: Callable[[List[Any]], None],
+        processes: int = 0,
+        queue_size: int = 4,
+    ) -> None:
+        """Create a scan pipeline.
+
+        Args:
+            parse_batch (Callable[[Any], List[Any]]): Parses a batch of raw emails into records.
+                It must be picklable to run in the process pool, e.g. a module level function.
+            write_batch (Callable[[List[Any]], None]): Writes the records of a batch
+            processes (int, optional): The number of parse processes. Defaults to 0, parse in a thread.
+            queue_size (int, optional): The max number of batches waiting to be written. Defaults to 4.
+        """
+        self.parse_batch = parse_batch
+        self.write_batch = write_batch
+        self.stats = {
+            "fetch": StageStats(),
+            "parse": StageStats(),
+            "write": StageStats(),
+        }
+
+        self.executor = self._create_executor(processes)
+        self.write_queue = queue.Queue(maxsize=queue_size)
+        self.write_error = None
+        self.writer_thread = threading.Thread(target=self._write, daemon=True)
+        self.writer_thread.start()
+
+    def __enter__(self) -> "ScanPipeline":
+        return self
+
+    def __exit__(self, exc_type, *args) -> None:
+        if exc_type is not None:
+            self.close()
+
+    @staticmethod
+    def _create_executor(processes: int) -> Executor:
+        """Create the parse pool. Daemonic processes, like the prefork celery workers, aren't
+        allowed to start processes of their own, so those parse in a thread instead.
+        """
+        if processes > 0 and not multiprocessing.current_process().daemon:
+            return ProcessPoolExecutor(max_workers=processes)
+
+        if processes > 0:
+            logger.warning("Can't start scan parse processes from a daemonic process, parsing in a thread")
+        return ThreadPoolExecutor(max_workers=1)
+
+    def fetched(self, items: int, seconds: float, byte_count: int = 0) -> None:
+        """Record the work of the fetch stage on a batch.
+
+        Args:
+            items (int): The number of emails fetched
+            seconds (float): The time it took to fetch them
+            byte_count (int, optional): The bytes fetched. Defaults to 0.
+        """
+        self.stats["fetch"].add(items, seconds, byte_count)
+
+    def parse(self, batch: Any) -> Future:
+        """Start parsing a batch of raw emails.
+
+        Args:
+            batch (Any): The raw emails
+
+        Returns:
+            Future: Resolves to the parsed records and the seconds it took to parse them
+        """
+        self._raise_write_error()
+
+        try:
+            return self.executor.submit(_timed, self.parse_batch, batch)
+        except (AssertionError, BrokenProcessPool, OSError) as e:
+            if not isinstance(self.executor, ProcessPoolExecutor):
+                raise
+
+            # The pool's processes couldn't be started.
+            logger.warning(f"Could not start the scan parse processes, parsing in a thread: {e}")
+            self.executor.shutdown(wait=False)
+            self.executor = ThreadPoolExecutor(max_workers=1)
+            return self.executor.submit(_timed, self.parse_batch, batch)
+
+    def get_records(self, parsed: Future) -> List[Any]:
+        """Wait for a batch to be parsed.
+
+        Args:
+            parsed (Future): The future returned by `parse`
+
+        Returns:
+            List[Any]: The parsed records
+        """
+        records, parse_seconds = parsed.result()
+        self.stats["parse"].add(len(records), parse_seconds)
+        return records
+
+    def write(self, records: Union[Future, List[Any]]) -> None:
+        """Queue the records of a batch to be written, after the batches queued before it.
+        Blocks while the write queue is full.
+
+        Args:
+            records (Union[Future, List[Any]]): The records, or the future of `parse`
+                when they're still being parsed
+        """
+        while True:
+            self._raise_write_error()
+            try:
+                self.write_queue.put(records, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def join(self) -> Dict[str, dict]:
+        """Wait for every queued batch to be written and stop the pipeline.
+
+        Raises:
+            Exception: The error of the parse or write stage, if either failed
+
+        Returns:
+            Dict[str, dict]: The stats of each stage
+        """
+        self.write(_DONE)
+        self.writer_thread.join()
+        self.executor.shutdown()
+        self._raise_write_error()
+
+        stats = self.get_stats()
+        logger.info(f"Scan pipeline stages: {stats}")
+        return stats
+
+    def close(self) -> None:
+        """Stop the pipeline without waiting for the queued batches."""
+        self.write_error = self.write_error or Exception("The scan pipeline was closed")
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+        # Wake the writer if it's waiting on an empty queue.
+        try:
+            self.write_queue.put_nowait(_DONE)
+        except queue.Full:
+            pass
+
+    def get_stats(self) -> Dict[str, dict]:
+        """Get the stats of each stage so far.
+
+        Returns:
+            Dict[str, dict]: The stats of the fetch, parse and write stages
+        """
+        return { name: stage.to_dict() for name, stage in self.stats.items() }
+
+    def _write(self) -> None:
+        """The write stage, writes the queued batches in order until the pipeline is done."""
+        while self.write_error is None:
+            records = self.write_queue.get()
+            if records is _DONE or self.write_error is not None:
+                return
+
+            try:
+                if isinstance(records, Future):
+                    records = self.get_records(records)
+
+                start = time.perf_counter()
+                self.write_batch(records)
+                self.stats["write"].add(len(records), time.perf_counter() - start)
+            except BaseException as e:
+                self.write_error = e
+
+    def _raise_write_error(self) -> None:
+        if self.write_error is not None:
+            raise self.write_error
@@ -0,0 +1,409 @@
+import io
+
+from collections import Counter
+from datetime import datetime
+from typing import Any, List
+
+from sqlalchemy import BigInteger, DateTime, String, column, func, select, text, update, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.config.config import settings
+from app.models import ScannedEmails, UnsubscribeLinks, UnsubscribeStatus
+from app.objects.sender_summary_writer import SenderSummaryWriter
+
+
+class ScannedEmailWriter:
+    """Buffers the scanned emails of a linked email and writes them in batches.
+
+    A batch is written with one INSERT ... ON CONFLICT DO NOTHING for the scanned emails,
+    one for their unsubscribe links and a single commit, instead of several queries and a
+    commit per email. Scanned emails and unsubscribe links that already exist are skipped
+    by the unique constraints on their natural keys. The senders' summaries are updated
+    in the same transaction.
+
+    For very large scans the batches can be streamed with COPY into temporary staging
+    tables instead and merged into the real tables with INSERT ... SELECT.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        linked_email_address: str,
+        batch_size: int = None,
+        use_copy: bool = False,
+    ) -> None:
+        """Create a writer for the scanned emails of a linked email.
+
+        Args:
+            db (Session): The db session
+            linked_email_address (str): The email address of the recipient
+            batch_size (int, optional): Write the buffered emails once this many are added.
+                Defaults to settings.SCAN_WRITE_BATCH_SIZE, or settings.SCAN_COPY_BATCH_SIZE
+                with use_copy
+            use_copy (bool, optional): Write the batches with COPY. Defaults to False.
+        """
+        self.db = db
+        self.linked_email_address = linked_email_address
+        self.use_copy = use_copy
+        self.batch_size = batch_size or (
+            settings.SCAN_COPY_BATCH_SIZE if use_copy else settings.SCAN_WRITE_BATCH_SIZE
+        )
+        self.pending = []
+        self.sender_summary_writer = SenderSummaryWriter(db, linked_email_address)
+
+    def add(
+        self,
+        email_from: str,
+        subject: str,
+        inbox_date: datetime,
+        unsubscribe_links: List[str],
+        uid: int = None,
+        one_click_links: List[str] = None,
+    ) -> List[dict]:
+        """Buffer a scanned email, writing the batch once it's full.
+
+        Args:
+            email_from (str): The sender of the email
+            subject (str): The subject of the email
+            inbox_date (datetime): The time the email was added to the inbox
+            unsubscribe_links (List[str]): The unsubscribe links found in the email
+            uid (int, optional): The imap UID of the email
+            one_click_links (List[str], optional): The unsubscribe links that support one-click
+                unsubscribe
+
+        Returns:
+            List[dict]: The emails added by the write, see flush. Empty if the batch isn't full yet.
+        """
+        self.pending.append(
+            {
+                "email_from": email_from,
+                "subject": subject,
+                "inbox_date": inbox_date,
+                "uid": uid,
+                "unsubscribe_links": unsubscribe_links,
+                "one_click_links": set(one_click_links or []),
+            }
+        )
+
+        if len(self.pending) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self) -> List[dict]:
+        """Write the buffered emails and their unsubscribe links and commit.
+
+        Returns:
+            List[dict]: The emails that didn't exist yet, in the order they were added
+                [
+                    {
+                        "id": 52,
+                        "from": "sender@spam.mail.com",
+                        "subject": "subject of email",
+                        "link_count": 3,
+                        "unsubscribe_status": "pending",
+                    },
+                ]
+        """
+        if not self.pending:
+            return []
+
+        pending, self.pending = self.pending, []
+
+        if self.use_copy:
+            return self._copy(pending)
+
+        # Reserve the ids up front so we know which of the emails the insert skipped.
+        ids = self.db.execute(
+            select(
+                func.nextval(func.pg_get_serial_sequence(ScannedEmails.__tablename__, "id"))
+            ).select_from(func.generate_series(1, len(pending)))
+        ).scalars().all()
+
+        inserted_ids = set(
+            self.db.execute(
+                insert(ScannedEmails)
+                .values(
+                    [
+                        {
+                            "id": scanned_email_id,
+                            "email_from": email["email_from"],
+                            "subject": email["subject"],
+                            "inbox_date": email["inbox_date"],
+                            "uid": email["uid"],
+                            "linked_email_address": self.linked_email_address,
+                        }
+                        for scanned_email_id, email in zip(ids, pending)
+                    ]
+                )
+                .on_conflict_do_nothing(constraint="uq_scanned_emails_natural_key")
+                .returning(ScannedEmails.id)
+            ).scalars()
+        )
+
+        # Keep the UIDs of the emails that already exist current, they change when the
+        # inbox UIDVALIDITY changes.
+        existing_emails = [
+            email for scanned_email_id, email in zip(ids, pending)
+            if scanned_email_id not in inserted_ids and email["uid"] is not None
+        ]
+        if existing_emails:
+            self._update_uids(existing_emails)
+
+        link_rows = [
+            {
+                "link": link,
+                "unsubscribe_status": UnsubscribeStatus.pending,
+                "one_click": link in email["one_click_links"],
+                "linked_email_address": self.linked_email_address,
+                "scanned_email_id": scanned_email_id,
+            }
+            for scanned_email_id, email in zip(ids, pending)
+            if scanned_email_id in inserted_ids
+            for link in email["unsubscribe_links"]
+        ]
+
+        # Don't add unsubscribe links that exist in the database already
+        link_counts = Counter()
+        if link_rows:
+            link_counts.update(
+                self.db.execute(
+                    insert(UnsubscribeLinks)
+                    .values(link_rows)
+                    .on_conflict_do_nothing(constraint="uq_unsubscribe_links_natural_key")
+                    .returning(UnsubscribeLinks.scanned_email_id)
+                ).scalars()
+            )
+
+        scanned_emails = [
+            {
+                "id": scanned_email_id,
+                "from": email["email_from"],
+                "subject": email["subject"],
+                "link_count": link_counts[scanned_email_id],
+                "unsubscribe_status": "pending",
+            }
+            for scanned_email_id, email in zip(ids, pending)
+            if scanned_email_id in inserted_ids
+        ]
+        self.sender_summary_writer.add_emails(scanned_emails)
+
+        self.db.commit()
+
+        return scanned_emails
+
+    def _update_uids(self, emails: List[dict]) -> None:
+        """Update the UIDs of scanned emails that already exist with a single UPDATE.
+
+        Args:
+            emails (List[dict]): The buffered emails to update the UIDs of
+        """
+        new_uids = values(
+            column("email_from", String),
+            column("subject", String),
+            column("inbox_date", DateTime(timezone=True)),
+            column("uid", BigInteger),
+            name="new_uids",
+        ).data(
+            [
+                (email["email_from"], email["subject"], email["inbox_date"], email["uid"])
+                for email in emails
+            ]
+        )
+
+        self.db.execute(
+            update(ScannedEmails)
+            .where(
+                ScannedEmails.linked_email_address == self.linked_email_address,
+                ScannedEmails.email_from == new_uids.c.email_from,
+                ScannedEmails.subject == new_uids.c.subject,
+                ScannedEmails.inbox_date == new_uids.c.inbox_date,
+                ScannedEmails.uid.is_distinct_from(new_uids.c.uid),
+            )
+            .values(uid=new_uids.c.uid)
+            .execution_options(synchronize_session=False)
+        )
+
+    def _copy(self, pending: List[dict]) -> List[dict]:
+        """Write the emails and their unsubscribe links by streaming them with COPY into
+        temporary staging tables and merging those into the real tables. The staging rows
+        are numbered so the unsubscribe links can be matched to their scanned_email_id.
+
+        Args:
+            pending (List[dict]): The buffered emails
+
+        Returns:
+            List[dict]: The emails that didn't exist yet, see flush
+        """
+        # The staging tables live as long as the db connection and are emptied on commit.
+        self.db.execute(
+            text(
+                "CREATE TEMPORARY TABLE IF NOT EXISTS scanned_emails_staging ("
+                "row_num INTEGER PRIMARY KEY, email_from VARCHAR, subject VARCHAR, "
+                "inbox_date TIMESTAMP WITH TIME ZONE, uid BIGINT, scanned_email_id INTEGER"
+                ") ON COMMIT DELETE ROWS"
+            )
+        )
+        self.db.execute(
+            text(
+                "CREATE TEMPORARY TABLE IF NOT EXISTS unsubscribe_links_staging ("
+                "row_num INTEGER, link VARCHAR, one_click BOOLEAN"
+                ") ON COMMIT DELETE ROWS"
+            )
+        )
+
+        cursor = self.db.connection().connection.cursor()
+        try:
+            self._copy_rows(
+                cursor,
+                "scanned_emails_staging (row_num, email_from, subject, inbox_date, uid)",
+                (
+                    (row_num, email["email_from"], email["subject"], email["inbox_date"], email["uid"])
+                    for row_num, email in enumerate(pending)
+                ),
+            )
+            self._copy_rows(
+                cursor,
+                "unsubscribe_links_staging (row_num, link, one_click)",
+                (
+                    (row_num, link, link in email["one_click_links"])
+                    for row_num, email in enumerate(pending)
+                    for link in email["unsubscribe_links"]
+                ),
+            )
+        finally:
+            cursor.close()
+
+        params = {"linked_email_address": self.linked_email_address}
+
+        # Add the emails that don't exist yet and note their ids on the staging rows. An email
+        # that is in the batch more than once is added from its first row, only that row
+        # gets the id so the email and its links are counted once.
+        self.db.execute(
+            text(
+                """
+                WITH first_rows AS (
+                    SELECT DISTINCT ON (email_from, subject, inbox_date)
+                        row_num, email_from, subject, inbox_date, uid
+                    FROM scanned_emails_staging
+                    ORDER BY email_from, subject, inbox_date, row_num
+                ),
+                inserted AS (
+                    INSERT INTO scanned_emails (email_from, subject, inbox_date, uid, linked_email_address)
+                    SELECT email_from, subject, inbox_date, uid, :linked_email_address
+                    FROM first_rows
+                    ORDER BY row_num
+                    ON CONFLICT ON CONSTRAINT uq_scanned_emails_natural_key DO NOTHING
+                    RETURNING id, email_from, subject, inbox_date
+                )
+                UPDATE scanned_emails_staging
+                SET scanned_email_id = inserted.id
+                FROM inserted
+                JOIN first_rows
+                    ON first_rows.email_from = inserted.email_from
+                    AND first_rows.subject = inserted.subject
+                    AND first_rows.inbox_date = inserted.inbox_date
+                WHERE scanned_emails_staging.row_num = first_rows.row_num
+                """
+            ),
+            params,
+        )
+
+        # Keep the UIDs of the emails that already exist current.
+        self.db.execute(
+            text(
+                """
+                UPDATE scanned_emails
+                SET uid = scanned_emails_staging.uid
+                FROM scanned_emails_staging
+                WHERE scanned_emails_staging.scanned_email_id IS NULL
+                AND scanned_emails_staging.uid IS NOT NULL
+                AND scanned_emails.linked_email_address = :linked_email_address
+                AND scanned_emails.email_from = scanned_emails_staging.email_from
+                AND scanned_emails.subject = scanned_emails_staging.subject
+                AND scanned_emails.inbox_date = scanned_emails_staging.inbox_date
+                AND scanned_emails.uid IS DISTINCT FROM scanned_emails_staging.uid
+                """
+            ),
+            params,
+        )
+
+        link_counts = Counter(
+            self.db.execute(
+                text(
+                    """
+                    INSERT INTO unsubscribe_links (link, unsubscribe_status, one_click, linked_email_address, scanned_email_id)
+                    SELECT unsubscribe_links_staging.link,
+                        CAST(:unsubscribe_status AS unsubscribestatus), unsubscribe_links_staging.one_click,
+                        :linked_email_address,
+                        scanned_emails_staging.scanned_email_id
+                    FROM unsubscribe_links_staging
+                    JOIN scanned_emails_staging
+                        ON scanned_emails_staging.row_num = unsubscribe_links_staging.row_num
+                    WHERE scanned_emails_staging.scanned_email_id IS NOT NULL
+                    ORDER BY unsubscribe_links_staging.row_num
+                    ON CONFLICT ON CONSTRAINT uq_unsubscribe_links_natural_key DO NOTHING
+                    RETURNING scanned_email_id
+                    """
+                ),
+                {**params, "unsubscribe_status": UnsubscribeStatus.pending.name},
+            ).scalars()
+        )
+
+        inserted_rows = self.db.execute(
+            text(
+                "SELECT row_num, scanned_email_id FROM scanned_emails_staging "
+                "WHERE scanned_email_id IS NOT NULL ORDER BY row_num"
+            )
+        ).all()
+
+        scanned_emails = [
+            {
+                "id": scanned_email_id,
+                "from": pending[row_num]["email_from"],
+                "subject": pending[row_num]["subject"],
+                "link_count": link_counts[scanned_email_id],
+                "unsubscribe_status": "pending",
+            }
+            for row_num, scanned_email_id in inserted_rows
+        ]
+        self.sender_summary_writer.add_emails(scanned_emails)
+
+        # Empties the staging tables
+        self.db.commit()
+
+        return scanned_emails
+
+    @classmethod
+    def _copy_rows(cls, cursor: Any, table: str, rows: Any) -> None:
+        """Stream rows into a table with COPY ... FROM STDIN.
+
+        Args:
+            cursor (Any): A psycopg2 cursor
+            table (str): The table and columns to copy into, e.g. 'staging (row_num, link)'
+            rows (Any): An iterable of row tuples
+        """
+        data = io.StringIO()
+        for row in rows:
+            data.write(",".join(cls._to_csv_value(value) for value in row))
+            data.write("\n")
+        data.seek(0)
+
+        cursor.copy_expert(f"COPY {table} FROM STDIN WITH (FORMAT csv, NULL '\\N')", data)
+
+    @staticmethod
+    def _to_csv_value(value: Any) -> str:
+        """Format a value for COPY in csv format. Every value is quoted so only the
+        unquoted \\N is read as NULL.
+
+        Args:
+            value (Any): The value
+
+        Returns:
+            str: The csv value
+        """
+        if value is None:
+            return "\\N"
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        return '"' + str(value).replace('"', '""') + '"'
@@ -0,0 +1,189 @@
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models import SenderSummaries, UnsubscribeStatus
+
+
+class SenderSummaryWriter:
+    """Keeps the sender_summaries rollup of a linked email current.
+
+    The scan writer adds the counts of the emails and links it inserts and the unsubscribe
+    tasks move the counts of the links whose status changed, both in the transaction that
+    changes the scanned emails. When scanned emails are deleted the affected senders are
+    counted again from the scanned emails and links with refresh.
+
+    The writer doesn't commit, that's left to the caller.
+    """
+
+    STATUS_COLUMNS = {
+        UnsubscribeStatus.pending: "pending_count",
+        UnsubscribeStatus.success: "success_count",
+        UnsubscribeStatus.failure: "failure_count",
+        UnsubscribeStatus.unsure: "unsure_count",
+    }
+
+    def __init__(self, db: Session, linked_email_address: str) -> None:
+        """Create a sender summary writer for a linked email.
+
+        Args:
+            db (Session): The db session
+            linked_email_address (str): The linked email address
+        """
+        self.db = db
+        self.linked_email_address = linked_email_address
+
+    def add_emails(self, scanned_emails: List[dict]) -> None:
+        """Add newly scanned emails to their senders' summaries. Their links are pending.
+
+        Args:
+            scanned_emails (List[dict]): The emails added by ScannedEmailWriter.flush
+        """
+        if not scanned_emails:
+            return
+
+        email_counts = Counter()
+        link_counts = Counter()
+        for email in scanned_emails:
+            email_counts[email["from"]] += 1
+            link_counts[email["from"]] += email["link_count"]
+
+        # Sorted so concurrent scans of the same inbox lock the summaries in the same order.
+        statement = insert(SenderSummaries).values(
+            [
+                {
+                    "linked_email_address": self.linked_email_address,
+                    "email_from": email_from,
+                    "scanned_email_count": email_counts[email_from],
+                    "unsubscribe_link_count": link_counts[email_from],
+                    "pending_count": link_counts[email_from],
+                }
+                for email_from in sorted(email_counts)
+            ]
+        )
+        self.db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[SenderSummaries.linked_email_address, SenderSummaries.email_from],
+                set_={
+                    column: getattr(SenderSummaries, column) + getattr(statement.excluded, column)
+                    for column in ("scanned_email_count", "unsubscribe_link_count", "pending_count")
+                },
+            )
+        )
+
+    def update_link_statuses(
+        self, changes: List[Tuple[int, UnsubscribeStatus, UnsubscribeStatus]],
+    ) -> None:
+        """Move the links whose unsubscribe status changed to their new status count.
+
+        Args:
+            changes (List[Tuple[int, UnsubscribeStatus, UnsubscribeStatus]]): The scanned_email_id,
+                old status and new status of each changed link
+        """
+        # The status count changes of each scanned email.
+        deltas: Dict[int, Counter] = defaultdict(Counter)
+        for scanned_email_id, old_status, new_status in changes:
+            if old_status == new_status:
+                continue
+            deltas[scanned_email_id][old_status] -= 1
+            deltas[scanned_email_id][new_status] += 1
+
+        if not deltas:
+            return
+
+        scanned_email_ids = list(deltas)
+        bind = {
+            "linked_email_address": self.linked_email_address,
+            "scanned_email_ids": scanned_email_ids,
+            **{
+                column: [ deltas[scanned_email_id][status] for scanned_email_id in scanned_email_ids ]
+                for status, column in self.STATUS_COLUMNS.items()
+            },
+        }
+
+        self.db.execute(
+            text(
+                """
+                UPDATE sender_summaries
+                SET
+                    pending_count = sender_summaries.pending_count + deltas.pending_count,
+                    success_count = sender_summaries.success_count + deltas.success_count,
+                    failure_count = sender_summaries.failure_count + deltas.failure_count,
+                    unsure_count = sender_summaries.unsure_count + deltas.unsure_count,
+                    update_ts = now()
+                FROM (
+                    SELECT
+                        se.email_from,
+                        SUM(changes.pending_count) AS pending_count,
+                        SUM(changes.success_count) AS success_count,
+                        SUM(changes.failure_count) AS failure_count,
+                        SUM(changes.unsure_count) AS unsure_count
+                    FROM unnest(
+                        CAST(:scanned_email_ids AS INTEGER[]),
+                        CAST(:pending_count AS INTEGER[]),
+                        CAST(:success_count AS INTEGER[]),
+                        CAST(:failure_count AS INTEGER[]),
+                        CAST(:unsure_count AS INTEGER[])
+                    ) AS changes (scanned_email_id, pending_count, success_count, failure_count, unsure_count)
+                    JOIN scanned_emails se ON se.id = changes.scanned_email_id
+                    GROUP BY se.email_from
+                ) AS deltas
+                WHERE sender_summaries.linked_email_address = :linked_email_address
+                AND sender_summaries.email_from = deltas.email_from
+                """
+            ),
+            bind,
+        )
+
+    def refresh(self, email_froms: List[str] = None) -> None:
+        """Count the summaries of senders again from their scanned emails and links.
+
+        Args:
+            email_froms (List[str], optional): The senders to count. Defaults to None, every sender.
+        """
+        bind = {"linked_email_address": self.linked_email_address}
+        summary_filter = ""
+        scanned_email_filter = ""
+        if email_froms is not None:
+            bind["email_froms"] = list(email_froms)
+            summary_filter = "AND email_from = ANY(CAST(:email_froms AS VARCHAR[]))"
+            scanned_email_filter = "AND se.email_from = ANY(CAST(:email_froms AS VARCHAR[]))"
+
+        self.db.execute(
+            text(
+                f"""
+                DELETE FROM sender_summaries
+                WHERE linked_email_address = :linked_email_address
+                {summary_filter}
+                """
+            ),
+            bind,
+        )
+        self.db.execute(
+            text(
+                f"""
+                INSERT INTO sender_summaries (
+                    linked_email_address, email_from, scanned_email_count, unsubscribe_link_count,
+                    pending_count, success_count, failure_count, unsure_count
+                )
+                SELECT
+                    :linked_email_address,
+                    se.email_from,
+                    COUNT(DISTINCT se.id),
+                    COUNT(ul.id),
+                    COUNT(ul.id) FILTER ( WHERE ul.unsubscribe_status = 'pending' ),
+                    COUNT(ul.id) FILTER ( WHERE ul.unsubscribe_status = 'success' ),
+                    COUNT(ul.id) FILTER ( WHERE ul.unsubscribe_status = 'failure' ),
+                    COUNT(ul.id) FILTER ( WHERE ul.unsubscribe_status = 'unsure' )
+                FROM scanned_emails se
+                LEFT OUTER JOIN unsubscribe_links ul ON ul.scanned_email_id = se.id
+                WHERE se.linked_email_address = :linked_email_address
+                {scanned_email_filter}
+                GROUP BY se.email_from
+                """
+            ),
+            bind,
+        )
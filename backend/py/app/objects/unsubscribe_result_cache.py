@@ -0,0 +1,133 @@
+import hashlib
+import logging
+
+from typing import Dict, List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import redis
+
+from app.config.config import settings
+from app.database.redis_client import get_redis
+from app.models import UnsubscribeStatus
+
+logger = logging.getLogger(__name__)
+
+
+class UnsubscribeResultCache:
+    """Caches the unsubscribe links that unsubscribed a recipient successfully in redis,
+    so the workers of every user can skip requesting them again for the same recipient
+    until the cache entry expires.
+
+    The cache is best effort, when redis is unavailable every link is a cache miss.
+    """
+
+    KEY_PREFIX = "unsubscribe_result"
+    # Query params that only track who clicked, they don't change what the link does.
+    TRACKING_PARAMS = {"utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content"}
+
+    def __init__(self, ttl: int = None) -> None:
+        """Create an unsubscribe result cache.
+
+        Args:
+            ttl (int, optional): The seconds a result is cached for.
+                Defaults to settings.UNSUBSCRIBE_RESULT_CACHE_TTL
+        """
+        self.ttl = settings.UNSUBSCRIBE_RESULT_CACHE_TTL if ttl is None else ttl
+
+    def get_many(self, links: List[str], recipient: str) -> Dict[str, UnsubscribeStatus]:
+        """Get the cached unsubscribe statuses of links for a recipient.
+
+        Args:
+            links (List[str]): The unsubscribe links
+            recipient (str): The email address that's unsubscribed
+
+        Returns:
+            Dict[str, UnsubscribeStatus]: The cached status by link, links that aren't cached are left out
+        """
+        if not self.ttl or not links:
+            return {}
+
+        try:
+            cached = get_redis().mget([ self._get_key(link, recipient) for link in links ])
+        except redis.RedisError as e:
+            logger.warning(f"Could not read the unsubscribe result cache: {e}")
+            return {}
+
+        return {
+            link: UnsubscribeStatus(status.decode())
+            for link, status in zip(links, cached)
+            if status is not None
+        }
+
+    def set_many(self, results: Dict[str, UnsubscribeStatus], recipient: str) -> None:
+        """Cache the successful unsubscribe statuses of links for a recipient.
+
+        Args:
+            results (Dict[str, UnsubscribeStatus]): The unsubscribe status by link
+            recipient (str): The email address that was unsubscribed
+        """
+        successful_links = [
+            link for link, status in results.items() if status == UnsubscribeStatus.success
+        ]
+        if not self.ttl or not successful_links:
+            return
+
+        try:
+            pipeline = get_redis().pipeline(transaction=False)
+            for link in successful_links:
+                pipeline.set(
+                    self._get_key(link, recipient), UnsubscribeStatus.success.value, ex=self.ttl,
+                )
+            pipeline.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not write the unsubscribe result cache: {e}")
+
+    @classmethod
+    def _get_key(cls, link: str, recipient: str) -> str:
+        """Get the cache key of a link and recipient. It's hashed so the key doesn't hold
+        the recipient's email address or the link.
+
+        Args:
+            link (str): The unsubscribe link
+            recipient (str): The email address that's unsubscribed
+
+        Returns:
+            str: The cache key
+        """
+        digest = hashlib.sha256(
+            f"{cls.canonicalize_link(link)}\n{recipient.strip().lower()}".encode()
+        ).hexdigest()
+        return f"{cls.KEY_PREFIX}:{digest}"
+
+    @classmethod
+    def canonicalize_link(cls, link: str) -> str:
+        """Canonicalize a link so different spellings of the same link share a cache entry.
+        The scheme and host are lowercased, default ports, fragments and tracking params are
+        dropped and the remaining query params are sorted.
+
+        Args:
+            link (str): The link
+
+        Returns:
+            str: The canonical link, the link itself if it can't be parsed
+        """
+        try:
+            parts = urlsplit(link.strip())
+            host = (parts.hostname or "").lower()
+            port = parts.port
+        except ValueError:
+            return link
+
+        scheme = parts.scheme.lower()
+        if port is not None and (scheme, port) not in (("http", 80), ("https", 443)):
+            host = f"{host}:{port}"
+
+        query = urlencode(
+            sorted(
+                (key, value)
+                for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                if key.lower() not in cls.TRACKING_PARAMS
+            )
+        )
+
+        return urlunsplit((scheme, host, parts.path or "/", query, ""))
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Optional
+
+from app.config.config import settings
+from app.schemas.users import User
+
+
+class UserCache:
+    """An in-process LRU cache of the authenticated users, so a request whose user was
+    seen recently doesn't have to query the users table.
+
+    The cache holds read only snapshots of the users, without their password hash. Up to
+    `maxsize` users are cached, each for `ttl` seconds. CRUDUser invalidates a user when it's
+    updated or removed, other api worker processes see the change once their entry expires.
+    """
+
+    def __init__(self, maxsize: int = None, ttl: float = None) -> None:
+        """Create a user cache.
+
+        Args:
+            maxsize (int, optional): The max number of users cached. Defaults to settings.USER_CACHE_SIZE
+            ttl (float, optional): The seconds a user is cached for. Defaults to settings.USER_CACHE_TTL
+        """
+        self.maxsize = settings.USER_CACHE_SIZE if maxsize is None else maxsize
+        self.ttl = settings.USER_CACHE_TTL if ttl is None else ttl
+        self._users: OrderedDict = OrderedDict()
+        # The sync endpoints run on a threadpool.
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[User]:
+        """Get a cached user.
+
+        Args:
+            user_id (int): The user id
+
+        Returns:
+            Optional[User]: The user snapshot, None if it isn't cached or has expired
+        """
+        with self._lock:
+            cached = self._users.get(user_id)
+            if cached is None:
+                return None
+
+            user, expires_at = cached
+            if expires_at <= time.monotonic():
+                del self._users[user_id]
+                return None
+
+            self._users.move_to_end(user_id)
+            return user
+
+    def set(self, user: User) -> None:
+        """Cache a user, evicting the least recently used user if the cache is full.
+
+        Args:
+            user (User): The user snapshot
+        """
+        if not self.maxsize or not self.ttl:
+            return
+
+        with self._lock:
+            self._users[user.id] = (user, time.monotonic() + self.ttl)
+            self._users.move_to_end(user.id)
+            while len(self._users) > self.maxsize:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        """Remove a user from the cache.
+
+        Args:
+            user_id (int): The user id
+        """
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+
+
+user_cache = UserCache()
@@ -9,7 +9,7 @@ class ScanEmails(BaseModel):
 
 class ScannedEmailsCreate(BaseModel):
     email_from: EmailStr
-    subject: Optional[str] = None
+    subject: str = ""
     linked_email_address: Optional[EmailStr] = None
 
 
@@ -20,4 +20,4 @@ class ScannedEmailUpdate(BaseModel):
 class GetScannedEmails(BaseModel):
     email_from: str
     linked_email: EmailStr
-    page: int = 0
+    cursor: Optional[str] = None
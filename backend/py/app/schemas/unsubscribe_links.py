@@ -20,9 +20,8 @@ class UnsubscribeEmailsCreate(BaseModel):
 
 
 class UnsubscribeEmail(BaseModel):
-    email_sender: List[int]
+    email_sender: str
     linked_email_address: EmailStr
-    page: int = 0
 
 class UnsubscribeFromAll(BaseModel):
     linked_email_address: EmailStr
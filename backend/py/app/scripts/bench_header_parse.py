@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""This script benchmarks parsing the fetched email headers in the scan parse stage. It compares
+email.message_from_bytes, which builds a Message with every header of the block, to
+EmailUnsubscriber.SCANNED_HEADER_PARSER which only pulls out the fields the scanner reads. The
+headers are generated marketing emails with encoded words, folded fields and 8 bit bytes. Both
+parsers must give the same date, sender, subject and unsubscribe links.
+
+The time per message includes decoding the fields. Subjects with unencoded 8 bit bytes are
+opt in, guessing their charset with charset_normalizer takes ~25ms a header with either parser
+and hides the cost of parsing. The memory per message is the size of the
+object each parser builds for a header block, the Message or the EmailHeaders, counted with
+tracemalloc as the memory blocks and bytes that object keeps alive.
+
+The script accepts these params:
+--emails [Optional] (Int) the number of header blocks to parse.
+--full_headers [Optional] (Bool) add the DKIM/ARC/Received headers of a full header fetch.
+--sample [Optional] (Int) the number of header blocks to measure the memory over.
+--eight_bit_every [Optional] (Int) add unencoded 8 bit bytes to every nth subject, 0 for none.
+-h --help (Bool) prints the help message for this script
+"""
+
+import argparse
+import email
+import gc
+import time
+import tracemalloc
+
+from email.utils import parsedate_to_datetime
+
+from app.objects.email_unsubscriber import EmailUnsubscriber
+
+
+argParser = argparse.ArgumentParser(prog="Benchmark header parse", description="Compares message_from_bytes to the scanned header parser")
+argParser.add_argument("--emails", help="the number of header blocks to parse", default=50000, type=int)
+argParser.add_argument("--full_headers", help="add the DKIM/ARC/Received headers of a full header fetch", action="store_true")
+argParser.add_argument("--sample", help="the number of header blocks to measure the memory over", default=2000, type=int)
+argParser.add_argument("--eight_bit_every", help="add unencoded 8 bit bytes to every nth subject, 0 for none", default=0, type=int)
+
+args = argParser.parse_args()
+
+
+def generate_headers(i: int) -> bytes:
+    """Generate the raw headers of a marketing email, a few variations of each field."""
+    senders = [
+        f"=?utf-8?q?Spammer_{i}?= <spammer{i}@example.com>",
+        f'"Store {i}" <news@store{i}.example.com>',
+        f"deals{i}@example.com",
+    ]
+    subjects = [
+        f"=?utf-8?b?U3BhbSBFbWFpbCDinJM=?= - {i}",
+        f"Your weekly deals are here, {i}% off everything in store\r\n and online",
+        f"Order #{i} has shipped",
+    ]
+    headers = [
+        f"From: {senders[i % 3]}",
+        f"Subject: {subjects[i % 3]}",
+        f"Date: Mon, {i % 28 + 1} Oct 2023 10:{i % 60:02d}:00 +0000",
+    ]
+
+    if i % 4:
+        headers.append(
+            f"List-Unsubscribe: <mailto:unsubscribe{i}@example.com?subject=unsubscribe>,\r\n"
+            f" <https://example.com/unsubscribe_me/{i}?token={i * 7919:x}>"
+        )
+    if i % 2:
+        headers.append("List-Unsubscribe-Post: List-Unsubscribe=One-Click")
+
+    if args.full_headers:
+        signature = "".join(f"{(i * j) % 65536:04x}" for j in range(64))
+        headers = [
+            f"Received: from mta{i % 9}.example.com (mta{i % 9}.example.com [10.0.0.{i % 255}])\r\n"
+            f"\tby mx.example.net with ESMTPS id {i:x}; Mon, 2 Oct 2023 10:00:00 +0000",
+            f"ARC-Seal: i=1; a=rsa-sha256; t=1696240800; cv=none; d=example.net; s=arc;\r\n\tb={signature}",
+            f"DKIM-Signature: v=1; a=rsa-sha256; c=relaxed/relaxed; d=example.com; s=s1;\r\n"
+            f"\th=from:subject:date:list-unsubscribe; bh={signature[:44]}=;\r\n\tb={signature}",
+            f"Message-ID: <{i}.{i * 31}@mta.example.com>",
+            "MIME-Version: 1.0",
+            'Content-Type: multipart/alternative; boundary="boundary"',
+            f"X-Campaign-ID: {i}",
+        ] + headers
+
+    raw_headers = ("\r\n".join(headers) + "\r\n\r\n").encode()
+
+    # A few senders don't encode their non ascii headers.
+    if args.eight_bit_every and i % args.eight_bit_every == 0:
+        raw_headers = raw_headers.replace(b"Subject: ", "Subject: Prix réduits ".encode("latin-1"))
+
+    return raw_headers
+
+
+def parse_message(raw_headers: bytes) -> tuple:
+    email_msg = email.message_from_bytes(raw_headers)
+    return (parsedate_to_datetime(email_msg["Date"]), *EmailUnsubscriber._parse_email_message_obj(email_msg))
+
+
+def parse_fields(raw_headers: bytes) -> tuple:
+    email_headers = EmailUnsubscriber.SCANNED_HEADER_PARSER.parse(raw_headers)
+    return (parsedate_to_datetime(email_headers["Date"]), *EmailUnsubscriber._parse_email_message_obj(email_headers))
+
+
+def measure_memory(build, header_blocks: list) -> tuple:
+    """Get the memory blocks and bytes of the objects built for the header blocks."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    built = [build(raw_headers) for raw_headers in header_blocks]
+
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    del built
+    return sum(stat.count_diff for stat in stats), sum(stat.size_diff for stat in stats)
+
+
+def benchmark(name: str, parse, build, header_blocks: list) -> float:
+    """Parse every header block and print the time and memory per message."""
+    start = time.perf_counter()
+    for raw_headers in header_blocks:
+        parse(raw_headers)
+    per_message = (time.perf_counter() - start) / len(header_blocks)
+
+    sample = header_blocks[:args.sample]
+    blocks, size = measure_memory(build, sample)
+
+    print(
+        f"  {name:<20} {per_message * 1e6:8.1f} us/message"
+        f" {blocks / len(sample):8.1f} blocks/message {size / len(sample):8.0f} bytes/message"
+    )
+    return per_message
+
+
+header_blocks = [generate_headers(i) for i in range(args.emails)]
+average_size = sum(len(raw_headers) for raw_headers in header_blocks) // len(header_blocks)
+
+for raw_headers in header_blocks:
+    assert parse_message(raw_headers) == parse_fields(raw_headers), raw_headers
+
+print(f"{args.emails} header blocks, {average_size} bytes on average")
+message = benchmark("message_from_bytes", parse_message, email.message_from_bytes, header_blocks)
+fields = benchmark("header parser", parse_fields, EmailUnsubscriber.SCANNED_HEADER_PARSER.parse, header_blocks)
+print(f"  speedup: {message / fields:.1f}x")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""This script benchmarks looking for unsubscribe links in text/html email bodies. It compares
+the old lookup, which scrubbed the newlines out of a copy of the body and ran two XPath queries
+per unsubscribe keyword, to EmailUnsubscriber._get_unsubscribe_links_from_html which parses the
+body as is and runs one precompiled, case insensitive XPath. The per document time includes
+parsing the html. Both lookups must find the same links.
+
+The script accepts these params:
+--runs [Optional] (Int) the number of times each document is parsed and searched.
+-h --help (Bool) prints the help message for this script
+"""
+
+import argparse
+import time
+
+import lxml.html
+
+from app.objects.email_unsubscriber import EmailUnsubscriber
+from app.tests.html_emails.basic_promo import basic_promo
+from app.tests.html_emails.general_template import general_template
+
+
+argParser = argparse.ArgumentParser(prog="Benchmark html links", description="Compares an XPath query per keyword to a single XPath query")
+argParser.add_argument("--runs", help="the number of times each document is parsed and searched", default=500, type=int)
+
+args = argParser.parse_args()
+
+
+def get_links_per_keyword(body: str) -> list:
+    """Look for unsubscribe links like the scanner used to, with two XPath queries per keyword."""
+    unsubscribe_links = []
+
+    html = body.replace("\n", "").replace("\r", "")
+    element_tree = lxml.html.fromstring(html)
+
+    for unsub_keyword in EmailUnsubscriber.UNSUBSCRIBE_KEYWORDS:
+        link_elements = element_tree.xpath(
+            f'.//a[contains(text(), "{unsub_keyword}")]'
+        ) or element_tree.xpath(
+            f'.//a[contains(text(), "{unsub_keyword.title()}")]'
+        )
+
+        for element in link_elements:
+            found_link = element.attrib.get("href")
+            if found_link and found_link not in unsubscribe_links:
+                unsubscribe_links.append(found_link)
+
+    return unsubscribe_links
+
+
+def benchmark(name: str, get_links, body: str) -> float:
+    """Parse and search the body args.runs times and print the time per document."""
+    start = time.perf_counter()
+    for _ in range(args.runs):
+        get_links(body)
+    per_document = (time.perf_counter() - start) / args.runs
+
+    print(f"  {name:<20} {per_document * 1000:8.3f} ms/document")
+    return per_document
+
+
+for name, body in (("basic_promo", basic_promo), ("general_template", general_template)):
+    old_links = get_links_per_keyword(body)
+    new_links = EmailUnsubscriber._get_unsubscribe_links_from_html(body=body)
+    assert old_links == new_links, f"{old_links} != {new_links}"
+
+    print(f"{name} ({len(body) // 1024} KB, {args.runs} runs)")
+    per_keyword = benchmark("per keyword", get_links_per_keyword, body)
+    single_xpath = benchmark("single xpath", lambda body: EmailUnsubscriber._get_unsubscribe_links_from_html(body=body), body)
+    print(f"  speedup: {per_keyword / single_xpath:.1f}x")
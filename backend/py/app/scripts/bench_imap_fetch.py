@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""This script benchmarks fetching email headers one email per FETCH command against
+batched multi-message FETCH commands, and the full header block against only the header
+fields the scanner reads. It runs EmailUnsubscriber._do_scan_emails against a
+local fake imap server that sleeps --latency seconds per command to simulate the network.
+The db writes are skipped so only the imap side of the scan is measured.
+
+The script accepts these params:
+--emails [Optional] (Int) the number of emails in the fake inbox.
+--latency [Optional] (Float) the simulated round trip time in seconds.
+--batch_size [Optional] (Int) the number of emails to fetch per FETCH command.
+-h --help (Bool) prints the help message for this script
+"""
+
+import argparse
+import time
+
+from unittest import mock
+
+from app.objects.email_unsubscriber import EmailUnsubscriber
+from app.tests.imap_server import FakeIMAPServer
+
+
+argParser = argparse.ArgumentParser(prog="Benchmark imap fetch", description="Compares per email FETCH commands to batched FETCH commands")
+argParser.add_argument("--emails", help="the number of emails in the fake inbox", default=2000, type=int)
+argParser.add_argument("--latency", help="the simulated round trip time in seconds", default=0.005, type=float)
+argParser.add_argument("--batch_size", help="the number of emails to fetch per FETCH command", default=500, type=int)
+
+args = argParser.parse_args()
+
+
+class MockTask:
+    """A mock task class to simulate updating the celery state object
+    """
+
+    def __init__(self) -> None:
+        self.state = 'PROGRESS'
+        self.meta = {}
+
+    def update_state(self, state, meta) -> None:
+        self.state = state
+        self.meta = meta
+
+
+def generate_email(i: int) -> bytes:
+    """Generate a raw marketing email with a realistic amount of headers."""
+    return (
+        f"Received: from mail{i}.example.com by mx.example.com; Mon, 2 Oct 2023 10:00:00 +0000\r\n"
+        f"DKIM-Signature: v=1; a=rsa-sha256; d=example.com; b={'a' * 340}\r\n"
+        f"From: Spammer {i} <spammer{i}@example.com>\r\n"
+        f"To: email@yahoo.com\r\n"
+        f"Subject: Spam Email - {i}\r\n"
+        f"Date: Mon, 2 Oct 2023 10:00:00 +0000\r\n"
+        f"List-Unsubscribe: <https://example.com/unsubscribe_me/{i}>\r\n"
+        f"Content-Type: text/html\r\n"
+        f"\r\n"
+        f"<p>spam</p>\r\n"
+    ).encode()
+
+
+def run_scan(server: FakeIMAPServer, batch_size: int, narrow_fetch: bool) -> tuple:
+    """Scan the whole fake inbox and return the time it took in seconds and the bytes fetched."""
+    server.command_counts.clear()
+    task = MockTask()
+
+    email_unsubscriber = EmailUnsubscriber(email_type="yahoo")
+    email_unsubscriber.login("email@yahoo.com", "password")
+
+    start = time.perf_counter()
+    email_unsubscriber._do_scan_emails(
+        task=task,
+        range_params=(len(server.messages), 0, -1),
+        db=None,
+        batch_size=batch_size,
+        narrow_fetch=narrow_fetch,
+    )
+    elapsed = time.perf_counter() - start
+
+    email_unsubscriber.logout()
+    return elapsed, task.meta["bytes_fetched"]
+
+
+with FakeIMAPServer([generate_email(i) for i in range(args.emails)], latency=args.latency) as server:
+    with mock.patch("app.objects.email_unsubscriber.IMAP4_SSL", server.imap_client), \
+         mock.patch("app.objects.email_unsubscriber.ScannedEmailWriter") as mock_writer:
+        mock_writer.return_value.add.return_value = []
+        mock_writer.return_value.flush.return_value = []
+
+        for batch_size, narrow_fetch in ((1, False), (args.batch_size, False), (args.batch_size, True)):
+            elapsed, bytes_fetched = run_scan(server, batch_size, narrow_fetch)
+            print(
+                f"batch_size={batch_size:<6} narrow_fetch={narrow_fetch!s:<6} "
+                f"FETCH commands={server.command_counts['FETCH']:<6} bytes={bytes_fetched:<9} "
+                f"time={elapsed:.2f}s emails/sec={args.emails / elapsed:.0f}"
+            )
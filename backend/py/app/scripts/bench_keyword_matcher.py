@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""This script benchmarks looking for unsubscribe links in text/plain email bodies. It compares
+the old lookup, a body.lower() and find per unsubscribe keyword and an uncompiled link regex
+search per hit, to EmailUnsubscriber._get_unsubscribe_links_from_text_plain which finds every
+keyword in one pass with a KeywordMatcher. The bodies are the text of the tests/html_emails
+templates, repeated to the size of a large newsletter. Both lookups must find the same links.
+
+The script accepts these params:
+--repeat [Optional] (Int) the number of times each template's text is repeated in a body.
+--runs [Optional] (Int) the number of times each body is searched.
+-h --help (Bool) prints the help message for this script
+"""
+
+import argparse
+import re
+import time
+
+import lxml.html
+
+from app.objects.email_unsubscriber import EmailUnsubscriber, UNSUB_LINK_RE
+from app.tests.html_emails.basic_promo import basic_promo
+from app.tests.html_emails.general_template import general_template
+
+
+argParser = argparse.ArgumentParser(prog="Benchmark keyword matcher", description="Compares a search per keyword to a single pass keyword matcher")
+argParser.add_argument("--repeat", help="the number of times each template's text is repeated in a body", default=10, type=int)
+argParser.add_argument("--runs", help="the number of times each body is searched", default=200, type=int)
+
+args = argParser.parse_args()
+
+
+def get_links_per_keyword(body: str) -> list:
+    """Look for unsubscribe links like the scanner used to, searching the body once per keyword."""
+    unsubscribe_links = []
+
+    for unsub_keyword in EmailUnsubscriber.UNSUBSCRIBE_KEYWORDS:
+        unsub_idx = body.lower().find(unsub_keyword)
+
+        if unsub_idx != -1:
+            trimmed_body = body[unsub_idx:].replace("\n", "").replace("\r", "")
+            match = re.search(UNSUB_LINK_RE.pattern, trimmed_body)
+
+            if match and match.group() not in unsubscribe_links:
+                unsubscribe_links.append(match.group())
+
+    return unsubscribe_links
+
+
+def benchmark(name: str, get_links, bodies: list) -> float:
+    """Search every body args.runs times and print the time it took."""
+    start = time.perf_counter()
+    for _ in range(args.runs):
+        for body in bodies:
+            get_links(body)
+    elapsed = time.perf_counter() - start
+
+    body_mb = sum(len(body) for body in bodies) * args.runs / 1024 / 1024
+    print(f"{name:<20} {elapsed:8.3f}s {body_mb / elapsed:10.1f} MB/s")
+    return elapsed
+
+
+bodies = []
+for template in (basic_promo, general_template):
+    text = lxml.html.fromstring(template).text_content()
+    # Keep a link after the first keyword so there's something to find.
+    text += "\nTo unsubscribe visit https://example.com/unsubscribe_me\n"
+    bodies.append("\n".join([text] * args.repeat))
+
+for body in bodies:
+    old_links = get_links_per_keyword(body)
+    new_links = EmailUnsubscriber._get_unsubscribe_links_from_text_plain(body=body)
+    assert old_links == new_links, f"{old_links} != {new_links}"
+
+print(f"{len(bodies)} bodies of {', '.join(f'{len(body) // 1024} KB' for body in bodies)}, {args.runs} runs")
+per_keyword = benchmark("per keyword", get_links_per_keyword, bodies)
+single_pass = benchmark("keyword matcher", lambda body: EmailUnsubscriber._get_unsubscribe_links_from_text_plain(body=body), bodies)
+print(f"speedup: {per_keyword / single_pass:.1f}x")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""This script benchmarks the scan pipeline of EmailUnsubscriber._do_scan_emails, which
+fetches the next batch of emails while the last ones are parsed and written to the db. It
+scans a local fake imap server that sleeps --latency seconds per command, and the db writes
+are replaced with a --write_latency seconds sleep per batch. The throughput of each stage is
+printed for every number of parse processes, the slowest stage is the bottleneck.
+
+The script accepts these params:
+--emails [Optional] (Int) the number of emails in the fake inbox.
+--latency [Optional] (Float) the simulated round trip time in seconds.
+--write_latency [Optional] (Float) the simulated time to write a batch to the db in seconds.
+--batch_size [Optional] (Int) the number of emails to fetch per FETCH command.
+--processes [Optional] (Int) the max number of parse processes to compare.
+-h --help (Bool) prints the help message for this script
+"""
+
+import argparse
+import time
+
+from unittest import mock
+
+from app.config.config import settings
+from app.objects.email_unsubscriber import EmailUnsubscriber
+from app.tests.imap_server import FakeIMAPServer
+
+
+argParser = argparse.ArgumentParser(prog="Benchmark scan pipeline", description="Prints the throughput of each stage of the scan pipeline")
+argParser.add_argument("--emails", help="the number of emails in the fake inbox", default=5000, type=int)
+argParser.add_argument("--latency", help="the simulated round trip time in seconds", default=0.02, type=float)
+argParser.add_argument("--write_latency", help="the simulated time to write a batch to the db in seconds", default=0.05, type=float)
+argParser.add_argument("--batch_size", help="the number of emails to fetch per FETCH command", default=250, type=int)
+argParser.add_argument("--processes", help="the max number of parse processes to compare", default=2, type=int)
+
+args = argParser.parse_args()
+
+
+class MockTask:
+    """A mock task class to simulate updating the celery state object
+    """
+
+    def __init__(self) -> None:
+        self.state = 'PROGRESS'
+        self.meta = {}
+
+    def update_state(self, state, meta) -> None:
+        self.state = state
+        self.meta = meta
+
+
+def generate_email(i: int) -> bytes:
+    """Generate a raw marketing email with a realistic amount of headers."""
+    return (
+        f"From: =?utf-8?q?Spammer_{i}?= <spammer{i}@example.com>\r\n"
+        f"Subject: =?utf-8?b?U3BhbSBFbWFpbCDinJM=?= - {i}\r\n"
+        f"Date: Mon, 2 Oct 2023 10:00:00 +0000\r\n"
+        f"List-Unsubscribe: <mailto:unsubscribe@example.com>, <https://example.com/unsubscribe_me/{i}>\r\n"
+        f"List-Unsubscribe-Post: List-Unsubscribe=One-Click\r\n"
+        f"\r\n"
+        f"<p>spam</p>\r\n"
+    ).encode()
+
+
+def flush() -> list:
+    time.sleep(args.write_latency)
+    return []
+
+
+with FakeIMAPServer([generate_email(i) for i in range(args.emails)], latency=args.latency) as server:
+    with mock.patch("app.objects.email_unsubscriber.IMAP4_SSL", server.imap_client), \
+         mock.patch("app.objects.email_unsubscriber.ScannedEmailWriter") as mock_writer:
+        mock_writer.return_value.add.return_value = []
+        mock_writer.return_value.flush.side_effect = flush
+
+        for processes in range(args.processes + 1):
+            task = MockTask()
+            email_unsubscriber = EmailUnsubscriber(email_type="yahoo")
+            email_unsubscriber.login("email@yahoo.com", "password")
+
+            start = time.perf_counter()
+            with mock.patch.object(settings, "SCAN_PARSE_PROCESSES", processes):
+                email_unsubscriber._do_scan_emails(
+                    task=task,
+                    range_params=(args.emails, 0, -1),
+                    db=None,
+                    batch_size=args.batch_size,
+                )
+            elapsed = time.perf_counter() - start
+            email_unsubscriber.logout()
+
+            print(f"processes={processes} time={elapsed:.2f}s emails/sec={args.emails / elapsed:.0f}")
+            for stage, stats in task.meta["stages"].items():
+                print(f"  {stage:<6} busy={stats['seconds']:.2f}s emails/sec={stats['emails_per_second']}")
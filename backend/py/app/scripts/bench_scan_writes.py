@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""This script benchmarks writing scanned emails to the db. It compares the old write path,
+a SELECT per email, a SELECT EXISTS per link and a commit per email, to the ScannedEmailWriter
+which writes a batch of emails with INSERT ... ON CONFLICT DO NOTHING and a single commit,
+and to the writer's COPY path used for big scans.
+It needs a local Postgres with the migrations applied and an existing linked email. The
+emails it adds are removed again when it's done.
+
+The script accepts these params:
+-l --linked_email (Str) the linked email to add the scanned emails to
+--emails [Optional] (Int) the number of emails to write per run.
+--links [Optional] (Int) the number of unsubscribe links per email.
+--batch_size [Optional] (Int) the number of emails the writer writes per transaction.
+--copy_batch_size [Optional] (Int) the number of emails the writer copies per transaction.
+-h --help (Bool) prints the help message for this script
+"""
+
+import argparse
+import time
+import uuid
+
+from datetime import datetime, timedelta, timezone
+
+from app.database.database import SessionLocal
+from app.models import LinkedEmails, ScannedEmails, UnsubscribeLinks, UnsubscribeStatus
+from app.objects.scanned_email_writer import ScannedEmailWriter
+
+
+argParser = argparse.ArgumentParser(prog="Benchmark scan writes", description="Compares per email writes to batched scanned email writes")
+argParser.add_argument("-l", "--linked_email", help="the linked email to add the scanned emails to", required=True)
+argParser.add_argument("--emails", help="the number of emails to write per run", default=5000, type=int)
+argParser.add_argument("--links", help="the number of unsubscribe links per email", default=2, type=int)
+argParser.add_argument("--batch_size", help="the number of emails the writer writes per transaction", default=500, type=int)
+argParser.add_argument("--copy_batch_size", help="the number of emails the writer copies per transaction", default=10000, type=int)
+
+args = argParser.parse_args()
+
+
+def generate_emails(run: str) -> list:
+    """Generate the scanned emails for a run, every email gets a unique subject and links."""
+    inbox_date = datetime(2023, 10, 2, tzinfo=timezone.utc)
+    return [
+        {
+            "email_from": f"spammer{i % 100}@example.com",
+            "subject": f"{run} - {i}",
+            "inbox_date": inbox_date + timedelta(minutes=i),
+            "uid": i + 1,
+            "unsubscribe_links": [
+                f"https://example.com/{run}/unsubscribe/{i}/{j}" for j in range(args.links)
+            ],
+        }
+        for i in range(args.emails)
+    ]
+
+
+def write_per_email(db, emails: list) -> None:
+    """Write the emails like the scanner used to, with several queries and a commit per email."""
+    for email in emails:
+        existing_email = (
+            db.query(ScannedEmails)
+            .filter(
+                ScannedEmails.email_from == email["email_from"],
+                ScannedEmails.subject == email["subject"],
+                ScannedEmails.inbox_date == email["inbox_date"],
+            )
+            .first()
+        )
+        if existing_email:
+            continue
+
+        scanned_email = ScannedEmails(
+            email_from=email["email_from"],
+            subject=email["subject"],
+            linked_email_address=args.linked_email,
+            inbox_date=email["inbox_date"],
+            uid=email["uid"],
+        )
+        db.add(scanned_email)
+        db.flush()
+
+        for link in email["unsubscribe_links"]:
+            link_exists = db.execute(
+                "SELECT EXISTS(SELECT 1 FROM unsubscribe_links WHERE link = :link AND linked_email_address = :linked_email_address)",
+                {"link": link, "linked_email_address": args.linked_email}
+            ).scalar()
+            if link_exists:
+                continue
+
+            db.add(
+                UnsubscribeLinks(
+                    link=link,
+                    unsubscribe_status=UnsubscribeStatus.pending,
+                    linked_email_address=args.linked_email,
+                    scanned_email_id=scanned_email.id,
+                )
+            )
+        db.flush()
+        db.commit()
+
+
+def write_batched(db, emails: list, use_copy: bool = False) -> None:
+    """Write the emails with the ScannedEmailWriter."""
+    writer = ScannedEmailWriter(
+        db,
+        args.linked_email,
+        batch_size=args.copy_batch_size if use_copy else args.batch_size,
+        use_copy=use_copy,
+    )
+    for email in emails:
+        writer.add(
+            email["email_from"],
+            email["subject"],
+            email["inbox_date"],
+            email["unsubscribe_links"],
+            uid=email["uid"],
+        )
+    writer.flush()
+
+
+db = SessionLocal()
+runs = []
+
+try:
+    if not db.query(LinkedEmails).filter(LinkedEmails.email == args.linked_email).first():
+        raise Exception(f"Could not find linked email {args.linked_email}")
+
+    for name, write in (
+        ("per email", write_per_email),
+        ("batched", write_batched),
+        ("copy", lambda db, emails: write_batched(db, emails, use_copy=True)),
+    ):
+        run = f"bench-scan-writes-{uuid.uuid4().hex}"
+        runs.append(run)
+        emails = generate_emails(run)
+
+        start = time.perf_counter()
+        write(db, emails)
+        elapsed = time.perf_counter() - start
+
+        # Writing the same emails again is what a rescan does.
+        start = time.perf_counter()
+        write(db, emails)
+        rescan_elapsed = time.perf_counter() - start
+
+        print(
+            f"{name:<10} emails={args.emails:<7} links={args.emails * args.links:<7} "
+            f"time={elapsed:.2f}s inserts/sec={args.emails / elapsed:.0f} "
+            f"rescan time={rescan_elapsed:.2f}s"
+        )
+finally:
+    # Remove the benchmark emails, their unsubscribe links are removed by the cascade.
+    db.rollback()
+    for run in runs:
+        db.query(ScannedEmails).filter(
+            ScannedEmails.linked_email_address == args.linked_email,
+            ScannedEmails.subject.like(f"{run} - %"),
+        ).delete(synchronize_session=False)
+    db.commit()
+    db.close()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""This script benchmarks requesting unsubscribe links one after another against
+requesting them concurrently with LinkUnsubscriber. The links point to a local fake
+HTTP server that sleeps --latency seconds per request to simulate slow marketing hosts,
+spread over --hosts loopback addresses so the per host limit applies. The connection
+pool hits and misses of the shared http client are printed to show connection reuse.
+
+The script accepts these params:
+--links [Optional] (Int) the number of unsubscribe links to request.
+--hosts [Optional] (Int) the number of hosts the links are spread over.
+--latency [Optional] (Float) the simulated response time of a host in seconds.
+--concurrency [Optional] (Int) the max number of links requested at once.
+--concurrency_per_host [Optional] (Int) the max number of links requested at once per host.
+-h --help (Bool) prints the help message for this script
+"""
+
+import argparse
+import time
+
+from app.models import UnsubscribeLinks
+from app.objects.http_client import get_http_client_stats
+from app.objects.link_unsubscriber import LinkUnsubscriber
+from app.tests.http_server import FakeHTTPServer
+
+
+argParser = argparse.ArgumentParser(prog="Benchmark unsubscribe", description="Compares sequential to concurrent unsubscribe link requests")
+argParser.add_argument("--links", help="the number of unsubscribe links to request", default=200, type=int)
+argParser.add_argument("--hosts", help="the number of hosts the links are spread over", default=20, type=int)
+argParser.add_argument("--latency", help="the simulated response time of a host in seconds", default=0.1, type=float)
+argParser.add_argument("--concurrency", help="the max number of links requested at once", default=32, type=int)
+argParser.add_argument("--concurrency_per_host", help="the max number of links requested at once per host", default=4, type=int)
+
+args = argParser.parse_args()
+
+
+with FakeHTTPServer(latency=args.latency) as server:
+    links = [
+        UnsubscribeLinks(link=server.url(f"/unsubscribe/{i}", host=f"127.0.0.{i % args.hosts + 1}"))
+        for i in range(args.links)
+    ]
+
+    for name, link_unsubscriber in (
+        ("sequential", LinkUnsubscriber(max_workers=1, max_per_host=1)),
+        ("concurrent", LinkUnsubscriber(max_workers=args.concurrency, max_per_host=args.concurrency_per_host)),
+    ):
+        stats_before = get_http_client_stats()
+        start = time.perf_counter()
+        for _ in link_unsubscriber.unsubscribe(links):
+            pass
+        elapsed = time.perf_counter() - start
+        stats = { key: value - stats_before[key] for key, value in get_http_client_stats().items() }
+
+        print(
+            f"{name:<11} links={args.links:<6} hosts={args.hosts:<4} "
+            f"time={elapsed:.2f}s links/sec={args.links / elapsed:.1f} "
+            f"pool hits={stats['pool_hits']} pool misses={stats['pool_misses']}"
+        )
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""This script load tests the read endpoints of a running api server. It sends --requests
+requests to each endpoint, --concurrency at a time, as the user that owns the linked email
+and prints the requests/sec and the p50/p99 latency of each endpoint.
+
+Run it against the server before and after a change to compare them, e.g. the sync and
+async versions of the endpoints with the same number of uvicorn workers.
+
+The script accepts these params:
+-l --linked_email (Str) the linked email to read the data of, it should have scanned emails.
+--url [Optional] (Str) the base url of the api server.
+--requests [Optional] (Int) the number of requests sent to each endpoint.
+--concurrency [Optional] (Int) the number of requests in flight at once.
+-h --help (Bool) prints the help message for this script
+"""
+
+import argparse
+import asyncio
+import time
+
+from typing import List, Tuple
+
+import httpx
+
+from app.config import security
+from app.database.database import SessionLocal
+from app.models.linked_emails import LinkedEmails
+from app.models.scanned_emails import ScannedEmails
+
+
+argParser = argparse.ArgumentParser(prog="Load test endpoints", description="Measures the requests/sec and latency of the read endpoints")
+argParser.add_argument("-l", "--linked_email", help="the linked email to read the data of", required=True)
+argParser.add_argument("--url", help="the base url of the api server", default="http://localhost:8000")
+argParser.add_argument("--requests", help="the number of requests sent to each endpoint", default=2000, type=int)
+argParser.add_argument("--concurrency", help="the number of requests in flight at once", default=50, type=int)
+
+args = argParser.parse_args()
+
+
+db = SessionLocal()
+linked_email = db.query(LinkedEmails).filter(LinkedEmails.email == args.linked_email).first()
+if not linked_email:
+    raise Exception(f"Could not find linked email {args.linked_email}")
+
+scanned_email = (
+    db.query(ScannedEmails)
+    .filter(ScannedEmails.linked_email_address == linked_email.email)
+    .first()
+)
+if not scanned_email:
+    raise Exception(f"Linked email {args.linked_email} has no scanned emails")
+db.close()
+
+headers = { "Authorization": f"Bearer {security.create_access_token(linked_email.user_id)}" }
+
+# (name, method, path, params or json body)
+endpoints = [
+    ("get_linked_emails", "GET", "/linked_emails/", None),
+    ("get_senders", "GET", "/scanned_emails/senders/0", { "linked_email": linked_email.email }),
+    (
+        "get_scanned_emails",
+        "POST",
+        "/scanned_emails/get_scanned_emails",
+        {
+            "linked_email": linked_email.email,
+            "email_from": scanned_email.email_from,
+            "page": 0,
+        },
+    ),
+    (
+        "get_unsubscribe_links_by_email",
+        "GET",
+        f"/unsubscribe_links/unsubscribe_links_by_email/{scanned_email.id}",
+        { "linked_email": linked_email.email },
+    ),
+]
+
+
+async def load_test(
+    client: httpx.AsyncClient, method: str, path: str, data: dict,
+) -> Tuple[float, List[float], int]:
+    """Send the requests to an endpoint.
+
+    Returns:
+        Tuple[float, List[float], int]: The elapsed seconds, the latency of each request and the number of errors
+    """
+    remaining = iter(range(args.requests))
+    latencies = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            if method == "GET":
+                res = await client.get(path, params=data)
+            else:
+                res = await client.post(path, json=data)
+            latencies.append(time.perf_counter() - start)
+            if res.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[ worker() for _ in range(args.concurrency) ])
+    return time.perf_counter() - start, latencies, errors
+
+
+def percentile(latencies: List[float], p: float) -> float:
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+
+async def main() -> None:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, headers=headers, limits=limits, timeout=30) as client:
+        for name, method, path, data in endpoints:
+            elapsed, latencies, errors = await load_test(client, method, path, data)
+            print(
+                f"{name:<31} requests={args.requests:<6} concurrency={args.concurrency:<4} "
+                f"requests/sec={args.requests / elapsed:.1f} "
+                f"p50={percentile(latencies, 0.5) * 1000:.1f}ms p99={percentile(latencies, 0.99) * 1000:.1f}ms "
+                f"errors={errors}"
+            )
+
+
+asyncio.run(main())
@@ -0,0 +1,95 @@
+"""A small in-process HTTP server used by the tests and benchmark scripts to stand in
+for the unsubscribe link hosts.
+
+Every request is answered with 200 after `latency` seconds, unless the path starts with
+/status/<code> in which case it's answered with that status code, redirecting to
+/unsubscribed for 3xx codes. The server listens on all loopback addresses so links to
+127.0.0.1, 127.0.0.2, etc. look like different hosts.
+"""
+import re
+import threading
+import time
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _FakeHTTPHandler(BaseHTTPRequestHandler):
+    """Handle a single HTTP request."""
+
+    # Keep connections alive like real servers do.
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        self.handle_request()
+
+    def do_POST(self) -> None:
+        self.handle_request()
+
+    def handle_request(self) -> None:
+        host = self.headers.get("Host", "").rsplit(":", 1)[0]
+
+        # Read the request body so the connection can be reused.
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        with self.server.lock:
+            self.server.requests.append((self.command, host, self.path, body))
+            self.server.active[host] += 1
+            self.server.max_active[host] = max(self.server.max_active[host], self.server.active[host])
+            self.server.max_active_total = max(
+                self.server.max_active_total, sum(self.server.active.values())
+            )
+
+        try:
+            if self.server.latency:
+                time.sleep(self.server.latency)
+
+            status = re.match(r"/status/(\d+)", self.path)
+            response = b"<p>You have been unsubscribed</p>"
+            status_code = int(status.group(1)) if status else 200
+            self.send_response(status_code)
+            if 300 <= status_code < 400:
+                self.send_header("Location", "/unsubscribed")
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+        finally:
+            with self.server.lock:
+                self.server.active[host] -= 1
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class FakeHTTPServer(ThreadingHTTPServer):
+    """A threaded fake HTTP server. Use it as a context manager.
+
+    `requests` records the (method, host, path, body) of every request, and `max_active`
+    the most requests any host had in flight at once.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0) -> None:
+        super().__init__(("", 0), _FakeHTTPHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = []
+        self.active = Counter()
+        self.max_active = Counter()
+        self.max_active_total = 0
+
+    def __enter__(self) -> "FakeHTTPServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def url(self, path: str, host: str = "127.0.0.1") -> str:
+        """Get the url of `path` on this server through `host`."""
+        return f"http://{host}:{self.server_address[1]}{path}"
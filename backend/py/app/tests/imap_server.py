@@ -0,0 +1,375 @@
+"""A small in-process IMAP server used by the tests and benchmark scripts.
+
+It only speaks the subset of IMAP4rev1 that EmailUnsubscriber uses and serves
+a single read-only INBOX built from a list of raw RFC 5322 messages.
+"""
+import email
+import re
+import shlex
+import socket
+import socketserver
+import threading
+import time
+
+from collections import Counter
+from email.message import Message
+from imaplib import IMAP4
+from typing import List
+
+
+class _FakeIMAPHandler(socketserver.StreamRequestHandler):
+    """Handle a single IMAP client connection."""
+
+    # Buffer each response and send it in one go, like a real server would.
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.connections.append(self.connection)
+        self.enabled = set()
+
+    def handle(self) -> None:
+        self.send_line("* OK Fake IMAP server ready")
+        self.wfile.flush()
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+
+            tag, command, args = self.parse_command(line.decode().rstrip("\r\n"))
+            self.server.command_counts[command] += 1
+
+            # Simulate the network round trip of every command.
+            if self.server.latency:
+                time.sleep(self.server.latency)
+
+            handler = getattr(self, f"do_{command.replace(' ', '_')}", None)
+            if handler is None:
+                self.send_line(f"{tag} BAD Unknown command {command}")
+                self.wfile.flush()
+                continue
+
+            keep_open = handler(tag, args)
+            self.wfile.flush()
+            if keep_open is False:
+                return
+
+    @staticmethod
+    def parse_command(line: str) -> tuple:
+        """Split a command line into its tag, command name and arguments."""
+        parts = line.split(" ", 2)
+        tag, command = parts[0], parts[1].upper()
+        args = parts[2] if len(parts) > 2 else ""
+
+        # Treat UID commands as their own command, e.g. 'UID FETCH'
+        if command == "UID":
+            sub_command, _, args = args.partition(" ")
+            command = f"UID {sub_command.upper()}"
+
+        return tag, command, args
+
+    def send_line(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def send_bytes(self, data: bytes) -> None:
+        self.wfile.write(data)
+
+    def do_CAPABILITY(self, tag: str, args: str) -> None:
+        self.send_line(f"* CAPABILITY {' '.join(self.server.capabilities)}")
+        self.send_line(f"{tag} OK CAPABILITY completed")
+
+    def do_LOGIN(self, tag: str, args: str) -> None:
+        self.send_line(f"{tag} OK LOGIN completed")
+
+    def do_ENABLE(self, tag: str, args: str) -> None:
+        enabled = [ext for ext in args.upper().split() if ext in self.server.capabilities]
+        self.enabled.update(enabled)
+        self.send_line(f"* ENABLED {' '.join(enabled)}".rstrip())
+        self.send_line(f"{tag} OK ENABLE completed")
+
+    def do_EXAMINE(self, tag: str, args: str) -> None:
+        self.send_line(f"* {len(self.server.messages)} EXISTS")
+        self.send_line(f"* OK [UIDVALIDITY {self.server.uid_validity}] UIDs valid")
+        self.send_line(f"* OK [UIDNEXT {self.server.uid_next}] Predicted next UID")
+        if self.enabled or "CONDSTORE" in self.server.capabilities:
+            self.send_line(f"* OK [HIGHESTMODSEQ {self.server.highest_modseq}] Highest")
+        self.send_line(f"{tag} OK [READ-ONLY] EXAMINE completed")
+
+    do_SELECT = do_EXAMINE
+
+    def do_FETCH(self, tag: str, args: str) -> None:
+        sequence_set, items = args.split(" ", 1)
+        for seq in self.server.parse_sequence_set(sequence_set, len(self.server.messages)):
+            self.send_fetch_response(seq, items)
+        self.send_line(f"{tag} OK FETCH completed")
+
+    def do_UID_FETCH(self, tag: str, args: str) -> None:
+        uid_set, items = args.split(" ", 1)
+        uids = set(self.server.parse_uid_set(uid_set))
+
+        # CONDSTORE/QRESYNC fetch modifiers, e.g. (CHANGEDSINCE 12 VANISHED)
+        changed_since = re.search(r"\(CHANGEDSINCE (\d+)( VANISHED)?\)", items, re.IGNORECASE)
+        if changed_since:
+            items = items[:changed_since.start()].strip()
+            modseq = int(changed_since.group(1))
+            uids = {uid for uid in uids if self.server.modseqs[uid] > modseq}
+
+            if changed_since.group(2):
+                vanished = sorted(
+                    uid for uid, expunged_modseq in self.server.expunged.items()
+                    if expunged_modseq > modseq
+                )
+                if vanished:
+                    self.send_line(f"* VANISHED (EARLIER) {','.join(str(uid) for uid in vanished)}")
+
+        # UID FETCH responses always include the UID.
+        if not re.search(r"\bUID\b", items, re.IGNORECASE):
+            items = f"(UID {items.strip('()')})"
+
+        for seq, (uid, _) in enumerate(self.server.messages, start=1):
+            if uid in uids:
+                self.send_fetch_response(seq, items)
+        self.send_line(f"{tag} OK UID FETCH completed")
+
+    def do_UID_SEARCH(self, tag: str, args: str) -> None:
+        self.server.searches.append(args)
+        uids = [uid for uid, _ in self.server.messages]
+
+        criteria = shlex.split(args)
+        while criteria:
+            key = criteria.pop(0).upper()
+            if key == "UID":
+                matching = set(self.server.parse_uid_set(criteria.pop(0)))
+                uids = [uid for uid in uids if uid in matching]
+            elif key == "HEADER":
+                name, value = criteria.pop(0), criteria.pop(0)
+                uids = [uid for uid in uids if self.server.has_header(uid, name, value)]
+            elif key == "X-GM-RAW" and "X-GM-EXT-1" in self.server.capabilities:
+                # Only the has:list-unsubscribe gmail search operator is supported.
+                query = criteria.pop(0).lower()
+                if query != "has:list-unsubscribe":
+                    self.send_line(f"{tag} BAD Unsupported X-GM-RAW query {query}")
+                    return
+                uids = [uid for uid in uids if self.server.has_header(uid, "List-Unsubscribe")]
+            elif key != "ALL":
+                self.send_line(f"{tag} BAD Unsupported search key {key}")
+                return
+
+        self.send_line(f"* SEARCH {' '.join(str(uid) for uid in uids)}".rstrip())
+        self.send_line(f"{tag} OK UID SEARCH completed")
+
+    def do_CLOSE(self, tag: str, args: str) -> None:
+        self.send_line(f"{tag} OK CLOSE completed")
+
+    def do_NOOP(self, tag: str, args: str) -> None:
+        self.send_line(f"{tag} OK NOOP completed")
+
+    def do_LOGOUT(self, tag: str, args: str) -> bool:
+        self.send_line("* BYE Logging out")
+        self.send_line(f"{tag} OK LOGOUT completed")
+        return False
+
+    def send_fetch_response(self, seq: int, items: str) -> None:
+        """Write an untagged FETCH response for the message at `seq`."""
+        uid, raw_message = self.server.messages[seq - 1]
+        parts = []
+
+        for item in re.findall(r"BODY\.PEEK\[[^\]]*\](?:<\d+\.\d+>)?|[A-Z0-9.]+", items.upper()):
+            if item == "UID":
+                parts.append(f"UID {uid}".encode())
+            elif item == "MODSEQ":
+                parts.append(f"MODSEQ ({self.server.modseqs[uid]})".encode())
+            elif item == "BODYSTRUCTURE":
+                parts.append(b"BODYSTRUCTURE " + self.server.get_body_structure(raw_message))
+            elif item.startswith("BODY.PEEK["):
+                section, _, partial = item[len("BODY.PEEK["):].partition("]")
+                data = self.server.get_section(raw_message, section)
+
+                # Partial fetches, e.g. BODY.PEEK[1]<0.1024>, are answered as BODY[1]<0>
+                name = f"BODY[{section}]"
+                if partial:
+                    origin, count = map(int, partial.strip("<>").split("."))
+                    data = data[origin:origin + count]
+                    name = f"{name}<{origin}>"
+
+                parts.append(f"{name} {{{len(data)}}}\r\n".encode() + data)
+
+        self.send_bytes(f"* {seq} FETCH (".encode() + b" ".join(parts) + b")\r\n")
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    """A threaded fake IMAP server serving `messages` as the INBOX.
+
+    Use it as a context manager. `command_counts` records how many times each
+    command was received, which the benchmarks use to count round trips, and
+    `searches` the criteria of every UID SEARCH.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(
+        self,
+        messages: List[bytes],
+        latency: float = 0,
+        uid_validity: int = 1,
+        first_uid: int = 1,
+        capabilities: List[str] = None,
+    ) -> None:
+        super().__init__(("127.0.0.1", 0), _FakeIMAPHandler)
+        self.messages = [(first_uid + i, msg) for i, msg in enumerate(messages)]
+        self.latency = latency
+        self.uid_validity = uid_validity
+        self.capabilities = ["IMAP4REV1"] + (capabilities or [])
+
+        # Every change to the mailbox gets a new mod sequence, as with CONDSTORE.
+        self.modseqs = {uid: uid for uid, _ in self.messages}
+        self.expunged = {}
+        self.command_counts = Counter()
+        self.searches = []
+        self.connections = []
+
+    def __enter__(self) -> "FakeIMAPServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
+
+        # Hang up on any clients still connected so they don't block on a dead server.
+        for connection in self.connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    @property
+    def uid_next(self) -> int:
+        return self.messages[-1][0] + 1 if self.messages else 1
+
+    @property
+    def highest_modseq(self) -> int:
+        return max([*self.modseqs.values(), *self.expunged.values(), 0])
+
+    def append(self, message: bytes) -> int:
+        """Add a new message to the mailbox and return its UID."""
+        uid = self.uid_next
+        self.messages.append((uid, message))
+        self.modseqs[uid] = self.highest_modseq + 1
+        return uid
+
+    def expunge(self, uid: int) -> None:
+        """Remove the message with this UID from the mailbox."""
+        self.messages = [message for message in self.messages if message[0] != uid]
+        self.expunged[uid] = self.highest_modseq + 1
+        del self.modseqs[uid]
+
+    def imap_client(self, host: str = None) -> IMAP4:
+        """Connect a plain text IMAP client to this server. This is meant to replace
+        IMAP4_SSL with mock.patch.
+        """
+        return IMAP4(*self.server_address)
+
+    def has_header(self, uid: int, name: str, value: str = "") -> bool:
+        """Check if the message with this UID has the header `name` containing `value`,
+        like SEARCH HEADER does.
+        """
+        raw_message = dict(self.messages)[uid]
+        header = self.get_section(raw_message, f"HEADER.FIELDS ({name})")
+        _, _, header_value = header.partition(b":")
+        return bool(header_value) and value.lower().encode() in header_value.lower()
+
+    @staticmethod
+    def parse_sequence_set(sequence_set: str, largest: int) -> List[int]:
+        """Expand an IMAP sequence set like '1:3,7,9:*' into a list of numbers."""
+        numbers = []
+        for part in sequence_set.split(","):
+            start, _, end = part.partition(":")
+            start = largest if start == "*" else int(start)
+            end = start if not end else largest if end == "*" else int(end)
+            numbers.extend(range(min(start, end), max(start, end) + 1))
+        return [num for num in numbers if 1 <= num <= largest]
+
+    def parse_uid_set(self, uid_set: str) -> List[int]:
+        """Expand an IMAP UID set into the UIDs of the messages in the mailbox."""
+        largest = self.messages[-1][0] if self.messages else 0
+        numbers = []
+        for part in uid_set.split(","):
+            start, _, end = part.partition(":")
+            start = largest if start == "*" else int(start)
+            end = start if not end else largest if end == "*" else int(end)
+            numbers.extend(range(min(start, end), max(start, end) + 1))
+
+        existing = {uid for uid, _ in self.messages}
+        return [num for num in numbers if num in existing]
+
+    @staticmethod
+    def get_section(raw_message: bytes, section: str) -> bytes:
+        """Return the requested BODY[section] of a raw message."""
+        header, _, body = raw_message.partition(b"\r\n\r\n")
+
+        if section == "HEADER":
+            return header + b"\r\n\r\n"
+        if section.startswith("HEADER.FIELDS"):
+            fields = section[section.index("(") + 1:section.index(")")].split()
+            wanted = {field.encode().lower() for field in fields}
+
+            # Keep each wanted header along with its folded continuation lines.
+            lines, keep = [], False
+            for line in header.split(b"\r\n"):
+                if not line[:1].isspace():
+                    keep = line.split(b":", 1)[0].strip().lower() in wanted
+                if keep:
+                    lines.append(line + b"\r\n")
+            return b"".join(lines) + b"\r\n"
+        if section == "":
+            return raw_message
+        if section == "TEXT":
+            return body
+        if re.fullmatch(r"\d+(\.\d+)*", section):
+            # The content of a body part, still content transfer encoded.
+            part = email.message_from_bytes(raw_message)
+            for number in map(int, section.split(".")):
+                if part.is_multipart():
+                    part = part.get_payload(number - 1)
+                elif number != 1:
+                    raise ValueError(f"Unsupported section {section}")
+            return part.as_bytes().replace(b"\r\n", b"\n").partition(b"\n\n")[2].replace(b"\n", b"\r\n")
+
+        raise ValueError(f"Unsupported section {section}")
+
+    @classmethod
+    def get_body_structure(cls, raw_message: bytes) -> bytes:
+        """Return the BODYSTRUCTURE of a raw message."""
+
+        def quote(value: str) -> str:
+            return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+        def structure(part: Message) -> str:
+            if part.is_multipart():
+                return "(" + "".join(structure(sub_part) for sub_part in part.get_payload()) + f" {quote(part.get_content_subtype())})"
+
+            params = " ".join(
+                f"{quote(name)} {quote(value)}" for name, value in part.get_params()[1:]
+            )
+            content = part.as_bytes().replace(b"\r\n", b"\n").partition(b"\n\n")[2].replace(b"\n", b"\r\n")
+            encoding = part.get("Content-Transfer-Encoding", "7bit")
+            disposition = part.get_content_disposition()
+            fields = [
+                quote(part.get_content_maintype()),
+                quote(part.get_content_subtype()),
+                f"({params})" if params else "NIL",
+                "NIL",
+                "NIL",
+                quote(encoding),
+                str(len(content)),
+            ]
+            if part.get_content_maintype() == "text":
+                fields.append(str(content.count(b"\r\n")))
+            fields += ["NIL", f"({quote(disposition)} NIL)" if disposition else "NIL", "NIL", "NIL"]
+            return "(" + " ".join(fields) + ")"
+
+        return structure(email.message_from_bytes(raw_message)).encode()
@@ -0,0 +1,53 @@
+import base64
+
+from app.objects.body_structure import decode_text_part, get_text_parts, parse_fetch_response
+
+
+class TestBodyStructure:
+    """Test the imap BODYSTRUCTURE helpers"""
+
+    def test_parse_fetch_response(self) -> None:
+        """Test parsing FETCH responses, including literals"""
+        data = [
+            b'1 (UID 7 BODYSTRUCTURE ("text" "html" ("charset" "utf-8") NIL NIL "base64" 120 2 NIL NIL NIL NIL))',
+            (b'2 (UID 8 BODY[1]<0> {11}', b"hello (world"),
+            (b' BODY[2]<0> {3}', b"bye"),
+            b")",
+        ]
+
+        assert parse_fetch_response(data) == [
+            (1, {
+                "UID": "7",
+                "BODYSTRUCTURE": ["text", "html", ["charset", "utf-8"], None, None, "base64", "120", "2", None, None, None, None],
+            }),
+            (2, {"UID": "8", "BODY[1]<0>": b"hello (world", "BODY[2]<0>": b"bye"}),
+        ]
+
+    def test_get_text_parts(self) -> None:
+        """Test getting the text parts of a multipart email without its attachments"""
+        body_structure = [
+            [
+                ["text", "plain", ["charset", "us-ascii"], None, None, "7bit", "20", "1", None, None, None, None],
+                ["text", "html", ["CHARSET", "utf-8"], None, None, "quoted-printable", "40", "1", None, None, None, None],
+                "alternative", ["boundary", "b1"], None, None, None,
+            ],
+            ["text", "plain", None, None, None, "base64", "80", "1", None, ["attachment", ["filename", "a.txt"]], None, None],
+            ["image", "png", None, None, None, "base64", "5000", None, ["attachment", None], None, None],
+            "mixed",
+        ]
+
+        assert get_text_parts(body_structure) == [
+            ("1.1", "plain", "us-ascii", "7bit", 20),
+            ("1.2", "html", "utf-8", "quoted-printable", 40),
+        ]
+        assert get_text_parts(["text", "html", None, None, None, "7bit", "20", "1"]) == [
+            ("1", "html", None, "7bit", 20)
+        ]
+
+    def test_decode_partial_text_part(self) -> None:
+        """Test decoding text parts that were cut off by a partial fetch"""
+        encoded = base64.encodebytes("unsubscribe here ✓".encode())
+        assert decode_text_part(encoded[:-3], "utf-8", "base64").startswith("unsubscribe here")
+        assert decode_text_part(b"opt=\r\nout =E2=9C", "utf-8", "quoted-printable").startswith("optout ")
+        assert decode_text_part(b"caf\xe9", "latin-1", "8bit") == "café"
+        assert decode_text_part(b"hi", "x-unknown", "7bit") == "hi"
@@ -0,0 +1,30 @@
+import pytest
+
+from fastapi import HTTPException
+
+from app.objects.cursor import decode_cursor, encode_cursor
+
+
+class TestCursor:
+    """Test the pagination cursor helpers"""
+
+    def test_cursor(self) -> None:
+        """Test a cursor decodes to the sort key it was encoded from"""
+        cursor = encode_cursor("Spam Email - 10", 42)
+        assert decode_cursor(cursor, str, int) == ("Spam Email - 10", 42)
+
+    @pytest.mark.parametrize("cursor", [
+        "not a cursor",
+        encode_cursor("a"),
+        encode_cursor("a", 1)[:-2],
+        encode_cursor(["a", 1]),
+        encode_cursor("a", "1"),
+        encode_cursor("a", True),
+        encode_cursor(None, 1),
+        encode_cursor("a", {"id": 1}),
+    ])
+    def test_invalid_cursor(self, cursor: str) -> None:
+        """Test an invalid, tampered or wrongly shaped cursor is rejected"""
+        with pytest.raises(HTTPException) as e:
+            decode_cursor(cursor, str, int)
+        assert e.value.status_code == 400
@@ -0,0 +1,56 @@
+import email
+
+import pytest
+
+from app.objects.email_headers import EmailHeaderParser
+from app.objects.email_unsubscriber import EmailUnsubscriber
+
+FIELDS = ["From", "Subject", "Date", "List-Unsubscribe", "List-Unsubscribe-Post"]
+
+
+class TestEmailHeaderParser:
+    """Test pulling header fields out of raw header blocks"""
+
+    @pytest.mark.parametrize("raw_headers", [
+        # Folded fields, lower cased names and fields we don't parse
+        (
+            b"Received: from mail.example.com\r\n\tby mx.example.com\r\n"
+            b"from: =?utf-8?q?Spammer?= <spammer@example.com>\r\n"
+            b"X-From: not@example.com\r\n"
+            b"Subject: A very long subject\r\n that was folded\r\n\ttwice\r\n"
+            b"Date: Mon, 2 Oct 2023 10:00:00 +0000\r\n"
+            b"List-Unsubscribe-Post: List-Unsubscribe=One-Click\r\n"
+            b"List-Unsubscribe: <mailto:unsubscribe@example.com>,\r\n <https://example.com/unsubscribe>\r\n"
+            b"\r\n"
+        ),
+        # A repeated field, LF line endings and a body after the header block
+        (
+            b"Subject:no space\n"
+            b"Subject: second subject\n"
+            b"From: spammer@example.com\n"
+            b"\n"
+            b"List-Unsubscribe: <https://example.com/in_the_body>\n"
+        ),
+        # 8 bit bytes and missing fields
+        "From: Spämmer <spammer@example.com>\r\nSubject: Ünicode\r\n\r\n".encode("latin-1"),
+    ])
+    def test_parse_matches_message(self, raw_headers: bytes) -> None:
+        """Test the parsed fields are read the same as from a Message"""
+        email_msg = email.message_from_bytes(raw_headers)
+        email_headers = EmailHeaderParser(FIELDS).parse(raw_headers)
+
+        for field in FIELDS + ["X-From", "Received"]:
+            expected = email_msg[field] if field in FIELDS else None
+            assert str(email_headers[field]) == str(expected)
+            assert type(email_headers[field]) is type(expected)
+
+        assert EmailUnsubscriber._parse_email_message_obj(email_headers) == \
+            EmailUnsubscriber._parse_email_message_obj(email_msg)
+
+    def test_parse_folded_field(self) -> None:
+        """Test a folded field keeps its folding like Message does"""
+        email_headers = EmailHeaderParser(FIELDS).parse(b"subject: Folded\r\n subject\r\n\r\n")
+
+        assert email_headers["SUBJECT"] == "Folded\r\n subject"
+        assert "Subject" in email_headers
+        assert email_headers.get("From", "missing") == "missing"
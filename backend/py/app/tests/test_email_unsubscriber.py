@@ -1,12 +1,480 @@
+import email
+import re
+
+from email.message import EmailMessage
+from unittest import mock
+
+from app.config.config import settings
 from app.objects.email_unsubscriber import EmailUnsubscriber
+from app.test_utils import generate_email_message
 from app.tests.html_emails.basic_promo import basic_promo
+from app.tests.imap_server import FakeIMAPServer
 
 
 class TestEmailUnsubscriber:
     """Test email unsubscriber class"""
 
+    @classmethod
+    def setup_class(cls) -> None:
+        cls.messages = []
+        for i in range(1, 21):
+            message = generate_email_message(
+                to_email="email@yahoo.com",
+                from_email=f"spammer{i}@email.com",
+                subject=f"Spam Email - {i}",
+                body="<p>spam</p>",
+                list_unsubscribe=[f"<https://example.com/unsubscribe_me/{i}>"],
+            )
+            message.add_header("DKIM-Signature", "v=1; a=rsa-sha256; b=" + "a" * 500)
+            cls.messages.append(message.as_bytes().replace(b"\n", b"\r\n"))
+
     def test_get_unsubscribe_links_html(self) -> None:
         """Test getting unsubscribe links from html emails"""
         assert [
             "https://github.com/konsav/email-templates/"
         ] == EmailUnsubscriber._get_unsubscribe_links_from_html(body=basic_promo)
+
+        body = (
+            "<html><body>"
+            '<a href="https://example.com/offer">Shop now</a>'
+            '<a href="https://example.com/opt_out">OPT\r\n OUT</a>'
+            '<a href="https://example.com/unsub\r\nscribe_me">UnSubscribe</a>'
+            "</body></html>"
+        )
+        assert EmailUnsubscriber._get_unsubscribe_links_from_html(body=body) == [
+            "https://example.com/opt_out",
+            "https://example.com/unsubscribe_me",
+        ]
+
+    def test_get_unsubscribe_links_text_plain(self) -> None:
+        """Test getting unsubscribe links from text/plain emails"""
+        body = (
+            "Thanks for your Subscription to our deals: https://example.com/deals \r\n"
+            "To UNSUBSCRIBE click https://example.com/unsubscr\r\nibe_me \r\n"
+            "Or opt out at https://example.com/opt_out\r\n"
+        )
+        assert EmailUnsubscriber._get_unsubscribe_links_from_text_plain(body=body) == [
+            "https://example.com/unsubscribe_me",
+            "https://example.com/opt_out",
+            "https://example.com/deals",
+        ]
+        assert EmailUnsubscriber._get_unsubscribe_links_from_text_plain(body="no links here") == []
+
+    def test_get_one_click_unsubscribe_links(self) -> None:
+        """Test getting the links that support RFC 8058 one-click unsubscribe"""
+        message = generate_email_message(
+            to_email="email@yahoo.com",
+            from_email="spammer@email.com",
+            subject="Spam Email",
+            body="<p>spam</p>",
+            list_unsubscribe=[
+                "<mailto:unsubscribe@email.com>",
+                "<http://example.com/unsubscribe_me>",
+                "<https://example.com/unsubscribe_me>",
+            ],
+        )
+        assert EmailUnsubscriber._get_one_click_unsubscribe_links(message) == []
+
+        message.add_header("List-Unsubscribe-Post", "List-Unsubscribe=One-Click")
+        assert EmailUnsubscriber._get_one_click_unsubscribe_links(message) == [
+            "https://example.com/unsubscribe_me"
+        ]
+
+    def test_to_sequence_set(self) -> None:
+        """Test compressing message numbers into an imap sequence set"""
+        assert EmailUnsubscriber._to_sequence_set([5, 4, 3, 1]) == "1,3:5"
+        assert EmailUnsubscriber._to_sequence_set([10, 9, 8, 7]) == "7:10"
+        assert EmailUnsubscriber._to_sequence_set([2]) == "2"
+
+    def test_split_range_params(self) -> None:
+        """Test splitting an inbox scan into disjoint shards"""
+        shards = EmailUnsubscriber._split_range_params((10, 0, -1), shard_count=3)
+        assert shards == [(10, 6, -1), (6, 2, -1), (2, 0, -1)]
+        assert [ i for shard in shards for i in range(*shard) ] == list(range(10, 0, -1))
+
+        # Small inboxes aren't split into shards smaller than min_shard_size
+        assert EmailUnsubscriber._split_range_params((10, 0, -1), shard_count=4, min_shard_size=6) == [(10, 0, -1)]
+
+    def test_fetch_email_headers_batched(self) -> None:
+        """Test fetching the headers of many emails with a single FETCH command"""
+        with FakeIMAPServer(self.messages) as server:
+            with mock.patch(
+                "app.objects.email_unsubscriber.IMAP4_SSL", server.imap_client
+            ):
+                email_unsubscriber = EmailUnsubscriber(email_type="yahoo")
+                email_unsubscriber.login("email@yahoo.com", "password")
+                email_unsubscriber.imap.select("INBOX", readonly=True)
+
+                headers = email_unsubscriber._fetch_email_headers(list(range(20, 0, -1)))
+                email_unsubscriber.logout()
+
+        assert server.command_counts["FETCH"] == 1
+        assert [ uid for uid, _ in headers ] == list(range(20, 0, -1))
+        assert b"From: spammer20@email.com" in headers[0][1]
+        assert b"From: spammer1@email.com" in headers[-1][1]
+        assert b"<p>spam</p>" not in headers[0][1]
+
+    def test_fetch_body_unsubscribe_links(self) -> None:
+        """Test looking for unsubscribe links in only the text parts of the email bodies"""
+        newsletter = EmailMessage()
+        newsletter.add_header("From", "news@email.com")
+        newsletter.add_header("Subject", "Newsletter")
+        newsletter.set_content("Our news\nTo opt out visit https://example.com/opt_out\n")
+        newsletter.add_alternative(
+            '<p>Our news</p><a href="https://example.com/unsubscribe_me">Unsubscribe</a>',
+            subtype="html",
+            cte="base64",
+        )
+        newsletter.add_attachment(b"\x89PNG" * 10000, maintype="image", subtype="png", filename="news.png")
+
+        notice = EmailMessage()
+        notice.add_header("From", "notice@email.com")
+        notice.add_header("Subject", "Notice")
+        notice.set_content("Manage your subscription: https://example.com/settings \n" + "x" * 5000, cte="quoted-printable")
+
+        photo = EmailMessage()
+        photo.add_header("From", "friend@email.com")
+        photo.add_header("Subject", "Photo")
+        photo.add_attachment(b"\x89PNG" * 10000, maintype="image", subtype="png", filename="photo.png")
+
+        messages = [ message.as_bytes().replace(b"\n", b"\r\n") for message in (newsletter, notice, photo) ]
+
+        with FakeIMAPServer(messages) as server:
+            with mock.patch(
+                "app.objects.email_unsubscriber.IMAP4_SSL", server.imap_client
+            ):
+                email_unsubscriber = EmailUnsubscriber(email_type="yahoo")
+                email_unsubscriber.login("email@yahoo.com", "password")
+                email_unsubscriber.imap.select("INBOX", readonly=True)
+
+                unsubscribe_links, bytes_fetched = email_unsubscriber._fetch_body_unsubscribe_links(
+                    [1, 2, 3], max_bytes=1024, tail_bytes=0,
+                )
+                email_unsubscriber.logout()
+
+        assert unsubscribe_links == {
+            1: ["https://example.com/opt_out", "https://example.com/unsubscribe_me"],
+            2: ["https://example.com/settings"],
+        }
+
+        # A BODYSTRUCTURE fetch and a fetch per distinct set of text parts, without the attachments.
+        assert server.command_counts["UID FETCH"] == 3
+        assert bytes_fetched < 1024 * 3
+
+    def test_fetch_body_unsubscribe_links_tail_first(self) -> None:
+        """Test fetching the end of the text parts first and widening the window when no
+        unsubscribe link is found there
+        """
+        footer = EmailMessage()
+        footer.add_header("From", "news@email.com")
+        footer.add_header("Subject", "Newsletter")
+        footer.set_content(
+            "<p>" + "Our news. " * 6000 + '</p><a href="https://example.com/unsubscribe_me">Unsubscribe</a>',
+            subtype="html",
+            cte="base64",
+        )
+
+        header = EmailMessage()
+        header.add_header("From", "notice@email.com")
+        header.add_header("Subject", "Notice")
+        header.set_content("To opt out visit https://example.com/opt_out \n" + "Our notice.\n" * 500)
+
+        messages = [ message.as_bytes().replace(b"\n", b"\r\n") for message in (footer, header) ]
+
+        with FakeIMAPServer(messages) as server:
+            with mock.patch(
+                "app.objects.email_unsubscriber.IMAP4_SSL", server.imap_client
+            ):
+                email_unsubscriber = EmailUnsubscriber(email_type="yahoo")
+                email_unsubscriber.login("email@yahoo.com", "password")
+                email_unsubscriber.imap.select("INBOX", readonly=True)
+
+                unsubscribe_links, bytes_fetched = email_unsubscriber._fetch_body_unsubscribe_links(
+                    [1, 2], max_bytes=32768, tail_bytes=1024,
+                )
+                email_unsubscriber.logout()
+
+        assert unsubscribe_links == {
+            1: ["https://example.com/unsubscribe_me"],
+            2: ["https://example.com/opt_out"],
+        }
+
+        # The footer is found in the first window of the 80KB email, the start of the 6KB one
+        # once the window covers it, without fetching any of it twice.
+        assert bytes_fetched < 2048 + len(messages[1])
+
+    def test_fetch_body_unsubscribe_links_missing_email(self) -> None:
+        """Test an email missing from the body fetch, e.g. expunged after its BODYSTRUCTURE was
+        fetched, isn't fetched again and the windows stay within max_bytes
+        """
+        notice = EmailMessage()
+        notice.add_header("From", "notice@email.com")
+        notice.add_header("Subject", "Notice")
+        notice.set_content("To opt out visit https://example.com/opt_out \n" + "Our notice.\n" * 500)
+        message = notice.as_bytes().replace(b"\n", b"\r\n")
+
+        with FakeIMAPServer([message, message]) as server:
+            with mock.patch(
+                "app.objects.email_unsubscriber.IMAP4_SSL", server.imap_client
+            ):
+                email_unsubscriber = EmailUnsubscriber(email_type="yahoo")
+                email_unsubscriber.login("email@yahoo.com", "password")
+                email_unsubscriber.imap.select("INBOX", readonly=True)
+
+                queries = []
+                imap_uid = email_unsubscriber.imap.uid
+
+                def uid(command: str, *args) -> tuple:
+                    queries.append(args)
+                    response = imap_uid(command, *args)
+                    # The first email is expunged once its BODYSTRUCTURE is fetched.
+                    if len(queries) == 1:
+                        server.expunge(1)
+                    return response
+
+                with mock.patch.object(email_unsubscriber.imap, "uid", side_effect=uid):
+                    unsubscribe_links, _ = email_unsubscriber._fetch_body_unsubscribe_links(
+                        [1, 2], max_bytes=8192, tail_bytes=1024,
+                    )
+                email_unsubscriber.logout()
+
+        assert unsubscribe_links == {2: ["https://example.com/opt_out"]}
+        # The BODYSTRUCTURE, the first window of both emails, then the widening windows of
+        # the second email only.
+        assert [ sequence_set for sequence_set, _ in queries ] == ["1:2", "1:2", "2", "2"]
+        assert all(
+            int(count) <= 8192
+            for _, query in queries
+            for count in re.findall(r"<\d+\.(\d+)>", query)
+        )
+
+    @mock.patch.object(settings, "SCAN_PARSE_PROCESSES", 2)
+    @mock.patch("app.objects.email_unsubscriber.ScannedEmailWriter")
+    def test_scan_emails_pipeline(self, mock_writer) -> None:
+        """Test scanning emails with the fetch, parse and write stages of the scan pipeline"""
+        mock_writer.return_value.add.return_value = []
+        mock_writer.return_value.flush.return_value = []
+        task = mock.Mock()
+
+        # The scan reads the inbox date of every email.
+        messages = [
+            message.replace(b"\r\n\r\n", b"\r\nDate: Mon, 02 Oct 2023 10:00:00 +0000\r\n\r\n", 1)
+            for message in self.messages
+        ]
+
+        with FakeIMAPServer(messages) as server:
+            with mock.patch(
+                "app.objects.email_unsubscriber.IMAP4_SSL", server.imap_client
+            ):
+                email_unsubscriber = EmailUnsubscriber(email_type="yahoo")
+                email_unsubscriber.login("email@yahoo.com", "password")
+                email_unsubscriber._do_scan_emails(
+                    task=task, range_params=(20, 0, -1), db=mock.Mock(), batch_size=3,
+                )
+                email_unsubscriber.logout()
+
+        assert server.command_counts["FETCH"] == 7
+        assert [ call.args[0] for call in mock_writer.return_value.add.call_args_list ] == [
+            f"spammer{i}@email.com" for i in range(20, 0, -1)
+        ]
+        assert mock_writer.return_value.add.call_args_list[0].args[3] == [
+            "https://example.com/unsubscribe_me/20"
+        ]
+
+        progress = task.update_state.call_args.kwargs["meta"]
+        assert progress["current"] == 20
+        assert set(progress["stages"]) == {"fetch", "parse", "write"}
+        assert progress["stages"]["parse"]["emails"] == 20
+        assert email_unsubscriber.scan_stats == {
+            "bytes_fetched": progress["bytes_fetched"],
+            "stages": progress["stages"],
+        }
+
+    def test_fetch_email_headers_narrow(self) -> None:
+        """Test fetching only the header fields the scanner reads"""
+        with FakeIMAPServer(self.messages) as server:
+            with mock.patch(
+                "app.objects.email_unsubscriber.IMAP4_SSL", server.imap_client
+            ):
+                email_unsubscriber = EmailUnsubscriber(email_type="yahoo")
+                email_unsubscriber.login("email@yahoo.com", "password")
+                email_unsubscriber.imap.select("INBOX", readonly=True)
+
+                full_headers = email_unsubscriber._fetch_email_headers([1])
+                narrow_headers = email_unsubscriber._fetch_email_headers([1], narrow_fetch=True)
+                email_unsubscriber.logout()
+
+        email_msg = email.message_from_bytes(narrow_headers[0][1])
+        assert email_msg["From"] == "spammer1@email.com"
+        assert email_msg["List-Unsubscribe"] == "<https://example.com/unsubscribe_me/1>"
+        assert email_msg["DKIM-Signature"] is None
+        assert len(narrow_headers[0][1]) < len(full_headers[0][1]) - 500
+
+    @mock.patch.object(settings, "IMAP_PREFILTER_LIST_UNSUBSCRIBE", False)
+    @mock.patch("app.objects.email_unsubscriber.chord")
+    def test_rescan_from_checkpoint(self, mock_chord) -> None:
+        """Test a rescan only scans the emails above the last scan checkpoint"""
+        with FakeIMAPServer(self.messages, uid_validity=7, first_uid=101) as server:
+            with mock.patch(
+                "app.objects.email_unsubscriber.IMAP4_SSL", server.imap_client
+            ):
+                email_unsubscriber = EmailUnsubscriber(email_type="yahoo")
+                email_unsubscriber.login("email@yahoo.com", "password")
+
+                # Nothing new since the last scan
+                assert email_unsubscriber.get_unsubscribe_links_from_inbox(
+                    linked_email_id=1, user_id=1, uid_validity=7, last_scanned_uid=120,
+                ) is None
+                assert not mock_chord.called
+
+                email_unsubscriber.get_unsubscribe_links_from_inbox(
+                    linked_email_id=1, user_id=1, uid_validity=7, last_scanned_uid=115, scan_task_id="scan-1",
+                )
+                rescan_shards, = mock_chord.call_args.args
+                rescan_task_ids = (mock_chord.call_args.kwargs, mock_chord.return_value.call_args.kwargs)
+
+                # The UIDVALIDITY changed, scan everything again
+                email_unsubscriber.get_unsubscribe_links_from_inbox(
+                    linked_email_id=1, user_id=1, uid_validity=6, last_scanned_uid=115,
+                )
+                full_scan_shards, = mock_chord.call_args.args
+                callback, = mock_chord.return_value.call_args.args
+
+                email_unsubscriber.imap.select("INBOX", readonly=True)
+                headers = email_unsubscriber._fetch_email_headers([118, 116], uid=True)
+                email_unsubscriber.logout()
+
+        assert [ shard.kwargs for shard in rescan_shards ] == [{"uids": [116, 117, 118, 119, 120]}]
+        assert rescan_task_ids == ({"task_id": "scan-1"}, {"task_id": "scan-1-complete"})
+        assert [ shard.kwargs for shard in full_scan_shards ] == [{"range_params": (20, 0, -1)}]
+        assert callback.args == (1, (7, 120, None), [])
+
+        assert [ uid for uid, _ in headers ] == [118, 116]
+        assert b"From: spammer18@email.com" in headers[0][1]
+
+    @mock.patch.object(settings, "IMAP_PREFILTER_LIST_UNSUBSCRIBE", False)
+    @mock.patch("app.objects.email_unsubscriber.chord")
+    def test_rescan_changed_since(self, mock_chord) -> None:
+        """Test a rescan asks a QRESYNC server for changes since the last HIGHESTMODSEQ
+        and falls back to searching for new UIDs on servers without CONDSTORE.
+        """
+        scan_params = []
+
+        for capabilities in (["ENABLE", "CONDSTORE", "QRESYNC"], []):
+            with FakeIMAPServer(self.messages, first_uid=101, capabilities=capabilities) as server:
+                server.append(self.messages[0])
+                server.expunge(105)
+
+                with mock.patch(
+                    "app.objects.email_unsubscriber.IMAP4_SSL", server.imap_client
+                ):
+                    email_unsubscriber = EmailUnsubscriber(email_type="yahoo")
+                    email_unsubscriber.login("email@yahoo.com", "password")
+                    email_unsubscriber.get_unsubscribe_links_from_inbox(
+                        linked_email_id=1,
+                        user_id=1,
+                        uid_validity=1,
+                        last_scanned_uid=120,
+                        highest_modseq=120,
+                    )
+                    email_unsubscriber.logout()
+
+            shards, = mock_chord.call_args.args
+            callback, = mock_chord.return_value.call_args.args
+            scan_params.append(
+                ([ shard.kwargs for shard in shards ], callback.args, dict(server.command_counts))
+            )
+
+        qresync_shards, qresync_callback_args, qresync_commands = scan_params[0]
+        assert qresync_shards == [{"uids": [121]}]
+        assert qresync_callback_args == (1, (1, 121, 122), [105])
+        assert "UID SEARCH" not in qresync_commands
+
+        fallback_shards, fallback_callback_args, fallback_commands = scan_params[1]
+        assert fallback_shards == [{"uids": [121]}]
+        assert fallback_callback_args == (1, (1, 121, None), [])
+        assert "ENABLE" not in fallback_commands
+
+    @mock.patch.object(settings, "IMAP_PREFILTER_LIST_UNSUBSCRIBE", False)
+    @mock.patch("app.objects.email_unsubscriber.chord")
+    def test_rescan_only_vanished(self, mock_chord) -> None:
+        """Test a rescan that only finds expunged emails is started as a scan without shards,
+        so its group id can be polled like any other scan.
+        """
+        with FakeIMAPServer(self.messages, first_uid=101, capabilities=["ENABLE", "CONDSTORE", "QRESYNC"]) as server:
+            server.expunge(105)
+
+            with mock.patch(
+                "app.objects.email_unsubscriber.IMAP4_SSL", server.imap_client
+            ):
+                email_unsubscriber = EmailUnsubscriber(email_type="yahoo")
+                email_unsubscriber.login("email@yahoo.com", "password")
+                task_id = email_unsubscriber.get_unsubscribe_links_from_inbox(
+                    linked_email_id=1,
+                    user_id=1,
+                    uid_validity=1,
+                    last_scanned_uid=120,
+                    highest_modseq=120,
+                    scan_task_id="scan-1",
+                )
+                email_unsubscriber.logout()
+
+        group_result = mock_chord.return_value.return_value.parent
+        assert task_id == group_result.id
+        assert group_result.save.called
+
+        assert mock_chord.call_args == mock.call([], task_id="scan-1")
+        callback, = mock_chord.return_value.call_args.args
+        assert callback.args == (1, (1, 120, 121), [105])
+        assert mock_chord.return_value.call_args.kwargs == {"task_id": "scan-1-complete"}
+
+    @mock.patch.object(settings, "IMAP_PREFILTER_LIST_UNSUBSCRIBE", True)
+    @mock.patch("app.objects.email_unsubscriber.chord")
+    def test_prefilter_list_unsubscribe(self, mock_chord) -> None:
+        """Test only the emails with a List-Unsubscribe header are scanned, searching
+        with X-GM-RAW on gmail and SEARCH HEADER elsewhere.
+        """
+        personal_messages = []
+        for i in range(1, 6):
+            message = generate_email_message(
+                to_email="email@yahoo.com",
+                from_email=f"friend{i}@email.com",
+                subject=f"Hello - {i}",
+                body="<p>hi</p>",
+                list_unsubscribe=[],
+            )
+            del message["List-Unsubscribe"]
+            personal_messages.append(message.as_bytes().replace(b"\n", b"\r\n"))
+
+        # The personal emails get UIDs 1-5 and the spam emails UIDs 6-25.
+        messages = personal_messages + self.messages
+        scan_params = []
+
+        for capabilities in ([], ["X-GM-EXT-1"]):
+            with FakeIMAPServer(messages, capabilities=capabilities) as server:
+                with mock.patch(
+                    "app.objects.email_unsubscriber.IMAP4_SSL", server.imap_client
+                ):
+                    email_unsubscriber = EmailUnsubscriber(email_type="yahoo")
+                    email_unsubscriber.login("email@yahoo.com", "password")
+                    email_unsubscriber.get_unsubscribe_links_from_inbox(linked_email_id=1, user_id=1)
+
+                    # A rescan only searches the new emails
+                    server.append(personal_messages[0])
+                    server.append(self.messages[0])
+                    email_unsubscriber.get_unsubscribe_links_from_inbox(
+                        linked_email_id=1, user_id=1, uid_validity=1, last_scanned_uid=25,
+                    )
+                    email_unsubscriber.logout()
+
+            full_scan_shards, rescan_shards = [
+                [ shard.kwargs for shard in call.args[0] ] for call in mock_chord.call_args_list[-2:]
+            ]
+            scan_params.append((full_scan_shards, rescan_shards, list(server.searches)))
+
+        for full_scan_shards, rescan_shards, _ in scan_params:
+            assert full_scan_shards == [{"uids": list(range(25, 5, -1))}]
+            assert rescan_shards == [{"uids": [27]}]
+
+        assert scan_params[0][2] == ['HEADER List-Unsubscribe ""', 'UID 26:* HEADER List-Unsubscribe ""']
+        assert scan_params[1][2] == ['X-GM-RAW "has:list-unsubscribe"', 'UID 26:* X-GM-RAW "has:list-unsubscribe"']
@@ -0,0 +1,23 @@
+from app.objects.keyword_matcher import KeywordMatcher
+
+
+class TestKeywordMatcher:
+    """Test the single pass keyword matcher"""
+
+    def test_find_first(self) -> None:
+        """Test the first position of every keyword is found, case insensitively"""
+        matcher = KeywordMatcher(["unsubscribe", "[unsubscribe]", "opt out", "subscription"])
+
+        assert matcher.find_first("Opt Out or [UNSUBSCRIBE] from this subscription, unsubscribe") == {
+            "opt out": 0,
+            "[unsubscribe]": 11,
+            "unsubscribe": 12,
+            "subscription": 35,
+        }
+        assert matcher.find_first("nothing to see here") == {}
+
+    def test_find_first_prefix(self) -> None:
+        """Test keywords that start another keyword are found where the longer one matches"""
+        matcher = KeywordMatcher(["unsubscribe", "unsubscribe here"])
+
+        assert matcher.find_first("Unsubscribe here") == {"unsubscribe": 0, "unsubscribe here": 0}
@@ -12,13 +12,16 @@ class TestLinkEmail:
 
     @classmethod
     def setup_class(cls) -> None:
-        cls.client = TestClient(app)
+        # Enter the client so every request runs on the same event loop, the async
+        # engine's pooled connections are bound to it.
+        cls.client = TestClient(app).__enter__()
         cls.session = get_session()
         cls.user = generate_user(cls.session)
         cls.auth_header = generate_auth_header(cls.user.id)
 
     @classmethod
     def teardown_class(cls) -> None:
+        cls.client.__exit__(None, None, None)
         if cls.user is not None:
             crud_user.user.remove(cls.session, id=cls.user.id, email=cls.user.email)
         cls.session.close()
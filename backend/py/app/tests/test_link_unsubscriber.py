@@ -0,0 +1,209 @@
+from collections import Counter
+from typing import Optional
+from unittest import mock
+
+from app.models import UnsubscribeLinks, UnsubscribeStatus
+from app.objects.host_limiter import HostLimiter
+from app.objects.http_client import get_http_client_stats
+from app.objects import link_unsubscriber as link_unsubscriber_module
+from app.objects.link_unsubscriber import LinkUnsubscriber
+from app.tests.http_server import FakeHTTPServer
+
+
+class FakeHostLimiter(HostLimiter):
+    """A host limiter that keeps its state in memory instead of redis. Every host gets
+    `burst` requests before it has to wait `wait` seconds for the next one."""
+
+    def __init__(self, burst: int = 100, wait: float = 0.05, failures: int = 2) -> None:
+        self.burst = burst
+        self.wait = wait
+        self.failures = failures
+        self.acquired = Counter()
+        self.failed = Counter()
+        self.open_circuits = set()
+
+    def acquire(self, host: str) -> Optional[float]:
+        if host in self.open_circuits:
+            return None
+        if self.acquired[host] >= self.burst:
+            # Refill the bucket for the next try.
+            self.acquired[host] = 0
+            return self.wait
+        self.acquired[host] += 1
+        return 0
+
+    def record_success(self, host: str) -> None:
+        self.failed[host] = 0
+
+    def record_failure(self, host: str) -> bool:
+        self.failed[host] += 1
+        if self.failed[host] >= self.failures:
+            self.open_circuits.add(host)
+            return True
+        return False
+
+
+class TestLinkUnsubscriber:
+    """Test link unsubscriber class"""
+
+    def test_unsubscribe(self) -> None:
+        """Test requesting unsubscribe links concurrently within the per host limit"""
+        with FakeHTTPServer(latency=0.05) as server:
+            links = [
+                UnsubscribeLinks(link=server.url(f"/unsubscribe/{i}", host=f"127.0.0.{i % 3 + 1}"))
+                for i in range(30)
+            ]
+            failed_links = [
+                UnsubscribeLinks(link=server.url("/status/500")),
+                UnsubscribeLinks(link="http://127.0.0.1:1/unsubscribe"),
+            ]
+
+            results = list(
+                LinkUnsubscriber(max_workers=8, max_per_host=2).unsubscribe(links + failed_links)
+            )
+
+        assert sorted(link.link for link, _ in results) == sorted(link.link for link in links + failed_links)
+        assert {
+            link.link: unsubscribe_status for link, unsubscribe_status in results
+        } == {
+            **{ link.link: UnsubscribeStatus.success for link in links },
+            **{ link.link: UnsubscribeStatus.failure for link in failed_links },
+        }
+
+        assert max(server.max_active.values()) == 2
+        assert server.max_active_total > 2
+
+    def test_unsubscribe_reuses_connections(self) -> None:
+        """Test the unsubscribe requests to a host reuse its pooled connection"""
+        with FakeHTTPServer() as server:
+            links = [ UnsubscribeLinks(link=server.url(f"/unsubscribe/{i}")) for i in range(10) ]
+
+            stats_before = get_http_client_stats()
+            results = list(LinkUnsubscriber(max_per_host=1).unsubscribe(links))
+            stats_after = get_http_client_stats()
+
+        assert [ unsubscribe_status for _, unsubscribe_status in results ] == [UnsubscribeStatus.success] * 10
+        assert stats_after["requests"] - stats_before["requests"] == 10
+        assert stats_after["pool_misses"] - stats_before["pool_misses"] == 1
+        assert stats_after["pool_hits"] - stats_before["pool_hits"] == 9
+
+    def test_unsubscribe_one_click(self) -> None:
+        """Test one-click links are unsubscribed with a single POST and other links with a GET"""
+        with FakeHTTPServer() as server:
+            links = [
+                UnsubscribeLinks(link=server.url("/one_click"), one_click=True),
+                UnsubscribeLinks(link=server.url("/status/302"), one_click=True),
+                UnsubscribeLinks(link=server.url("/landing_page"), one_click=False),
+                UnsubscribeLinks(link=server.url("/status/301"), one_click=False),
+            ]
+
+            results = dict(
+                (link.link, unsubscribe_status)
+                for link, unsubscribe_status in LinkUnsubscriber().unsubscribe(links)
+            )
+
+        assert results == {
+            server.url("/one_click"): UnsubscribeStatus.success,
+            server.url("/status/302"): UnsubscribeStatus.failure,
+            server.url("/landing_page"): UnsubscribeStatus.success,
+            server.url("/status/301"): UnsubscribeStatus.success,
+        }
+
+        # The one-click POSTs don't follow redirects, the GETs do.
+        assert sorted((method, path, body) for method, _, path, body in server.requests) == [
+            ("GET", "/landing_page", b""),
+            ("GET", "/status/301", b""),
+            ("GET", "/unsubscribed", b""),
+            ("POST", "/one_click", b"List-Unsubscribe=One-Click"),
+            ("POST", "/status/302", b"List-Unsubscribe=One-Click"),
+        ]
+
+    def test_unsubscribe_host_limiter(self) -> None:
+        """Test a failing host's circuit opens and its remaining links are deferred while
+        the links of the other hosts are rate limited but still requested"""
+        with FakeHTTPServer() as server:
+            links = [
+                UnsubscribeLinks(link=server.url(f"/unsubscribe/{i}", host="127.0.0.1"))
+                for i in range(10)
+            ]
+            failing_links = [
+                UnsubscribeLinks(link=server.url(f"/status/503?link={i}", host="127.0.0.2"))
+                for i in range(10)
+            ]
+
+            link_unsubscriber = LinkUnsubscriber(
+                max_per_host=1, host_limiter=FakeHostLimiter(burst=3, failures=2),
+            )
+            results = dict(
+                (link.link, unsubscribe_status)
+                for link, unsubscribe_status in link_unsubscriber.unsubscribe(links + failing_links)
+            )
+
+        assert { link.link: results[link.link] for link in links } == {
+            link.link: UnsubscribeStatus.success for link in links
+        }
+
+        # The circuit opened after the second failure, the rest weren't requested.
+        requested_failing_links = [ link for link in failing_links if link.link in results ]
+        assert len(requested_failing_links) == 2
+        assert all(results[link.link] == UnsubscribeStatus.failure for link in requested_failing_links)
+        assert sorted(link.link for link in link_unsubscriber.deferred_links) == sorted(
+            link.link for link in failing_links if link.link not in results
+        )
+        assert sum(1 for _, host, _, _ in server.requests if host == "127.0.0.2") == 2
+
+    def test_unsubscribe_throttled_host_waits(self) -> None:
+        """Test a host whose rate limit wait ended while its link is running waits for the
+        link instead of polling"""
+        with FakeHTTPServer(latency=0.3) as server:
+            links = [ UnsubscribeLinks(link=server.url(f"/unsubscribe/{i}")) for i in range(3) ]
+
+            with mock.patch.object(
+                link_unsubscriber_module, "wait", wraps=link_unsubscriber_module.wait,
+            ) as mock_wait:
+                results = list(
+                    LinkUnsubscriber(
+                        max_per_host=1, host_limiter=FakeHostLimiter(burst=1, wait=0.01),
+                    ).unsubscribe(links)
+                )
+
+        assert [ unsubscribe_status for _, unsubscribe_status in results ] == [UnsubscribeStatus.success] * 3
+        # One wait for each link, and at most one more when a throttled host's wait ends.
+        assert mock_wait.call_count <= 6
+
+    def test_unsubscribe_links_commits_batches(self) -> None:
+        """Test the unsubscribe statuses are committed in batches as the requests finish"""
+        from app import celery_worker
+
+        links = [
+            UnsubscribeLinks(
+                link=f"https://example.com/unsubscribe/{i}",
+                scanned_email_id=i,
+                unsubscribe_status=UnsubscribeStatus.pending,
+            )
+            for i in range(5)
+        ]
+        db = mock.Mock(expire_on_commit=True)
+        summary_writer = mock.Mock()
+        result_cache = mock.Mock()
+        result_cache.get_many.return_value = {links[0].link: UnsubscribeStatus.success}
+
+        # The number of status changes written by each commit.
+        commits = []
+        db.commit.side_effect = lambda: commits.append(
+            len(summary_writer.update_link_statuses.call_args.args[0])
+        )
+
+        with mock.patch.object(celery_worker.settings, "UNSUBSCRIBE_COMMIT_BATCH_SIZE", 2), \
+             mock.patch.object(celery_worker, "SenderSummaryWriter", return_value=summary_writer), \
+             mock.patch.object(celery_worker, "UnsubscribeResultCache", return_value=result_cache), \
+             mock.patch.object(celery_worker, "HostLimiter"), \
+             mock.patch.object(celery_worker.LinkUnsubscriber, "unsubscribe") as mock_unsubscribe:
+            mock_unsubscribe.side_effect = lambda links: ((link, UnsubscribeStatus.success) for link in links)
+            celery_worker.unsubscribe_links(mock.Mock(), db, links, "email@yahoo.com")
+
+        # The cache hit, two batches of two and the last empty batch
+        assert commits == [1, 2, 2, 0]
+        assert [ len(call.args[0]) for call in result_cache.set_many.call_args_list ] == [0, 2, 2, 0]
+        assert all(link.unsubscribe_status == UnsubscribeStatus.success for link in links)
+        assert db.expire_on_commit is True
@@ -0,0 +1,141 @@
+import json
+
+from typing import Iterator
+from unittest import mock
+
+import pytest
+
+from sqlalchemy import text
+
+from app.crud import crud_user, crud_linked_emails
+from app.objects.sender_summary_writer import SenderSummaryWriter
+from app.schemas import LinkedEmailsCreate
+from app.test_utils import get_session, generate_user
+
+
+# The hot queries of the scanner, the listings and the unsubscribe tasks.
+QUERIES = {
+    "scanned email natural key": """
+        SELECT id FROM scanned_emails
+        WHERE
+            linked_email_address = :linked_email
+            AND email_from = 'sender1@spam.com'
+            AND subject = 'Spam Email 1'
+            AND inbox_date = '2023-01-01 00:00:00+00'
+    """,
+    "senders listing": """
+        SELECT email_from, scanned_email_count FROM sender_summaries
+        WHERE linked_email_address = :linked_email AND email_from > 'sender1@spam.com'
+        ORDER BY email_from
+        LIMIT 11
+    """,
+    "scanned emails listing": """
+        SELECT id, subject FROM scanned_emails
+        WHERE
+            linked_email_address = :linked_email
+            AND email_from = 'sender1@spam.com'
+            AND (subject, id) > ('Spam Email 1', 0)
+        ORDER BY subject, id
+        LIMIT 11
+    """,
+    "expunged emails": """
+        SELECT id FROM scanned_emails
+        WHERE linked_email_address = :linked_email AND uid IN (1, 2, 3)
+    """,
+    "unsubscribe link natural key": """
+        SELECT id FROM unsubscribe_links
+        WHERE link = 'https://spam.com/unsubscribe/1' AND linked_email_address = :linked_email
+    """,
+    "scanned email links": """
+        SELECT ul.id FROM unsubscribe_links ul
+        JOIN scanned_emails se ON se.id = ul.scanned_email_id
+        WHERE se.linked_email_address = :linked_email AND se.email_from = 'sender1@spam.com'
+    """,
+    "pending links": """
+        SELECT id FROM unsubscribe_links
+        WHERE linked_email_address = :linked_email AND unsubscribe_status = 'pending'
+    """,
+}
+
+
+def get_seq_scans(plan: dict) -> Iterator[str]:
+    """Get the tables a query plan scans sequentially."""
+    if plan["Node Type"] == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", []):
+        yield from get_seq_scans(child)
+
+
+class TestQueryPlans:
+    """Test the hot queries use indexes"""
+
+    @classmethod
+    # This mock ensures we don't actually try to login to these email addresses
+    @mock.patch(
+        "app.objects.email_unsubscriber.IMAP4_SSL.login",
+        return_value=True,
+        autospec=True,
+    )
+    def setup_class(cls, mock_imap_login) -> None:
+        cls.session = get_session()
+        cls.user = generate_user(cls.session)
+
+        # A small linked email among the emails of a big one, like most users.
+        for email, senders, emails_per_sender in (
+            ("small@yahoo.com", 10, 10),
+            ("big@yahoo.com", 500, 100),
+        ):
+            crud_linked_emails.linked_email.create_with_user(
+                cls.session,
+                obj_in=LinkedEmailsCreate(email=email, password="a-super-secret-password"),
+                user_id=cls.user.id,
+            )
+            cls.session.execute(
+                text("""
+                    INSERT INTO scanned_emails (linked_email_address, email_from, subject, inbox_date, uid)
+                    SELECT
+                        :linked_email,
+                        'sender' || (i % :senders) || '@spam.com',
+                        'Spam Email ' || i,
+                        TIMESTAMPTZ '2023-01-01 00:00:00+00' + i * INTERVAL '1 minute',
+                        i
+                    FROM generate_series(1, :count) AS i
+                """),
+                {"linked_email": email, "senders": senders, "count": senders * emails_per_sender},
+            )
+            cls.session.execute(
+                text("""
+                    INSERT INTO unsubscribe_links (link, linked_email_address, scanned_email_id, unsubscribe_status)
+                    SELECT
+                        'https://spam.com/unsubscribe/' || id,
+                        linked_email_address,
+                        id,
+                        CAST(CASE WHEN id % 10 = 0 THEN 'pending' ELSE 'success' END AS unsubscribestatus)
+                    FROM scanned_emails
+                    WHERE linked_email_address = :linked_email
+                """),
+                {"linked_email": email},
+            )
+            SenderSummaryWriter(cls.session, email).refresh()
+        cls.session.commit()
+        cls.session.execute(text("ANALYZE scanned_emails"))
+        cls.session.execute(text("ANALYZE unsubscribe_links"))
+        cls.session.execute(text("ANALYZE sender_summaries"))
+
+    @classmethod
+    def teardown_class(cls) -> None:
+        if cls.user is not None:
+            crud_user.user.remove(cls.session, id=cls.user.id, email=cls.user.email)
+        cls.session.close()
+
+    @pytest.mark.parametrize("name", list(QUERIES))
+    def test_query_uses_indexes(self, name: str) -> None:
+        """Test a hot query doesn't scan any of its tables sequentially"""
+        plan = self.session.execute(
+            text(f"EXPLAIN (FORMAT JSON) {QUERIES[name]}"),
+            {"linked_email": "small@yahoo.com"},
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        assert list(get_seq_scans(plan[0]["Plan"])) == [], f"{name} query plan: {plan}"
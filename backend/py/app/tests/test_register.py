@@ -14,10 +14,13 @@ class TestRegister:
         self.user_id = None
         self.user_email = None
         self.invite_code = None
-        self.client = TestClient(app)
+        # Enter the client so every request runs on the same event loop, the async
+        # engine's pooled connections are bound to it.
+        self.client = TestClient(app).__enter__()
         self.session = get_session()
 
     def teardown_method(self) -> None:
+        self.client.__exit__(None, None, None)
         if self.invite_code is not None:
             code = (
                 self.session.query(InviteCodes)
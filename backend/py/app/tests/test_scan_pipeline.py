@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from app.objects.scan_pipeline import ScanPipeline, merge_stage_stats
+
+
+def parse_numbers(batch: list) -> list:
+    """Parse a batch in the process pool, it has to be a module level function."""
+    return [ int(number) for number in batch ]
+
+
+class TestScanPipeline:
+    """Test the fetch, parse and write scan pipeline"""
+
+    @pytest.mark.parametrize("processes", [0, 2])
+    def test_pipeline(self, processes: int) -> None:
+        """Test batches are parsed and written in order and each stage reports its throughput"""
+        written = []
+        write_threads = set()
+
+        def write_batch(records: list) -> None:
+            written.append(records)
+            write_threads.add(threading.get_ident())
+
+        with ScanPipeline(parse_numbers, write_batch, processes=processes, queue_size=2) as pipeline:
+            for batch_start in range(0, 100, 10):
+                batch = [ str(number) for number in range(batch_start, batch_start + 10) ]
+                pipeline.fetched(len(batch), 0.01, byte_count=len("".join(batch)))
+                pipeline.write(pipeline.parse(batch))
+
+            # Batches that were parsed already are written in order too.
+            pipeline.write(pipeline.get_records(pipeline.parse(["100"])))
+            stats = pipeline.join()
+
+        assert [ number for records in written for number in records ] == list(range(101))
+        assert threading.get_ident() not in write_threads
+        assert stats["fetch"]["emails"] == 100
+        assert stats["fetch"]["bytes"] == 190
+        assert stats["fetch"]["emails_per_second"] == 1000
+        assert stats["parse"]["emails"] == 101
+        assert stats["write"]["emails"] == 101
+
+    def test_pipeline_write_error(self) -> None:
+        """Test an error in the write stage stops the fetch stage"""
+
+        def write_batch(records: list) -> None:
+            raise ValueError("Could not write")
+
+        with pytest.raises(ValueError):
+            with ScanPipeline(parse_numbers, write_batch, queue_size=1) as pipeline:
+                for _ in range(100):
+                    pipeline.write(pipeline.parse(["1"]))
+                pipeline.join()
+
+    def test_merge_stage_stats(self) -> None:
+        """Test the stage stats of parallel shards add up"""
+        shard_stats = [
+            {"fetch": {"emails": 100, "bytes": 2000, "seconds": 0.5, "emails_per_second": 200.0}},
+            {
+                "fetch": {"emails": 50, "bytes": 1000, "seconds": 0.25, "emails_per_second": 200.0},
+                "write": {"emails": 0, "bytes": 0, "seconds": 0.0, "emails_per_second": None},
+            },
+        ]
+
+        assert merge_stage_stats(shard_stats) == {
+            "fetch": {"emails": 150, "bytes": 3000, "seconds": 0.75, "emails_per_second": 400.0},
+            "write": {"emails": 0, "bytes": 0, "seconds": 0.0, "emails_per_second": None},
+        }
+        assert merge_stage_stats([]) == {}
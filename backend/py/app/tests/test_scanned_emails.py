@@ -2,9 +2,12 @@ from fastapi.testclient import TestClient
 from unittest import mock
 from datetime import datetime
 
-from app.crud import crud_user, crud_linked_emails
+from app.crud import crud_user, crud_linked_emails, crud_scanned_emails
 from app.main import app
+from app.models import ScannedEmails, SenderSummaries, UnsubscribeLinks, UnsubscribeStatus
 from app.objects.email_unsubscriber import EmailUnsubscriber
+from app.objects.scanned_email_writer import ScannedEmailWriter
+from app.objects.sender_summary_writer import SenderSummaryWriter
 from app.schemas import LinkedEmailsCreate
 from app.test_utils import (
     get_session,
@@ -20,7 +23,9 @@ class TestLinkEmail:
 
     @classmethod
     def setup_class(cls) -> None:
-        cls.client = TestClient(app)
+        # Enter the client so every request runs on the same event loop, the async
+        # engine's pooled connections are bound to it.
+        cls.client = TestClient(app).__enter__()
         cls.session = get_session()
         cls.user = generate_user(cls.session)
         cls.auth_header = generate_auth_header(cls.user.id)
@@ -28,6 +33,7 @@ class TestLinkEmail:
 
     @classmethod
     def teardown_class(cls) -> None:
+        cls.client.__exit__(None, None, None)
         if cls.user is not None:
             crud_user.user.remove(cls.session, id=cls.user.id, email=cls.user.email)
         cls.session.close()
@@ -71,11 +77,10 @@ class TestLinkEmail:
                 inbox_date=datetime.now(),
             )
 
-        # Fetch the list of scanned_emails for page 0
+        # Fetch the first page of scanned_emails
         scanned_email_params = {
             "linked_email": "email@yahoo.com",
             "email_from": "spammer@email.com",
-            "page": 0,
         }
         results = self.client.post(
             "/scanned_emails/get_scanned_emails",
@@ -89,7 +94,6 @@ class TestLinkEmail:
                 "id": mock.ANY,
                 "unsubscribe_link_count": 1,
                 "subject": f"Spam Email - {i}",
-                "total_count": 20,
                 "unsubscribe_statuses": ["pending"],
             }
             for i in range(10)
@@ -98,9 +102,10 @@ class TestLinkEmail:
         # frozenset allows for testing without order.
         assert [ frozenset(email) for email in scanned_emails ] == [ frozenset(email) for email in expected_scanned_emails_page_0 ]
 
-        # Fetch the list of scanned emails for page 1
+        # Fetch the next page of scanned emails
         # it should contain the rest of the scanned emails
-        scanned_email_params["page"] = 1
+        assert results["next_cursor"] is not None
+        scanned_email_params["cursor"] = results["next_cursor"]
         results = self.client.post(
             "/scanned_emails/get_scanned_emails",
             json=scanned_email_params,
@@ -114,22 +119,20 @@ class TestLinkEmail:
                 "unsubscribe_link_count": 0,
                 "subject": f"Spam Email - {i}",
                 "unsubscribe_statuses": None,
-                "total_count": 20,
             }
             for i in range(10, 20)
         ]
         assert [ frozenset(link) for link in scanned_emails2 ] == [ frozenset(link) for link in expected_scanned_emails_page_1 ]
 
-        # Fetch the list of scanned emails for page 2
-        # it should not contain anymore emails.
-        scanned_email_params["page"] = 2
-        results = self.client.post(
-            "/scanned_emails/get_scanned_emails",
-            json=scanned_email_params,
+        # There are no more scanned emails after the second page.
+        assert results["next_cursor"] is None
+        assert set(email["id"] for email in scanned_emails).isdisjoint(email["id"] for email in scanned_emails2)
+
+        results = self.client.get(
+            "/scanned_emails/scanned_emails_count?linked_email=email@yahoo.com&email_from=spammer@email.com",
             headers=self.auth_header,
         ).json()
-        scanned_emails3 = results.get("scanned_emails", [])
-        assert scanned_emails3 == []
+        assert results == {"total_count": 20}
 
         # Fetch a list of unsubscribe links for a certain scanned_email_id and linked_email
         scanned_email_id = scanned_emails[0].get("id")
@@ -144,6 +147,7 @@ class TestLinkEmail:
                 "id": mock.ANY,
                 "link": self.list_unsubscribe[0].strip('<>'),
                 "unsubscribe_status": "pending",
+                "one_click": False,
                 "insert_ts": mock.ANY,
                 "linked_email_address": "email@yahoo.com",
             }
@@ -153,7 +157,7 @@ class TestLinkEmail:
 
         # Fetch a list of email senders
         results = self.client.get(
-            "/scanned_emails/senders/0?linked_email=email@yahoo.com",
+            "/scanned_emails/senders?linked_email=email@yahoo.com",
             headers=self.auth_header,
         ).json()
 
@@ -162,7 +166,267 @@ class TestLinkEmail:
                 "email_from": "spammer@email.com",
                 "scanned_email_count": 20,
                 "unsubscribe_link_count": 20,
-                "total_count": 1,
-                "unsubscribe_statuses": ["pending" for _ in range(20)],
+                "unsubscribe_status_counts": {"success": 0, "pending": 20, "failure": 0, "unsure": 0},
+                "unsubscribe_statuses": ["pending"],
             }
         ]
+        assert results["next_cursor"] is None
+
+        results = self.client.get(
+            "/scanned_emails/senders_count?linked_email=email@yahoo.com",
+            headers=self.auth_header,
+        ).json()
+        assert results == {"total_count": 1}
+
+    def test_rescan_scanned_emails(self) -> None:
+        """Test scanning emails that were scanned already doesn't add them again
+        but keeps their UIDs current.
+        """
+        linked_email = crud_linked_emails.linked_email.create_with_user(
+            self.session,
+            obj_in=LinkedEmailsCreate(
+                email="rescan@yahoo.com",
+                password="a-super-secret-password",
+            ),
+            user_id=self.user.id,
+        )
+
+        message = generate_email_message(
+            to_email="rescan@yahoo.com",
+            from_email="spammer@email.com",
+            subject="Spam Email",
+            body=general_template,
+            list_unsubscribe=[self.list_unsubscribe[0]],
+        )
+        inbox_date = datetime.now()
+
+        scanned_email = EmailUnsubscriber._scan_email_message_obj(
+            db=self.session,
+            email_msg=message,
+            linked_email_address=linked_email.email,
+            inbox_date=inbox_date,
+            uid=1,
+        )
+        assert scanned_email == {
+            "id": mock.ANY,
+            "from": "spammer@email.com",
+            "subject": "Spam Email",
+            "link_count": 1,
+            "unsubscribe_status": "pending",
+        }
+
+        # The UIDVALIDITY changed so the email has a new UID
+        assert EmailUnsubscriber._scan_email_message_obj(
+            db=self.session,
+            email_msg=message,
+            linked_email_address=linked_email.email,
+            inbox_date=inbox_date,
+            uid=2,
+        ) == {}
+
+        scanned_emails = (
+            self.session.query(ScannedEmails)
+            .filter(ScannedEmails.linked_email_address == linked_email.email)
+            .all()
+        )
+        assert [ (email.id, email.uid) for email in scanned_emails ] == [ (scanned_email["id"], 2) ]
+
+    def test_rescan_email_without_subject(self) -> None:
+        """Test an email without a subject is only added once"""
+        linked_email = crud_linked_emails.linked_email.create_with_user(
+            self.session,
+            obj_in=LinkedEmailsCreate(
+                email="no_subject@yahoo.com",
+                password="a-super-secret-password",
+            ),
+            user_id=self.user.id,
+        )
+
+        message = generate_email_message(
+            to_email="no_subject@yahoo.com",
+            from_email="spammer@email.com",
+            subject="Spam Email",
+            body=general_template,
+            list_unsubscribe=[self.list_unsubscribe[0]],
+        )
+        del message["Subject"]
+        inbox_date = datetime.now()
+
+        for uid in (1, 2):
+            EmailUnsubscriber._scan_email_message_obj(
+                db=self.session,
+                email_msg=message,
+                linked_email_address=linked_email.email,
+                inbox_date=inbox_date,
+                uid=uid,
+            )
+
+        scanned_emails = (
+            self.session.query(ScannedEmails)
+            .filter(ScannedEmails.linked_email_address == linked_email.email)
+            .all()
+        )
+        assert [ (email.subject, email.uid) for email in scanned_emails ] == [ ("", 2) ]
+
+    def test_copy_scanned_emails(self) -> None:
+        """Test writing scanned emails with COPY skips the emails and links that exist"""
+        linked_email = crud_linked_emails.linked_email.create_with_user(
+            self.session,
+            obj_in=LinkedEmailsCreate(
+                email="copy@yahoo.com",
+                password="a-super-secret-password",
+            ),
+            user_id=self.user.id,
+        )
+        inbox_date = datetime.now()
+
+        writer = ScannedEmailWriter(self.session, linked_email.email, use_copy=True)
+        writer.add("spammer@email.com", "Spam Email - 0", inbox_date, [self.list_unsubscribe[0]], uid=1)
+        first_copy = writer.flush()
+
+        writer.add("spammer@email.com", "Spam Email - 0", inbox_date, [self.list_unsubscribe[0]], uid=5)
+        writer.add("spammer@email.com", 'Spam "Email", 1', inbox_date, [self.list_unsubscribe[0]], uid=None)
+        writer.add("spammer@email.com", "Spam Email - 2", inbox_date, [self.list_unsubscribe[2]], uid=3)
+        second_copy = writer.flush()
+
+        assert [ (email["subject"], email["link_count"]) for email in first_copy ] == [("Spam Email - 0", 1)]
+        assert [ (email["subject"], email["link_count"]) for email in second_copy ] == [
+            ('Spam "Email", 1', 0),
+            ("Spam Email - 2", 1),
+        ]
+
+        scanned_emails = (
+            self.session.query(ScannedEmails)
+            .filter(ScannedEmails.linked_email_address == linked_email.email)
+            .order_by(ScannedEmails.id)
+            .all()
+        )
+        assert [ (email.subject, email.uid) for email in scanned_emails ] == [
+            ("Spam Email - 0", 5),
+            ('Spam "Email", 1', None),
+            ("Spam Email - 2", 3),
+        ]
+
+    def test_copy_duplicate_scanned_emails(self) -> None:
+        """Test an email that is in a COPY batch twice is added and counted once"""
+        linked_email = crud_linked_emails.linked_email.create_with_user(
+            self.session,
+            obj_in=LinkedEmailsCreate(
+                email="copy_duplicate@yahoo.com",
+                password="a-super-secret-password",
+            ),
+            user_id=self.user.id,
+        )
+        inbox_date = datetime.now()
+
+        writer = ScannedEmailWriter(self.session, linked_email.email, use_copy=True)
+        writer.add("spammer@email.com", "Spam Email - 0", inbox_date, self.list_unsubscribe[:2], uid=1)
+        writer.add("spammer@email.com", "Spam Email - 0", inbox_date, self.list_unsubscribe[:2], uid=1)
+        writer.add("spammer@email.com", "Spam Email - 1", inbox_date, [self.list_unsubscribe[2]], uid=2)
+        scanned_emails = writer.flush()
+
+        assert [ (email["subject"], email["link_count"]) for email in scanned_emails ] == [
+            ("Spam Email - 0", 2),
+            ("Spam Email - 1", 1),
+        ]
+        assert len({ email["id"] for email in scanned_emails }) == 2
+
+        summary = (
+            self.session.query(SenderSummaries)
+            .filter(SenderSummaries.linked_email_address == linked_email.email)
+            .one()
+        )
+        assert (summary.scanned_email_count, summary.unsubscribe_link_count) == (2, 3)
+
+    def test_sender_summaries(self) -> None:
+        """Test the sender summaries follow the scanned emails and unsubscribe statuses"""
+        linked_email = crud_linked_emails.linked_email.create_with_user(
+            self.session,
+            obj_in=LinkedEmailsCreate(
+                email="summaries@yahoo.com",
+                password="a-super-secret-password",
+            ),
+            user_id=self.user.id,
+        )
+        inbox_date = datetime.now()
+
+        writer = ScannedEmailWriter(self.session, linked_email.email)
+        writer.add("spammer@email.com", "Spam Email - 0", inbox_date, self.list_unsubscribe[:2])
+        writer.add("spammer@email.com", "Spam Email - 1", inbox_date, [self.list_unsubscribe[2]])
+        writer.add("other@email.com", "Other Email", inbox_date, [])
+        scanned_emails = writer.flush()
+
+        SenderSummaryWriter(self.session, linked_email.email).update_link_statuses(
+            [
+                (scanned_emails[0]["id"], UnsubscribeStatus.pending, UnsubscribeStatus.success),
+                (scanned_emails[1]["id"], UnsubscribeStatus.pending, UnsubscribeStatus.failure),
+            ]
+        )
+        self.session.commit()
+
+        def get_summaries() -> list:
+            return [
+                (
+                    summary.email_from,
+                    summary.scanned_email_count,
+                    summary.unsubscribe_link_count,
+                    summary.pending_count,
+                    summary.success_count,
+                    summary.failure_count,
+                )
+                for summary in (
+                    self.session.query(SenderSummaries)
+                    .filter(SenderSummaries.linked_email_address == linked_email.email)
+                    .order_by(SenderSummaries.email_from)
+                    .populate_existing()
+                )
+            ]
+
+        assert get_summaries() == [
+            ("other@email.com", 1, 0, 0, 0, 0),
+            ("spammer@email.com", 2, 3, 1, 1, 1),
+        ]
+
+        # Counting the senders again from the scanned emails doesn't change them.
+        self.session.query(UnsubscribeLinks).filter(
+            UnsubscribeLinks.scanned_email_id == scanned_emails[0]["id"],
+            UnsubscribeLinks.link == self.list_unsubscribe[0].strip("<>"),
+        ).update({"unsubscribe_status": UnsubscribeStatus.success}, synchronize_session=False)
+        self.session.query(UnsubscribeLinks).filter(
+            UnsubscribeLinks.scanned_email_id == scanned_emails[1]["id"],
+        ).update({"unsubscribe_status": UnsubscribeStatus.failure}, synchronize_session=False)
+        SenderSummaryWriter(self.session, linked_email.email).refresh()
+        self.session.commit()
+
+        assert get_summaries() == [
+            ("other@email.com", 1, 0, 0, 0, 0),
+            ("spammer@email.com", 2, 3, 1, 1, 1),
+        ]
+
+    def test_delete_scanned_emails(self) -> None:
+        """Test deleting the scanned emails of a linked email removes their senders' summaries"""
+        linked_email = crud_linked_emails.linked_email.create_with_user(
+            self.session,
+            obj_in=LinkedEmailsCreate(
+                email="delete@yahoo.com",
+                password="a-super-secret-password",
+            ),
+            user_id=self.user.id,
+        )
+        inbox_date = datetime.now()
+
+        writer = ScannedEmailWriter(self.session, linked_email.email)
+        writer.add("spammer@email.com", "Spam Email - 0", inbox_date, self.list_unsubscribe[:2])
+        writer.add("spammer@email.com", "Spam Email - 1", inbox_date, [])
+        writer.add("other@email.com", "Other Email", inbox_date, [self.list_unsubscribe[2]])
+        writer.flush()
+
+        deleted_count = crud_scanned_emails.scanned_emails.delete_scanned_emails(
+            self.session, user_id=self.user.id, linked_email=linked_email.email,
+        )
+
+        assert deleted_count == 3
+        for model in (ScannedEmails, UnsubscribeLinks, SenderSummaries):
+            assert self.session.query(model).filter(
+                model.linked_email_address == linked_email.email
+            ).count() == 0
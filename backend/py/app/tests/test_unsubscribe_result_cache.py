@@ -0,0 +1,49 @@
+from unittest import mock
+
+import redis
+
+from app.models import UnsubscribeStatus
+from app.objects.unsubscribe_result_cache import UnsubscribeResultCache
+
+
+class TestUnsubscribeResultCache:
+    """Test unsubscribe result cache class"""
+
+    def test_canonicalize_link(self) -> None:
+        """Test different spellings of a link canonicalize to the same link"""
+        assert UnsubscribeResultCache.canonicalize_link(
+            "HTTPS://Example.LIST-MANAGE.com:443/unsubscribe?u=1&id=2&utm_source=email#footer"
+        ) == "https://example.list-manage.com/unsubscribe?id=2&u=1"
+        assert UnsubscribeResultCache.canonicalize_link(
+            "https://example.list-manage.com/unsubscribe?id=2&u=1"
+        ) == "https://example.list-manage.com/unsubscribe?id=2&u=1"
+        assert UnsubscribeResultCache.canonicalize_link(
+            "http://example.com:8080"
+        ) == "http://example.com:8080/"
+
+        # The same link unsubscribes every recipient separately
+        assert UnsubscribeResultCache._get_key(
+            "https://example.com/unsubscribe?u=1", "Email@Yahoo.com",
+        ) == UnsubscribeResultCache._get_key(
+            "https://EXAMPLE.com/unsubscribe?u=1#top", "email@yahoo.com",
+        )
+        assert UnsubscribeResultCache._get_key(
+            "https://example.com/unsubscribe?u=1", "email@yahoo.com",
+        ) != UnsubscribeResultCache._get_key(
+            "https://example.com/unsubscribe?u=1", "other@yahoo.com",
+        )
+
+    def test_redis_unavailable(self) -> None:
+        """Test every link is a cache miss when redis is unavailable"""
+        unavailable_redis = mock.Mock()
+        unavailable_redis.mget.side_effect = redis.ConnectionError("Connection refused")
+        unavailable_redis.pipeline.return_value.execute.side_effect = redis.ConnectionError("Connection refused")
+
+        with mock.patch(
+            "app.objects.unsubscribe_result_cache.get_redis", return_value=unavailable_redis,
+        ):
+            result_cache = UnsubscribeResultCache(ttl=60)
+            result_cache.set_many(
+                {"https://example.com/unsubscribe": UnsubscribeStatus.success}, "email@yahoo.com",
+            )
+            assert result_cache.get_many(["https://example.com/unsubscribe"], "email@yahoo.com") == {}
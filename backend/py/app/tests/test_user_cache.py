@@ -0,0 +1,64 @@
+import time
+
+from unittest import mock
+
+from app.api import deps
+from app.config import security
+from app.objects.user_cache import UserCache, user_cache
+from app.schemas.users import User
+
+
+class TestUserCache:
+    """Test user cache class"""
+
+    def test_user_cache(self) -> None:
+        """Test users are evicted least recently used first, expire and can be invalidated"""
+        cache = UserCache(maxsize=2, ttl=0.2)
+        users = [ User(id=i, email=f"user{i}@example.com") for i in range(3) ]
+
+        cache.set(users[0])
+        cache.set(users[1])
+        assert cache.get(0) == users[0]
+
+        # User 1 is the least recently used.
+        cache.set(users[2])
+        assert cache.get(1) is None
+        assert cache.get(0) == users[0]
+        assert cache.get(2) == users[2]
+
+        cache.invalidate(0)
+        assert cache.get(0) is None
+
+        time.sleep(0.2)
+        assert cache.get(2) is None
+
+    @mock.patch("app.api.deps.SessionLocal")
+    def test_get_current_user_cache_hit(self, mock_session_local) -> None:
+        """Test a cached user is returned without opening a db session"""
+        user = User(id=123456, email="cached@example.com")
+        user_cache.set(user)
+
+        try:
+            assert deps.get_current_user(security.create_access_token(user.id)) == user
+        finally:
+            user_cache.invalidate(user.id)
+
+        mock_session_local.assert_not_called()
+
+    def test_update_invalidates_after_commit(self) -> None:
+        """Test a user cached again while the update commits is still invalidated"""
+        from app.crud.base import CRUDBase
+        from app.crud.crud_user import user as crud_user
+
+        db_user = mock.Mock(id=123457)
+        stale_user = User(id=db_user.id, email="stale@example.com")
+
+        def update(self, db, *, db_obj, obj_in):
+            # Another request caches the user before the update is committed.
+            user_cache.set(stale_user)
+            return db_obj
+
+        with mock.patch.object(CRUDBase, "update", update):
+            assert crud_user.update(mock.Mock(), db_obj=db_user, obj_in={"password": None}) == db_user
+
+        assert user_cache.get(db_user.id) is None
@@ -25,7 +25,7 @@ const getScannedEmails = async ( getScannedEmailData, token ) => {
 
     const response = await axios.post(API_URL + "get_scanned_emails", getScannedEmailData, config);
 
-    return response.data.scanned_emails;
+    return response.data;
 }
 
 // Unsubscribe from links
@@ -38,7 +38,7 @@ const unsubscribeFromLinks = async ( unsubscribeData, token ) => {
 
     const response = await axios.post("/emailtidy-py/unsubscribe_links/", unsubscribeData, config);
 
-    return response.data.success;
+    return response.data.unsubscribe_task_id;
 }
 
 // Unsubscribe from ALL links
@@ -88,9 +88,10 @@ const getEmailSenders = async ( emailSenderData, token ) => {
         }
     }
 
-    const response = await axios.get(`${API_URL}senders/${emailSenderData.page}?linked_email=${emailSenderData.linked_email}`, config);
+    const params = { linked_email: emailSenderData.linked_email, cursor: emailSenderData.cursor };
+    const response = await axios.get(`${API_URL}senders`, { ...config, params });
 
-    return response.data.senders;
+    return response.data;
 }
 
 // Unsubscribe from selected senders
@@ -3,7 +3,9 @@ import scannedEmailService from './scannedEmailService';
 
 const initialState = {
     scanned_emails: [],
+    scanned_emails_next_cursor: null,
     email_senders: [],
+    email_senders_next_cursor: null,
     scan_task_id: null,
     unsubscribe_task_id: null,
     task_status: {},
@@ -180,7 +182,8 @@ export const scannedEmailSlice = createSlice({
         .addCase(getScannedEmails.fulfilled, (state, action) => {
             state.isLoading = false
             state.isSuccess = true
-            state.scanned_emails = [...state.scanned_emails, ...action.payload]
+            state.scanned_emails = [...state.scanned_emails, ...action.payload.scanned_emails]
+            state.scanned_emails_next_cursor = action.payload.next_cursor
         })
         .addCase(getScannedEmails.rejected, (state, action) => {
             state.isLoading = false
@@ -193,6 +196,7 @@ export const scannedEmailSlice = createSlice({
         .addCase(unsubscribeFromLinks.fulfilled, (state, action) => {
             state.isLoading = false
             state.isSuccess = true
+            state.unsubscribe_task_id = action.payload
         })
         .addCase(unsubscribeFromLinks.rejected, (state, action) => {
             state.isLoading = false
@@ -249,7 +253,8 @@ export const scannedEmailSlice = createSlice({
         .addCase(getEmailSenders.fulfilled, (state, action) => {
             state.isLoading = false
             state.isSuccess = true
-            state.email_senders = [...state.email_senders, ...action.payload]
+            state.email_senders = [...state.email_senders, ...action.payload.senders]
+            state.email_senders_next_cursor = action.payload.next_cursor
         })
         .addCase(getEmailSenders.rejected, (state, action) => {
             state.isLoading = false
@@ -20,10 +20,9 @@ function LinkedEmail() {
   const linked_email = searchParams.get("linked_email");
 
   const { user } = useSelector( (state) => state.auth );
-  const { email_senders, scan_task_id, unsubscribe_task_id, isLoading } = useSelector( (state) => state.scanned_email);
+  const { email_senders, email_senders_next_cursor, scan_task_id, unsubscribe_task_id, isLoading } = useSelector( (state) => state.scanned_email);
 
   const [scanningDone, setScanningDone] = useState(false);
-  const [page, setPage] = useState(0);
 
   const [formData, setFormData ] = useState([]);
 
@@ -68,7 +67,6 @@ function LinkedEmail() {
         .then( () => dispatch(getRunningTask(linked_email)))
         .then( () => {
           const getEmailSenderData = {
-            page: 0,
             linked_email: linked_email
           }
           dispatch(getEmailSenders(getEmailSenderData));
@@ -81,10 +79,6 @@ function LinkedEmail() {
     
   }, [navigate, dispatch, user, scanningDone] );
 
-  // Tells us how many email senders from this page we've seen
-  const seenCount = 10 * ( page + 1 );
-  const totalSenders = email_senders ? email_senders[0]?.total_count : 0;
-
   if ( isLoading ) {
     return <Spinner />
   }
@@ -111,11 +105,10 @@ function LinkedEmail() {
     <InfiniteScroll
       dataLength={email_senders.length}
       next={ () => {
-        setPage(page+1);
-        dispatch(getEmailSenders({linked_email: linked_email, page: page + 1}));
+        dispatch(getEmailSenders({linked_email: linked_email, cursor: email_senders_next_cursor}));
        }
       }
-      hasMore={seenCount < totalSenders}
+      hasMore={email_senders_next_cursor !== null}
       loader={<p>Loading...</p>}
       scrollableTarget="scroll"
     >
@@ -20,10 +20,9 @@ function ScannedEmails() {
   const email_from   = params.sender;
 
   const { user } = useSelector( (state) => state.auth );
-  const { scanned_emails, scan_task_id, unsubscribe_task_id, isLoading } = useSelector( (state) => state.scanned_email);
+  const { scanned_emails, scanned_emails_next_cursor, scan_task_id, unsubscribe_task_id, isLoading } = useSelector( (state) => state.scanned_email);
 
   const [scanningDone, setScanningDone] = useState(false);
-  const [page, setPage] = useState(0);
 
   // Unsubscribe from this sender
   const onSubmit = e => {
@@ -47,7 +46,6 @@ function ScannedEmails() {
         .then( () => dispatch(getRunningTask(linked_email)))
         .then( () => {
           const getScannedEmailData = {
-            page: page,
             linked_email: linked_email,
             email_from: email_from,
           }
@@ -61,10 +59,6 @@ function ScannedEmails() {
     
   }, [navigate, dispatch, user, scanningDone]);
 
-  // Tells us how many scanned emails from this page we've seen
-  const seenCount = 10 * ( page + 1 );
-  const totalEmails = scanned_emails ? scanned_emails[0]?.total_count : 0;
-
   // Do we have any scanned emails that are pending? Use this to show the unsubscribe
   // button for this email sender.
   let hasPending = false;
@@ -99,11 +93,10 @@ function ScannedEmails() {
       <InfiniteScroll
         dataLength={scanned_emails.length}
         next={ () => {
-          setPage(page+1);
-          dispatch(getScannedEmails({linked_email: linked_email, page: page + 1, email_from: email_from}));
+          dispatch(getScannedEmails({linked_email: linked_email, cursor: scanned_emails_next_cursor, email_from: email_from}));
          }
         }
-        hasMore={seenCount < totalEmails}
+        hasMore={scanned_emails_next_cursor !== null}
         loader={<p>Loading...</p>}
         scrollableTarget="scroll"
       >